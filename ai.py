@@ -5,10 +5,23 @@ from tensorflow import keras
 
 from utils.convert_move_to_label import move_to_label, label_to_move
 from utils.sfen_to_array import sfen_to_array
+from engine.board_adapter import PyShogiPosition, is_legal_move
+from engine.evaluate import evaluate_board
+from engine.position import ArrayPosition
+from engine.book import book_move
+from engine.budget import resolve_budget
+from engine.hybrid import HybridSearcher
+from engine.mcts import MCTSSearcher, MCTS_PLAYOUTS, MCTS_BATCH_SIZE, MCTS_NODES_PER_PLAYOUT
+from engine.search import AlphaBetaSearcher, Quiescence, MATE_SCORE, NEXT_ITERATION_RATIO, order_key
+from engine.movecode import decode_move
+from engine.result_cache import ResultCache
+from engine.smp import LazySMPSearcher
+from engine.zobrist import board_hash
 
 import numpy as np
 import shogi
 import random
+import time
 
 _MODEL = None
 _CANDIDATES = [
@@ -22,6 +35,36 @@ _CANDIDATES = [
 #model = load_model("models/shogi_model.h5")
 #model = load_model("models/shogi_policy_best.keras")
 
+# 探索系 AI の局面バックエンド
+#   "array"        : engine/position.py の配列実装（既定。python-shogi と合法手一致を検証済み）
+#   "python-shogi" : python-shogi の Board をそのまま使う
+SEARCH_BACKENDS = {
+    "array": ArrayPosition.from_board,
+    "python-shogi": PyShogiPosition,
+}
+DEFAULT_BACKEND = "array"
+
+# 定跡（engine/book.py）を先に引く ai_type
+BOOK_AI_TYPES = ("minimax", "alphabeta", "hybrid", "mcts")
+
+# 探索結果（手・評価値）を対局をまたいで使い回す ai_type とそのキャッシュ（engine/result_cache.py）
+SEARCH_CACHE_AI_TYPES = ("minimax", "alphabeta", "hybrid", "mcts")
+# policy モデルを使う ai_type（キャッシュのキーにモデルの版を入れる）
+POLICY_AI_TYPES = ("hybrid", "mcts")
+SEARCH_CACHE = ResultCache()
+
+# minimax は窓なしで全葉を評価するので、静止探索は駒取り・成りのみ・少なめの予算に抑える
+MINIMAX_QS_BUDGET = 8
+# 予算（budget）の指定が無いときの minimax の深さ（ルートの手を含む手数。従来どおり2手読み）
+MINIMAX_DEPTH = 2
+
+def make_search_position(board, backend=None):
+    factory = SEARCH_BACKENDS.get(backend or DEFAULT_BACKEND)
+    if factory is None:
+        print(f"⚠️ 未知の backend={backend} のため {DEFAULT_BACKEND} を使います")
+        factory = SEARCH_BACKENDS[DEFAULT_BACKEND]
+    return factory(board)
+
 def get_model():
     global _MODEL
     if _MODEL is not None:
@@ -99,75 +142,123 @@ def evaluate_move_simple(move, board):
     board.pop()
     return score
 
-def evaluate_move_minimax(move, board, depth=2):
-    value_table = {
-        shogi.PAWN: 1,
-        shogi.LANCE: 2,
-        shogi.KNIGHT: 3,
-        shogi.SILVER: 4,
-        shogi.GOLD: 5,
-        shogi.BISHOP: 8,
-        shogi.ROOK: 9,
-        shogi.KING: 0,
-    }
+def evaluate_board_simple(board):
+    """先手から見た評価値（駒価値 + 駒位置表 + 手駒。engine/evaluate.py の全走査版）"""
+    return evaluate_board(board)
+
+def _score_for_black(pos, qs=None):
+    # pos.evaluate() は手番側から見た値なので先手視点に直す
+    # qs（engine/search.Quiescence）を渡すと葉で駒の取り合いを読み切ってから評価する
+    s = qs.search(pos) if qs is not None else pos.evaluate()
+    return s if pos.turn == shogi.BLACK else -s
+
+class _MinimaxStop(Exception):
+    """minimax の予算切れ（読みかけの値は使わない）"""
+
 
-    def minimax(bd, current_depth, is_maximizing):
-        if current_depth == 0 or bd.is_game_over():
-            return 0
+class _MinimaxLimit:
+    """minimax の打ち切り判定。ノードごとに締切・ノード数（静止探索を含む）・stop_event を見る"""
 
-        legal_moves = list(bd.legal_moves)
+    def __init__(self, budget=None, stop_event=None, qs=None):
+        self.deadline = budget.deadline() if budget is not None else None
+        self.node_limit = budget.nodes if budget is not None else None
+        self.stop_event = stop_event
+        self.qs = qs
+        self.nodes = 0
+
+    def visit(self):
+        self.nodes += 1
+        if self.stop_event is not None and self.stop_event.is_set():
+            raise _MinimaxStop
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise _MinimaxStop
+        if self.node_limit is not None:
+            qnodes = self.qs.nodes if self.qs is not None else 0
+            if self.nodes + qnodes >= self.node_limit:
+                raise _MinimaxStop
+
+
+def evaluate_move_minimax(move, board, depth=2, pos=None, qs=None, limit=None):
+    """
+    move を指した後の局面を depth-1 手の minimax で評価（手番側から見た値）。
+    評価は PyShogiPosition の差分評価（葉で O(1)）を使う。
+    qs を渡すと葉で静止探索（駒取り・成り・王手のみ延長）してから評価する。
+    limit（_MinimaxLimit）を渡すと予算切れで _MinimaxStop を投げる（pos は元に戻してから抜ける）。
+    """
+    if pos is None:
+        pos = PyShogiPosition(board)
+    me = pos.turn
+
+    def minimax(current_depth, is_maximizing):
+        if limit is not None:
+            limit.visit()
+        if current_depth == 0:
+            s = _score_for_black(pos, qs)
+            return s if me == shogi.BLACK else -s
+
+        legal_moves = pos.moves()
         if not legal_moves:
-            return 0
+            # 手詰まり＝手番側の負け
+            return -MATE_SCORE if is_maximizing else MATE_SCORE
 
         if is_maximizing:
             best_score = -float('inf')
             for mv in legal_moves:
-                bd.push(mv)
-                score = 0
-                if bd.piece_at(mv.to_square):
-                    captured = bd.piece_at(mv.to_square).piece_type
-                    score += value_table.get(captured, 0)
-                score += minimax(bd, current_depth - 1, False)
-                bd.pop()
+                pos.push(mv)
+                try:
+                    score = minimax(current_depth - 1, False)
+                finally:
+                    pos.pop()
                 best_score = max(best_score, score)
             return best_score
         else:
             best_score = float('inf')
             for mv in legal_moves:
-                bd.push(mv)
-                score = minimax(bd, current_depth - 1, True)
-                bd.pop()
+                pos.push(mv)
+                try:
+                    score = minimax(current_depth - 1, True)
+                finally:
+                    pos.pop()
                 best_score = min(best_score, score)
             return best_score
 
-    board.push(move)
-    score = minimax(board, depth - 1, False)
-    board.pop()
+    pos.push(move)
+    try:
+        score = minimax(depth - 1, False)
+    finally:
+        pos.pop()
     return score
 
 
-def minimax(board, depth, is_maximizing):
+def minimax(board, depth, is_maximizing, pos=None, qs=None):
+    """先手を maximizing とする素朴な minimax。評価は差分評価（先手視点）。qs を渡すと葉で静止探索。"""
+    if pos is None:
+        pos = PyShogiPosition(board)
 
-    if depth == 0 or board.is_game_over():
-        return evaluate_board_simple(board), None
+    if depth == 0:
+        return _score_for_black(pos, qs), None
+
+    legal_moves = pos.moves()
+    if not legal_moves:
+        return (-MATE_SCORE if is_maximizing else MATE_SCORE), None
 
     best_move = None
     if is_maximizing:
         max_eval = float('-inf')
-        for move in board.legal_moves:
-            board.push(move)
-            eval, _ = minimax(board, depth - 1, False)
-            board.pop()
+        for move in legal_moves:
+            pos.push(move)
+            eval, _ = minimax(board, depth - 1, False, pos, qs)
+            pos.pop()
             if eval > max_eval:
                 max_eval = eval
                 best_move = move
         return max_eval, best_move
     else:
         min_eval = float('inf')
-        for move in board.legal_moves:
-            board.push(move)
-            eval, _ = minimax(board, depth - 1, True)
-            board.pop()
+        for move in legal_moves:
+            pos.push(move)
+            eval, _ = minimax(board, depth - 1, True, pos, qs)
+            pos.pop()
             if eval < min_eval:
                 min_eval = eval
                 best_move = move
@@ -181,24 +272,269 @@ def choose_best_move_simple(board):
     best_move = max(legal_moves, key=lambda m: evaluate_move_simple(m, board))
     return best_move
 
-def choose_best_move_minimax(board):
-    legal_moves = list(board.legal_moves)
+def choose_best_move_minimax(board, backend=None, quiescence=True, budget=None, stop_event=None,
+                             info=None):
+    """
+    ルートの各手を minimax で評価して最善手を返す。budget が無ければ MINIMAX_DEPTH（2手読み）。
+    budget（engine/budget.SearchBudget）があれば深さ1から budget.max_depth まで反復深化し、
+    締切・ノード数の上限（静止探索を含む）に達したら最後に読み終えた深さの最善手を返す
+    （深さ1も読み終わらなければ、評価できた手の中から選ぶ）。
+    stop_event が set されたら読みかけの局面で打ち切る。
+    info に dict を渡すと "score"（手番側から見た評価値）と "depth" を入れて返す。
+    """
+    pos = make_search_position(board, backend)
+    legal_moves = pos.moves()
     if not legal_moves:
         return None
-    best_move = max(legal_moves, key=lambda m: evaluate_move_minimax(m, board))
-    return best_move 
+    qs = Quiescence(MINIMAX_QS_BUDGET, check_plies=0) if quiescence else None
+    limit = _MinimaxLimit(budget, stop_event, qs) if (budget is not None or stop_event is not None) else None
+    if budget is not None:
+        legal_moves.sort(key=lambda m: order_key(pos, m), reverse=True)
+        max_depth, depth = max(1, budget.max_depth), 1
+    else:
+        max_depth = depth = MINIMAX_DEPTH
+
+    t0 = time.perf_counter()
+    deadline = limit.deadline if limit is not None else None
+    best_move, best_score, done_depth = None, -float('inf'), 0
+    while depth <= max_depth:
+        it_move, it_score, searched = None, -float('inf'), 0
+        try:
+            for m in legal_moves:
+                score = evaluate_move_minimax(m, board, depth, pos=pos, qs=qs, limit=limit)
+                searched += 1
+                if score > it_score:
+                    it_move, it_score = m, score
+        except _MinimaxStop:
+            print(f"⏱️ minimax: 予算切れ（深さ{depth}: {searched}/{len(legal_moves)} 手を評価）")
+            if best_move is None and it_move is not None:
+                best_move, best_score = it_move, it_score
+            break
+        best_move, best_score, done_depth = it_move, it_score, depth
+        # 次の深さは今の最善手から読む
+        legal_moves.remove(it_move)
+        legal_moves.insert(0, it_move)
+        if abs(best_score) >= MATE_SCORE:
+            break
+        # 次の深さは今までの数十倍かかるので、持ち時間の半分を過ぎていたら始めない
+        if deadline is not None and time.perf_counter() - t0 > (deadline - t0) * NEXT_ITERATION_RATIO:
+            break
+        depth += 1
+
+    if best_move is None:
+        # 1手も評価できないほど予算が小さいとき: 並べ替えの先頭
+        best_move, best_score = legal_moves[0], 0
+    print(f"🔺minimax: depth={done_depth} nodes={limit.nodes if limit is not None else '-'} "
+          f"qnodes={qs.nodes if qs is not None else 0}")
+    if info is not None:
+        info["score"] = best_score
+        info["depth"] = done_depth
+    return pos.to_shogi_move(best_move)
+
+def choose_best_move_alphabeta(board, max_depth=3, tt=None, backend=None, quiescence=True,
+                               budget=None, stop_event=None, workers=1, info=None):
+    """
+    反復深化 αβ（engine/search.py）で最善手を返す。board は探索後に元へ戻る。
+    tt に置換表を渡すと、同じ対局の前の手番で読んだ結果を再利用する。
+    backend は SEARCH_BACKENDS のキー（既定 "array"）。
+    quiescence=True なら末端で駒取り・成り・王手だけを延長する（水平線効果対策）。
+    budget（engine/budget.SearchBudget）を渡すと max_depth の代わりにその深さ・持ち時間・ノード数で読み、
+    締切の時点で読めている最善手を返す。stop_event を set すると別スレッドから打ち切れる。
+    workers > 1 なら Lazy SMP（engine/smp.py）で複数プロセスに読ませる。
+    このとき tt は engine/shared_tt.SharedTranspositionTable を渡す（それ以外なら探索ごとに共有表を作る）。
+    局面は常に "array" バックエンドで読む。
+    info に dict を渡すと "score"（手番側から見た評価値）と "depth" を入れて返す。
+    """
+    if workers and workers > 1:
+        return _choose_best_move_smp(board, max_depth, tt, quiescence, budget, stop_event, workers, info)
+
+    if budget is not None:
+        searcher = AlphaBetaSearcher(max_depth=budget.max_depth, tt=tt, quiescence=quiescence,
+                                     time_ms=budget.time_ms, node_limit=budget.nodes,
+                                     stop_event=stop_event)
+    else:
+        searcher = AlphaBetaSearcher(max_depth=max_depth, tt=tt, quiescence=quiescence,
+                                     stop_event=stop_event)
+    pos = make_search_position(board, backend)
+    result = searcher.search(pos)
+    print(f"🔺alphabeta: depth={result.depth} score={result.score} "
+          f"nodes={result.nodes} qnodes={result.qnodes} time={result.elapsed:.3f}s"
+          f"{' (stopped)' if result.stopped else ''}")
+    if tt is not None:
+        st = tt.stats()
+        print(f"🔺tt: hit_rate={st['hit_rate']:.2%} fill={st['fill']:.1%} "
+              f"ceiling={st['memory_ceiling_bytes'] / 1e6:.1f}MB")
+    if info is not None:
+        info.update(score=result.score, depth=result.depth)
+    if result.move is None:
+        return None
+    return pos.to_shogi_move(result.move)
+
+def _choose_best_move_smp(board, max_depth, tt, quiescence, budget, stop_event, workers, info=None):
+    if budget is not None:
+        max_depth, time_ms, nodes = budget.max_depth, budget.time_ms, budget.nodes
+    else:
+        time_ms = nodes = None
+    searcher = LazySMPSearcher(workers=workers, max_depth=max_depth, tt=tt, time_ms=time_ms,
+                               node_limit=nodes, stop_event=stop_event, quiescence=quiescence)
+    result = searcher.search(board)
+    depths = ",".join(str(r["depth"]) for r in searcher.last_workers)
+    print(f"🔺alphabeta[smp x{workers}]: depth={result.depth} score={result.score} "
+          f"nodes={result.nodes} time={result.elapsed:.3f}s worker_depths={depths}"
+          f"{' (stopped)' if result.stopped else ''}")
+    if info is not None:
+        info.update(score=result.score, depth=result.depth)
+    if result.move is None:
+        return None
+    return decode_move(result.move)
+
+def choose_best_move_hybrid(board, policy, max_depth=3, tt=None, quiescence=True, budget=None,
+                            stop_event=None, info=None):
+    """
+    policy 併用の αβ（engine/hybrid.py）。policy は learn/infer.PolicyAgent。
+    手の並べ替えと深い局面の枝刈り（上位 k 手）に policy を使い、評価は αβ と同じ。
+    モデルが無いときは通常の αβ で読む。
+    """
+    try:
+        version, forward = policy.search_forward()
+    except (AttributeError, FileNotFoundError):
+        print("⚠️ hybrid: policy モデルが無いため alphabeta で読みます")
+        return choose_best_move_alphabeta(board, max_depth=max_depth, tt=tt, quiescence=quiescence,
+                                          budget=budget, stop_event=stop_event, info=info)
+
+    if budget is not None:
+        searcher = HybridSearcher(forward, max_depth=budget.max_depth, tt=tt, quiescence=quiescence,
+                                  time_ms=budget.time_ms, node_limit=budget.nodes,
+                                  stop_event=stop_event)
+    else:
+        searcher = HybridSearcher(forward, max_depth=max_depth, tt=tt, quiescence=quiescence,
+                                  stop_event=stop_event)
+    result = searcher.search(ArrayPosition.from_board(board))
+    print(f"🔺hybrid: depth={result.depth} score={result.score} nodes={result.nodes} "
+          f"policy_calls={searcher.policy_calls} policy_positions={searcher.policy_positions} "
+          f"time={result.elapsed:.3f}s model={version}"
+          f"{' (stopped)' if result.stopped else ''}")
+    if info is not None:
+        info.update(score=result.score, depth=result.depth, model_version=version)
+    if result.move is None:
+        return None
+    return decode_move(result.move)
+
+def choose_best_move_mcts(board, policy, budget=None, stop_event=None, info=None):
+    """
+    MCTS（engine/mcts.py）。policy は learn/infer.PolicyAgent（value head があれば葉の評価に使う）。
+    budget の time_ms で打ち切り、nodes は MCTS_NODES_PER_PLAYOUT で割ってプレイアウト数の上限にする。
+    モデルが無いときは通常の αβ で読む。
+    """
+    try:
+        version, forward = policy.search_forward(with_value=True)
+    except (AttributeError, FileNotFoundError):
+        print("⚠️ mcts: policy モデルが無いため alphabeta で読みます")
+        return choose_best_move_alphabeta(board, budget=budget, stop_event=stop_event, info=info)
+
+    playouts = MCTS_PLAYOUTS
+    time_ms = None
+    if budget is not None:
+        time_ms = budget.time_ms
+        if budget.nodes is not None:
+            playouts = max(MCTS_BATCH_SIZE, budget.nodes // MCTS_NODES_PER_PLAYOUT)
+    searcher = MCTSSearcher(forward, playouts=playouts, time_ms=time_ms, stop_event=stop_event)
+    result = searcher.search(ArrayPosition.from_board(board))
+    rate = result.nodes / result.elapsed if result.elapsed else 0.0
+    print(f"🔺mcts: playouts={result.nodes} ({rate:.0f}/s) forwards={searcher.forward_calls} "
+          f"mean_batch={searcher.evaluated / max(1, searcher.forward_calls):.1f} "
+          f"depth={result.depth} score={result.score} time={result.elapsed:.3f}s model={version}"
+          f"{' (stopped)' if result.stopped else ''}")
+    if info is not None:
+        info.update(score=result.score, depth=result.depth, model_version=version)
+    if result.move is None:
+        return None
+    return decode_move(result.move)
+
+def _search_cache_key(board, ai_type, budget, kwargs):
+    """
+    (局面ハッシュ, ai_type, 探索設定)。予算が無ければ max_depth で読むので、それをキーに入れる。
+    hybrid / mcts は policy モデルの版もキーに入れる。
+    """
+    return (board_hash(board), ai_type,
+            kwargs.get("backend") or DEFAULT_BACKEND,
+            bool(kwargs.get("quiescence", True)),
+            budget if budget is not None else kwargs.get("max_depth", 3),
+            int(kwargs.get("workers", 1) or 1),
+            getattr(kwargs.get("policy"), "model_version", None) if ai_type in POLICY_AI_TYPES else None)
+
+def _search_move(board, ai_type, budget, kwargs, info):
+    if ai_type == "minimax":
+        return choose_best_move_minimax(board, backend=kwargs.get("backend"),
+                                        quiescence=kwargs.get("quiescence", True), budget=budget,
+                                        stop_event=kwargs.get("stop_event"), info=info)
+    if ai_type == "hybrid":
+        return choose_best_move_hybrid(board, kwargs.get("policy"), max_depth=kwargs.get("max_depth", 3),
+                                       tt=kwargs.get("tt"), quiescence=kwargs.get("quiescence", True),
+                                       budget=budget, stop_event=kwargs.get("stop_event"), info=info)
+    if ai_type == "mcts":
+        return choose_best_move_mcts(board, kwargs.get("policy"), budget=budget,
+                                     stop_event=kwargs.get("stop_event"), info=info)
+    return choose_best_move_alphabeta(board, max_depth=kwargs.get("max_depth", 3),
+                                      tt=kwargs.get("tt"), backend=kwargs.get("backend"),
+                                      quiescence=kwargs.get("quiescence", True), budget=budget,
+                                      stop_event=kwargs.get("stop_event"),
+                                      workers=kwargs.get("workers", 1), info=info)
+
+def _cached_search_move(board, ai_type, budget, kwargs):
+    """
+    SEARCH_CACHE（kwargs の cache で差し替え、None で無効）に同じ局面・同じ設定の答えがあればそれを返す。
+    外から止められた（stop_event が立った）探索の答えは保存しない。
+    kwargs の info（dict）に探索の "score" などを入れて返す（hybrid / mcts は "model_version" も）。
+    """
+    info = kwargs.get("info")
+    if info is None:
+        info = {}
+    cache = kwargs.get("cache", SEARCH_CACHE)
+    if cache is None:
+        return _search_move(board, ai_type, budget, kwargs, info)
+
+    key = _search_cache_key(board, ai_type, budget, kwargs)
+    hit = cache.get(key)
+    if hit is not None:
+        move = shogi.Move.from_usi(hit[0])
+        if is_legal_move(board, move):
+            print(f"♻️ cache: {hit[0]} score={hit[1]}")
+            # キーに policy モデルの版が入っているので、当たった手はその版が選んだ手
+            info.update(score=hit[1], model_version=key[-1])
+            return move
+
+    move = _search_move(board, ai_type, budget, kwargs, info)
+    stop_event = kwargs.get("stop_event")
+    if move is not None and not (stop_event is not None and stop_event.is_set()):
+        cache.put(key, (move.usi(), info.get("score")))
+    return move
     
 def choose_ai_move(board, ai_type="simple", **kwargs):
     """
     ai_type は明示引数にするのが分かりやすい。
     既存呼び出し側が choose_ai_move(board, ai_type=ai_type) ならそのまま動きます。
+    info=dict を渡すと探索系の結果（"score"、hybrid / mcts は手を選んだ policy の "model_version"）を入れて返す。
     """
     # kwargs 側から渡された場合にも対応（冗長だが安全網）
     if "ai_type" in kwargs:
         ai_type = kwargs["ai_type"]
 
+    # 探索系の予算: budget を直接渡すか、level / time_ms / nodes で指定（engine/budget.py）
+    budget = kwargs.get("budget")
+    if budget is None and any(kwargs.get(k) is not None for k in ("level", "time_ms", "nodes")):
+        budget = resolve_budget(kwargs.get("level"), kwargs.get("time_ms"), kwargs.get("nodes"),
+                                kwargs.get("max_depth"))
+
     print("🔺ai_type =", ai_type)
 
+    # 序盤は定跡に手があれば探索しない（use_book=False で無効）
+    if ai_type in BOOK_AI_TYPES and kwargs.get("use_book", True):
+        move = book_move(board)
+        if move is not None:
+            print("📖 book:", move.usi())
+            return move
+
     if ai_type == "learning":
         try:
             return choose_best_move_learning(board)
@@ -206,7 +542,7 @@ def choose_ai_move(board, ai_type="simple", **kwargs):
             # モデルが無い時は簡易AIにフォールバック
             print("⚠️ 学習モデル未検出のため simple にフォールバックします")
             return choose_best_move_simple(board)
-    elif ai_type == "minimax":
-        return choose_best_move_minimax(board)
+    elif ai_type in SEARCH_CACHE_AI_TYPES:
+        return _cached_search_move(board, ai_type, budget, kwargs)
     else:
         return choose_best_move_simple(board)
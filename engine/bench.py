@@ -0,0 +1,236 @@
+# engine/bench.py
+# 指し手生成・探索のベンチマーク（リリース間の性能劣化チェック用）
+#
+#   python -m engine.bench                       # 既定: kifu/pvp + 標準局面、結果は bench/ に JSON
+#   python -m engine.bench --perft-depth 3 --out bench/latest.json
+#   python -m engine.bench --baseline bench/v1.json   # 前回結果と比べて遅くなっていたら exit 1
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import shogi
+
+from .board_adapter import PyShogiPosition
+from .kifu import load_games, replay
+from .position import ArrayPosition
+
+# 標準局面（expected: 深さ→perft 値。分かっているものだけ照合する）
+STANDARD_POSITIONS = [
+    {
+        "name": "startpos",
+        "sfen": shogi.STARTING_SFEN,
+        "expected": {1: 30, 2: 900, 3: 25470, 4: 719731},
+    },
+    {
+        # 合法手数最大（593手）として知られる局面
+        "name": "max_moves_593",
+        "sfen": "R8/2K1S1SSk/4B4/9/9/9/9/9/1L1L1L3 b RBGSNLP3g3n17p 1",
+        "expected": {1: 593},
+        "max_depth": 2,   # 深さ3は5千万局面を超えるので測らない
+    },
+]
+
+BACKENDS = {
+    "array": ArrayPosition.from_board,
+    "python-shogi": PyShogiPosition,
+}
+
+AI_TYPES = ["simple", "minimax", "alphabeta", "learning", "hybrid", "mcts"]
+
+
+def kifu_positions(folders, stride=20, limit=None):
+    """棋譜を再生して stride 手ごとの局面を集める。return: [{"name", "sfen"}]"""
+    out = []
+    for folder in folders:
+        for p, data in load_games(folder):
+            for ply, (board, _move) in enumerate(replay(data)):
+                if ply % stride == 0:
+                    out.append({"name": f"{p.stem}@{ply}", "sfen": board.sfen()})
+                    if limit and len(out) >= limit:
+                        return out
+    return out
+
+
+def perft(pos, depth):
+    if depth == 0:
+        return 1
+    moves = pos.moves()
+    if depth == 1:
+        return len(moves)
+    n = 0
+    for m in moves:
+        pos.push(m)
+        n += perft(pos, depth - 1)
+        pos.pop()
+    return n
+
+
+def bench_movegen(positions, backend, perft_depth, repeat):
+    """
+    1) 合法手生成: 各局面で moves() を repeat 回 → 生成した手数 / 秒
+    2) push/pop   : 全合法手を push→pop → 回数 / 秒
+    3) perft      : 標準局面のみ perft_depth まで（期待値があれば照合）
+    """
+    make = BACKENDS[backend]
+    gen_moves = gen_calls = 0
+    t_gen = 0.0
+    pushpop = 0
+    t_pp = 0.0
+    for item in positions:
+        pos = make(shogi.Board(item["sfen"]))
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            ms = pos.moves()
+        t_gen += time.perf_counter() - t0
+        gen_calls += repeat
+        gen_moves += len(ms) * repeat
+
+        t0 = time.perf_counter()
+        for m in ms:
+            pos.push(m)
+            pos.pop()
+        t_pp += time.perf_counter() - t0
+        pushpop += len(ms)
+
+    perfts = []
+    for item in STANDARD_POSITIONS:
+        pos = make(shogi.Board(item["sfen"]))
+        for d in range(1, min(perft_depth, item.get("max_depth", perft_depth)) + 1):
+            t0 = time.perf_counter()
+            n = perft(pos, d)
+            dt = time.perf_counter() - t0
+            exp = item["expected"].get(d)
+            perfts.append({
+                "position": item["name"], "depth": d, "nodes": n,
+                "seconds": dt, "nps": n / dt if dt > 0 else None,
+                "expected": exp, "ok": (exp is None or exp == n),
+            })
+
+    return {
+        "backend": backend,
+        "positions": len(positions),
+        "legal_moves_per_sec": gen_moves / t_gen if t_gen > 0 else None,
+        "movegen_calls_per_sec": gen_calls / t_gen if t_gen > 0 else None,
+        "pushpop_per_sec": pushpop / t_pp if t_pp > 0 else None,
+        "perft": perfts,
+    }
+
+
+def bench_ai_types(positions, ai_types, per_type):
+    """
+    choose_ai_move を ai_type ごとに回して 手/秒 を測る（ai.py が読めなければ skip を記録）。
+    定跡・探索結果のキャッシュに答えさせると探索の速さを測れないので、どちらも使わない
+    """
+    try:
+        from ai import choose_ai_move
+    except Exception as e:   # tensorflow 未導入など
+        return [{"ai_type": t, "skipped": f"{e.__class__.__name__}: {e}"} for t in ai_types]
+
+    out = []
+    for ai_type in ai_types:
+        n = 0
+        t0 = time.perf_counter()
+        try:
+            for item in positions[:per_type]:
+                board = shogi.Board(item["sfen"])
+                choose_ai_move(board, ai_type=ai_type, use_book=False, cache=None)
+                n += 1
+        except Exception as e:
+            out.append({"ai_type": ai_type, "error": f"{e.__class__.__name__}: {e}", "moves": n})
+            continue
+        dt = time.perf_counter() - t0
+        out.append({
+            "ai_type": ai_type, "moves": n, "seconds": dt,
+            "moves_per_sec": n / dt if dt > 0 else None,
+        })
+    return out
+
+
+def compare_with_baseline(result, baseline, tolerance):
+    """throughput 系の指標が baseline より tolerance 以上遅ければ列挙して返す"""
+    def index(res):
+        m = {}
+        for mg in res.get("movegen", []):
+            for k in ("legal_moves_per_sec", "pushpop_per_sec"):
+                m[f"{mg['backend']}.{k}"] = mg.get(k)
+        for a in res.get("ai_types", []):
+            m[f"ai.{a['ai_type']}.moves_per_sec"] = a.get("moves_per_sec")
+        return m
+
+    cur, old = index(result), index(baseline)
+    regressions = []
+    for k, v in cur.items():
+        ov = old.get(k)
+        if v and ov and v < ov * (1.0 - tolerance):
+            regressions.append({"metric": k, "baseline": ov, "current": v, "ratio": v / ov})
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Perft / move-generation / AI throughput benchmark.")
+    ap.add_argument("--folders", nargs="*", default=["kifu/pvp"])
+    ap.add_argument("--stride", type=int, default=20, help="棋譜から何手おきに局面を取るか")
+    ap.add_argument("--limit", type=int, default=None, help="棋譜局面の最大数")
+    ap.add_argument("--backends", nargs="*", default=list(BACKENDS))
+    ap.add_argument("--perft-depth", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=5, help="局面ごとの指し手生成の繰り返し回数")
+    ap.add_argument("--ai-types", nargs="*", default=AI_TYPES)
+    ap.add_argument("--ai-positions", type=int, default=5, help="ai_type ごとに指させる局面数")
+    ap.add_argument("--out", default=None, help="結果JSON（既定: bench/bench_<日時>.json）")
+    ap.add_argument("--baseline", default=None, help="比較する過去の結果JSON")
+    ap.add_argument("--tolerance", type=float, default=0.10, help="許容する速度低下（0.10=10%%）")
+    args = ap.parse_args()
+
+    positions = [{"name": it["name"], "sfen": it["sfen"]} for it in STANDARD_POSITIONS]
+    positions += kifu_positions(args.folders, stride=args.stride, limit=args.limit)
+    print(f"📦 positions={len(positions)} (standard={len(STANDARD_POSITIONS)})")
+
+    movegen = []
+    for backend in args.backends:
+        # python-shogi は遅いので perft は深さ2までに抑える
+        depth = args.perft_depth if backend == "array" else min(args.perft_depth, 2)
+        r = bench_movegen(positions, backend, depth, args.repeat)
+        movegen.append(r)
+        print(f"⚙️ {backend}: legal_moves/s={r['legal_moves_per_sec']:.0f} "
+              f"push+pop/s={r['pushpop_per_sec']:.0f}")
+        for pf in r["perft"]:
+            mark = "✅" if pf["ok"] else "❌"
+            print(f"   {mark} perft {pf['position']} d={pf['depth']} nodes={pf['nodes']} "
+                  f"({pf['nps'] or 0:.0f} nps)")
+
+    ai_types = bench_ai_types(positions, args.ai_types, args.ai_positions) if args.ai_types else []
+    for a in ai_types:
+        print(f"🤖 {a}")
+
+    result = {
+        "timestamp": datetime.now().strftime("%Y%m%d-%H%M%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "args": vars(args),
+        "movegen": movegen,
+        "ai_types": ai_types,
+    }
+
+    out = Path(args.out or f"bench/bench_{result['timestamp']}.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"💾 saved: {out}")
+
+    failed = any(not pf["ok"] for mg in movegen for pf in mg["perft"])
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_with_baseline(result, baseline, args.tolerance)
+        for r in regressions:
+            print(f"⚠️ regression {r['metric']}: {r['baseline']:.0f} → {r['current']:.0f} ({r['ratio']:.2f}x)")
+        failed = failed or bool(regressions)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
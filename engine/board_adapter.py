@@ -0,0 +1,99 @@
+# engine/board_adapter.py
+# python-shogi の Board を探索エンジン用の共通インタフェースで包む
+import shogi
+
+from .evaluate import IncrementalEvaluator
+from .movecode import encode_move
+from .zobrist import board_hash, move_delta
+
+
+def is_legal_move(board: shogi.Board, move: shogi.Move) -> bool:
+    """
+    候補手1つの合法判定（legal_moves を全列挙しない）。
+    python-shogi の is_legal は打ち先に相手の駒があっても通してしまう（自分の駒しか見ない）ので、
+    打つ手は打ち先が空いていることも確かめる
+    """
+    if move.drop_piece_type is not None and board.piece_at(move.to_square) is not None:
+        return False
+    return board.is_legal(move)
+
+
+class PyShogiPosition:
+    """
+    探索エンジン（engine/search.py）が使う局面インタフェースの python-shogi 実装。
+      moves()      : 合法手リスト
+      tactical_moves(checks): 駒取り・成り（checks=True なら王手も）だけの合法手
+      push / pop   : 1手進める / 戻す
+      captured(m)  : m で取られる駒種（無ければ 0）
+      mover(m)     : m で動く（打つ）駒種
+      promotes(m)  : 成る手か
+      in_check()   : 手番側が王手されているか
+      gives_check(m): m を指すと相手に王手がかかるか
+      evaluate()   : 手番側から見た評価値（engine/evaluate.py の差分評価で O(1)）
+      key()        : 局面の Zobrist ハッシュ（盤・手駒・手番）
+      encode(m)    : 置換表に入れる手の int 符号（engine/movecode.py）
+      to_shogi_move(m): ルートの結果を shogi.Move に戻す
+    渡された Board をその場で push/pop するので、探索後は元の局面に戻る。
+    """
+
+    def __init__(self, board: shogi.Board):
+        self.board = board
+        self._key = board_hash(board)
+        self._key_stack = []
+        self._eval = IncrementalEvaluator(board)
+
+    @property
+    def turn(self):
+        return self.board.turn
+
+    def moves(self):
+        return list(self.board.legal_moves)
+
+    def tactical_moves(self, checks=False):
+        return [m for m in self.board.legal_moves
+                if self.captured(m) or m.promotion or (checks and self.gives_check(m))]
+
+    def push(self, move):
+        self._key_stack.append(self._key)
+        self._key ^= move_delta(self.board, move)
+        self._eval.push(self.board, move)
+        self.board.push(move)
+
+    def pop(self):
+        self.board.pop()
+        self._eval.pop()
+        self._key = self._key_stack.pop()
+
+    def key(self) -> int:
+        return self._key
+
+    def encode(self, move) -> int:
+        return encode_move(move)
+
+    def captured(self, move) -> int:
+        if move.drop_piece_type:
+            return 0
+        return self.board.piece_type_at(move.to_square)
+
+    def mover(self, move) -> int:
+        if move.drop_piece_type:
+            return move.drop_piece_type
+        return self.board.piece_type_at(move.from_square)
+
+    def promotes(self, move) -> bool:
+        return bool(move.promotion)
+
+    def in_check(self) -> bool:
+        return self.board.is_check()
+
+    def gives_check(self, move) -> bool:
+        self.board.push(move)
+        check = self.board.is_check()
+        self.board.pop()
+        return check
+
+    def evaluate(self) -> int:
+        return self._eval.score_for(self.board.turn)
+
+    def to_shogi_move(self, move):
+        return move
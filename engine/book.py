@@ -0,0 +1,292 @@
+# engine/book.py
+# 定跡（opening book）: 棋譜アーカイブの序盤を「局面ハッシュ → 指し手の統計」にまとめた二値ファイル
+#
+#   python -m engine.book build                         # kifu/pvp と kifu/pvp_flip から（差分）作成
+#   python -m engine.book build --full                  # 全棋譜から作り直す
+#   python -m engine.book probe --sfen "<SFEN>"         # 局面の定跡手を表示
+#
+# ファイル形式（リトルエンディアン）
+#   ヘッダ : magic "SNBK" / version(uint32) / 件数(uint32)
+#   レコード: key(uint64) / move(uint32, engine/movecode) / count(uint32) / wins(uint32)
+#   key → move の昇順に並べてあるので、mmap したまま二分探索で引ける。
+#
+# 差分作成: 取り込んだ棋譜の ID（フォルダ/ファイル名:手順の sha1）を kifu/registry/book.json に記録し、
+# 新しい棋譜だけを再生して既存の統計に足す。記録済みの棋譜が消えた・変わったときは全部作り直す。
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import random
+import struct
+import threading
+from pathlib import Path
+
+import shogi
+
+from .board_adapter import is_legal_move
+from .kifu import load_games, replay
+from .movecode import decode_move, encode_move
+from .zobrist import board_hash
+
+BOOK_PATH = "models/opening_book.bin"
+BOOK_REGISTRY = "kifu/registry/book.json"
+BOOK_FOLDERS = ("kifu/pvp", "kifu/pvp_flip")
+BOOK_MAX_PLY = 24      # 各棋譜の何手目までを定跡に入れるか
+BOOK_MIN_COUNT = 1     # これ未満しか指されていない手は使わない
+
+_MAGIC = b"SNBK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sII")
+_RECORD = struct.Struct("<QIII")
+
+
+# ==== 作成 ====
+def _game_id(path: Path, data: dict) -> str:
+    moves = data.get("moves") or [m.get("usi") for m in data.get("kifu", []) if isinstance(m, dict)]
+    digest = hashlib.sha1(json.dumps([moves, bool(data.get("flipped"))]).encode("utf-8")).hexdigest()
+    return f"{path.parent.name}/{path.name}:{digest}"
+
+
+def _mover_won(data: dict, ply: int):
+    """ply 手目を指した側が勝ったか（勝敗不明なら None）"""
+    first, winner = data.get("first"), data.get("winner")
+    if first not in ("main", "sub") or winner not in ("main", "sub"):
+        return None
+    mover = first if ply % 2 == 0 else ("sub" if first == "main" else "main")
+    return mover == winner
+
+
+def collect_stats(games, max_ply: int = BOOK_MAX_PLY, stats: dict | None = None) -> dict:
+    """games: (path, data) の列。return: {(key, move_code): [count, wins]}"""
+    stats = {} if stats is None else stats
+    for _path, data in games:
+        for ply, (board, move) in enumerate(replay(data)):
+            if ply >= max_ply:
+                break
+            e = stats.setdefault((board_hash(board), encode_move(move)), [0, 0])
+            e[0] += 1
+            if _mover_won(data, ply):
+                e[1] += 1
+    return stats
+
+
+def write_book(stats: dict, path: str = BOOK_PATH) -> int:
+    """統計を key→move 順に並べて書き出す（一時ファイル経由で置き換え）。return: レコード数"""
+    out = Path(path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    items = sorted(stats.items())
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(items)))
+        for (key, move), (count, wins) in items:
+            f.write(_RECORD.pack(key, move, min(count, 0xFFFFFFFF), min(wins, 0xFFFFFFFF)))
+    # Windows では map したままのファイルを置き換えられないので、このプロセスの map を先に手放す
+    release_book(path)
+    os.replace(tmp, out)
+    return len(items)
+
+
+def read_stats(path: str = BOOK_PATH) -> dict:
+    book = OpeningBook(path)
+    try:
+        return {(k, m): [c, w] for k, m, c, w in book.records()}
+    finally:
+        book.close()
+
+
+def _load_registry(path: str) -> list:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except Exception:
+        return []
+
+
+def build_book(folders=BOOK_FOLDERS, path: str = BOOK_PATH, registry: str = BOOK_REGISTRY,
+               max_ply: int = BOOK_MAX_PLY, full: bool = False) -> dict:
+    """
+    定跡ファイルを作る。既存の定跡と registry があれば、新しい棋譜だけを足す。
+    return: {"mode": "full"|"incremental"|"unchanged", "games_added", "records"}
+    """
+    games = [(p, data) for folder in folders for p, data in load_games(folder)]
+    ids = {_game_id(p, data): (p, data) for p, data in games}
+    done = set(_load_registry(registry))
+
+    incremental = not full and done and Path(path).exists() and done <= set(ids)
+    if incremental:
+        new = [ids[i] for i in sorted(set(ids) - done)]
+        if not new:
+            print(f"📖 book unchanged: {path}")
+            return {"mode": "unchanged", "games_added": 0, "records": None}
+        stats = collect_stats(new, max_ply, read_stats(path))
+        mode = "incremental"
+    else:
+        new = list(ids.values())
+        stats = collect_stats(new, max_ply)
+        mode = "full"
+
+    n = write_book(stats, path)
+    reg = Path(registry)
+    reg.parent.mkdir(parents=True, exist_ok=True)
+    reg.write_text(json.dumps(sorted(ids), ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"📖 book {mode}: games+={len(new)} records={n} → {path}")
+    return {"mode": mode, "games_added": len(new), "records": n}
+
+
+# ==== 参照 ====
+class OpeningBook:
+    """定跡ファイルを mmap して二分探索で引く（ファイル全体は読み込まない）"""
+
+    def __init__(self, path: str = BOOK_PATH):
+        self.path = str(path)
+        # mmap は fd を複製して持つので、ファイルは map したらすぐ閉じてよい
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)   # 空ファイルは ValueError
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != _MAGIC or version != _VERSION:
+            self.close()
+            raise ValueError(f"not an opening book: {self.path}")
+        self.count = count
+        self.mtime = os.path.getmtime(self.path)
+
+    def close(self):
+        """
+        map を手放す。別スレッドがまだ引いている途中かもしれないので mmap.close() は呼ばず
+        （読み取り中の map を閉じると BufferError）、参照を外すだけにする。
+        map は最後に使っていたスレッドが参照を離した時点で閉じられる
+        """
+        self._map = None
+
+    def _mapped(self) -> mmap.mmap:
+        """
+        今の map。引く側はこれを1回だけ取ってローカルで使う（別スレッドの close() で self._map が
+        None になっても、読み終わるまで map はそのまま使える）。close() の後なら ValueError
+        """
+        m = self._map
+        if m is None:
+            raise ValueError(f"opening book is closed: {self.path}")
+        return m
+
+    def records(self):
+        m = self._mapped()
+        for i in range(self.count):
+            yield _RECORD.unpack_from(m, _HEADER.size + i * _RECORD.size)
+
+    def lookup(self, key: int) -> list:
+        """return: [(move_code, count, wins), ...]。閉じられた定跡なら ValueError"""
+        m = self._mapped()
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if struct.unpack_from("<Q", m, _HEADER.size + mid * _RECORD.size)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        out = []
+        i = lo
+        while i < self.count:
+            k, move, count, wins = _RECORD.unpack_from(m, _HEADER.size + i * _RECORD.size)
+            if k != key:
+                break
+            out.append((move, count, wins))
+            i += 1
+        return out
+
+    def moves(self, board: shogi.Board, min_count: int = BOOK_MIN_COUNT) -> list:
+        """この局面の合法な定跡手。return: [(shogi.Move, count, wins), ...]（多く指された順）"""
+        out = []
+        for code, count, wins in self.lookup(board_hash(board)):
+            if count < min_count:
+                continue
+            move = decode_move(code)
+            if is_legal_move(board, move):
+                out.append((move, count, wins))
+        out.sort(key=lambda x: x[1], reverse=True)
+        return out
+
+    def pick(self, board: shogi.Board, rng=random, min_count: int = BOOK_MIN_COUNT):
+        """回数 + 勝ち数 で重みを付けて1手選ぶ（無ければ None）"""
+        cands = self.moves(board, min_count)
+        if not cands:
+            return None
+        weights = [count + wins for _, count, wins in cands]
+        return rng.choices([m for m, _, _ in cands], weights=weights)[0]
+
+
+# プロセス内で共有する定跡（ファイルが更新されたら開き直す）
+_books: dict = {}
+_books_lock = threading.Lock()
+
+
+def get_book(path: str = BOOK_PATH):
+    """定跡を開いて返す。ファイルが無い・壊れているときは None"""
+    with _books_lock:
+        book = _books.get(path)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = None
+        if book is not None and book.mtime == mtime:
+            return book
+        if book is not None:
+            book.close()
+            _books.pop(path, None)
+        if mtime is None:
+            return None
+        try:
+            book = OpeningBook(path)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 定跡を開けません: {path} ({e})")
+            return None
+        _books[path] = book
+        return book
+
+
+def release_book(path: str = BOOK_PATH):
+    with _books_lock:
+        book = _books.pop(path, None)
+        if book is not None:
+            book.close()
+
+
+def book_move(board: shogi.Board, path: str = BOOK_PATH):
+    """定跡手があれば shogi.Move を返す（無ければ None）"""
+    book = get_book(path)
+    if book is None:
+        return None
+    try:
+        return book.pick(board)
+    except ValueError:
+        # 作り直しで map が閉じられた直後など。次の手で開き直す
+        return None
+
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Build / probe the opening book.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--folders", nargs="*", default=list(BOOK_FOLDERS))
+    b.add_argument("--out", default=BOOK_PATH)
+    b.add_argument("--registry", default=BOOK_REGISTRY)
+    b.add_argument("--max-ply", type=int, default=BOOK_MAX_PLY)
+    b.add_argument("--full", action="store_true", default=False, help="差分ではなく全棋譜から作り直す")
+    p = sub.add_parser("probe")
+    p.add_argument("--book", default=BOOK_PATH)
+    p.add_argument("--sfen", default=shogi.STARTING_SFEN)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        build_book(args.folders, args.out, args.registry, args.max_ply, full=args.full)
+    else:
+        book = get_book(args.book)
+        if book is None:
+            raise SystemExit(f"定跡がありません: {args.book}")
+        board = shogi.Board(args.sfen)
+        for move, count, wins in book.moves(board):
+            print(f"{move.usi():8s} count={count} wins={wins}")
+
+
+if __name__ == "__main__":
+    main()
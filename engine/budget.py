@@ -0,0 +1,64 @@
+# engine/budget.py
+# 探索の予算（持ち時間・ノード数・最大深さ）と強さレベル
+#
+# 強さは「別のアルゴリズム」ではなく「同じ探索に与える予算」で決める。
+# 予算の上限が決まっているので、混雑時でも1手あたりの待ち時間が読める。
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class SearchBudget:
+    time_ms: int | None = None   # 持ち時間（ミリ秒）。None なら無制限
+    nodes: int | None = None     # 探索ノード数の上限。None なら無制限
+    max_depth: int = 3           # 反復深化の最大深さ
+
+    def deadline(self, t0: float | None = None) -> float | None:
+        """time.perf_counter() 基準の締切時刻"""
+        if self.time_ms is None:
+            return None
+        return (time.perf_counter() if t0 is None else t0) + self.time_ms / 1000.0
+
+
+# レベル名 → 予算（ai_type に関係なく同じ予算を使う）
+LEVELS = {
+    "beginner": SearchBudget(time_ms=100,  nodes=2_000,   max_depth=1),
+    "easy":     SearchBudget(time_ms=300,  nodes=10_000,  max_depth=2),
+    "normal":   SearchBudget(time_ms=1000, nodes=60_000,  max_depth=4),
+    "hard":     SearchBudget(time_ms=3000, nodes=250_000, max_depth=8),
+    "expert":   SearchBudget(time_ms=8000, nodes=None,    max_depth=16),
+}
+DEFAULT_LEVEL = "normal"
+
+# 旧来の呼び出し（予算の指定なし）と同じ振る舞い: 深さ3・時間無制限
+UNLIMITED = SearchBudget(max_depth=3)
+
+
+def resolve_budget(level=None, time_ms=None, nodes=None, max_depth=None,
+                   max_time_ms=None, default=UNLIMITED) -> SearchBudget:
+    """
+    level の予算を土台に、time_ms / nodes / max_depth の個別指定で上書きする。
+    level が無ければ default を土台にする。max_time_ms を渡すと持ち時間をその値で頭打ちにする。
+    数値は文字列でも受け付ける（リクエストの JSON 由来を想定）。
+    """
+    base = LEVELS.get(level) if level else None
+    if level and base is None:
+        print(f"⚠️ 未知の level={level} のため {DEFAULT_LEVEL} を使います")
+        base = LEVELS[DEFAULT_LEVEL]
+    budget = base or default
+
+    changes = {}
+    if time_ms is not None:
+        changes["time_ms"] = max(1, int(time_ms))
+    if nodes is not None:
+        changes["nodes"] = max(1, int(nodes))
+    if max_depth is not None:
+        changes["max_depth"] = max(1, int(max_depth))
+    if changes:
+        budget = replace(budget, **changes)
+
+    if max_time_ms is not None and (budget.time_ms is None or budget.time_ms > max_time_ms):
+        budget = replace(budget, time_ms=int(max_time_ms))
+    return budget
@@ -0,0 +1,132 @@
+# engine/evaluate.py
+# 探索エンジン共通の評価関数（駒価値 + 駒位置表 + 手駒）
+# python-shogi の piece_type 1..14 をそのまま添字に使う。評価値は先手から見た値で持つ。
+import shogi
+
+from .zobrist import UNPROMOTE
+
+# 盤上の駒価値（歩=100 基準）
+PIECE_VALUES = [0] * 15
+PIECE_VALUES[shogi.PAWN]        = 100
+PIECE_VALUES[shogi.LANCE]       = 300
+PIECE_VALUES[shogi.KNIGHT]      = 400
+PIECE_VALUES[shogi.SILVER]      = 500
+PIECE_VALUES[shogi.GOLD]        = 600
+PIECE_VALUES[shogi.BISHOP]      = 800
+PIECE_VALUES[shogi.ROOK]        = 1000
+PIECE_VALUES[shogi.KING]        = 0
+PIECE_VALUES[shogi.PROM_PAWN]   = 550
+PIECE_VALUES[shogi.PROM_LANCE]  = 550
+PIECE_VALUES[shogi.PROM_KNIGHT] = 550
+PIECE_VALUES[shogi.PROM_SILVER] = 570
+PIECE_VALUES[shogi.PROM_BISHOP] = 1100
+PIECE_VALUES[shogi.PROM_ROOK]   = 1300
+
+# 手駒の価値（打てる自由度のぶん盤上より少し高め）
+HAND_VALUES = [0] * 15
+HAND_VALUES[shogi.PAWN]   = 115
+HAND_VALUES[shogi.LANCE]  = 320
+HAND_VALUES[shogi.KNIGHT] = 420
+HAND_VALUES[shogi.SILVER] = 540
+HAND_VALUES[shogi.GOLD]   = 630
+HAND_VALUES[shogi.BISHOP] = 900
+HAND_VALUES[shogi.ROOK]   = 1100
+
+# ---- 駒位置表 ----
+# 段ごとのボーナス。添字 0 = 自陣の一番奥（先手なら i 段）… 8 = 敵陣の一番奥（先手なら a 段）
+_RANK_BONUS = {
+    shogi.PAWN:        [0, 0, 0, 2, 6, 10, 16, 20, 0],
+    shogi.LANCE:       [0, 0, 0, 0, 2, 4, 8, 12, 0],
+    shogi.KNIGHT:      [0, 0, 4, 8, 10, 12, 14, 0, 0],
+    shogi.SILVER:      [0, 4, 8, 12, 10, 8, 10, 6, 4],
+    shogi.GOLD:        [6, 10, 10, 6, 2, 0, 4, 4, 2],
+    shogi.BISHOP:      [0, 2, 4, 6, 6, 6, 8, 8, 8],
+    shogi.ROOK:        [0, 0, 0, 0, 2, 4, 15, 20, 20],
+    shogi.KING:        [20, 10, 0, -10, -20, -30, -40, -50, -60],
+    shogi.PROM_PAWN:   [0, 2, 4, 6, 8, 10, 14, 16, 16],
+    shogi.PROM_LANCE:  [0, 2, 4, 6, 8, 10, 14, 16, 16],
+    shogi.PROM_KNIGHT: [0, 2, 4, 6, 8, 10, 14, 16, 16],
+    shogi.PROM_SILVER: [0, 2, 4, 6, 8, 10, 14, 16, 16],
+    shogi.PROM_BISHOP: [0, 4, 8, 10, 12, 12, 14, 16, 16],
+    shogi.PROM_ROOK:   [0, 4, 8, 10, 12, 12, 16, 20, 20],
+}
+# 筋ごとのボーナス（玉は端寄り＝囲いやすい方を好む）。添字は中央からの距離 0..4
+_FILE_BONUS = {
+    shogi.KING:        [-12, -6, 0, 6, 4],
+    shogi.PROM_BISHOP: [6, 4, 2, 0, -2],
+}
+
+
+def _build_pst():
+    """PST[color][piece_type][square]: その駒がそのマスにあるときの（駒価値込みの）値"""
+    pst = [[[0] * 81 for _ in range(15)] for _ in range(2)]
+    for pt in shogi.PIECE_TYPES:
+        ranks = _RANK_BONUS.get(pt, [0] * 9)
+        files = _FILE_BONUS.get(pt, [0] * 5)
+        for sq in range(81):
+            r, c = divmod(sq, 9)
+            # 先手: i段(r=8) が奥。後手は 180度回転
+            pst[shogi.BLACK][pt][sq] = PIECE_VALUES[pt] + ranks[8 - r] + files[abs(c - 4)]
+            pst[shogi.WHITE][pt][80 - sq] = pst[shogi.BLACK][pt][sq]
+    return pst
+
+
+PST = _build_pst()
+
+
+def evaluate_board(board) -> int:
+    """先手から見た評価値（全走査版）。探索の開始時や単発の評価に使う。"""
+    score = 0
+    for sq in shogi.SQUARES:
+        pt = board.piece_type_at(sq)
+        if not pt:
+            continue
+        color = board.piece_at(sq).color
+        v = PST[color][pt][sq]
+        score += v if color == shogi.BLACK else -v
+    for color, sign in ((shogi.BLACK, 1), (shogi.WHITE, -1)):
+        for pt, cnt in board.pieces_in_hand[color].items():
+            score += sign * HAND_VALUES[pt] * cnt
+    return score
+
+
+def move_delta(board, move) -> int:
+    """push する前の局面で呼ぶ。先手から見た評価値の変化量を O(1) で返す。"""
+    color = board.turn
+    to = move.to_square
+    table = PST[color]
+    if move.drop_piece_type:
+        pt = move.drop_piece_type
+        d = table[pt][to] - HAND_VALUES[pt]
+    else:
+        pt = board.piece_type_at(move.from_square)
+        npt = shogi.PIECE_PROMOTED[pt] if move.promotion else pt
+        d = table[npt][to] - table[pt][move.from_square]
+        cap = board.piece_type_at(to)
+        if cap:
+            d += PST[color ^ 1][cap][to] + HAND_VALUES[UNPROMOTE[cap]]
+    return d if color == shogi.BLACK else -d
+
+
+class IncrementalEvaluator:
+    """
+    push/pop に合わせて評価値を差分更新する。葉での評価は O(1)。
+      ev = IncrementalEvaluator(board)
+      ev.push(board, move); board.push(move)   # ← push は盤を動かす前に呼ぶ
+      board.pop(); ev.pop()
+    """
+
+    def __init__(self, board):
+        self.score = evaluate_board(board)   # 先手から見た値
+        self._stack = []
+
+    def push(self, board, move):
+        self._stack.append(self.score)
+        self.score += move_delta(board, move)
+
+    def pop(self):
+        self.score = self._stack.pop()
+
+    def score_for(self, turn) -> int:
+        """手番側から見た評価値"""
+        return self.score if turn == shogi.BLACK else -self.score
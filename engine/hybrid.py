@@ -0,0 +1,123 @@
+# engine/hybrid.py
+# policy 併用の αβ（ai_type "hybrid"）: ネットワークの指し手確率で手を並べ、深い局面では上位 k 手だけ読む
+#
+#   searcher = HybridSearcher(forward, max_depth=4, top_k=8)
+#   result = searcher.search(ArrayPosition.from_board(board))     # SearchResult（move は int 符号）
+#
+# forward(x: (N,9,9,43) float32) -> logits (N,A)（learn/infer.PolicyAgent.search_forward など）。
+# 内部ノードを展開するとき、これから読む子局面の policy を1回の forward でまとめて求めておく。
+# 子局面に入った時点で並べ替えに使う logits はもう手元にあるので、推論は「兄弟ごとに1回」で済む。
+from __future__ import annotations
+
+import numpy as np
+
+from learn.encode import position_to_planes
+from learn.sfen_action import BOARD_ACTIONS, DROP_ACTIONS
+
+from .movecode import DROP_BASE, PROMOTE_BIT
+from .search import AlphaBetaSearcher, SearchResult, order_key
+
+HYBRID_TOP_K = 8               # 深い局面で読む手の数（policy の上位）
+HYBRID_FULL_WIDTH_PLIES = 1    # ルートからこの手数までは全部の手を読む
+HYBRID_CACHE_ENTRIES = 20_000  # 局面ごとの logits（合法手ぶんだけ）を持っておく数
+
+_BOARD_IDS = BOARD_ACTIONS.ravel().tolist()
+_DROP_IDS = DROP_ACTIONS.ravel().tolist()
+
+
+def move_code_to_action_id(code: int) -> int:
+    """engine/movecode の int 符号 → learn/constants の action_id"""
+    to = code & 0x7F
+    frm = (code >> 7) & 0x7F
+    if frm > DROP_BASE:
+        return _DROP_IDS[(frm - DROP_BASE) * 81 + to]
+    return _BOARD_IDS[(frm * 81 + to) * 2 + (1 if code & PROMOTE_BIT else 0)]
+
+
+class HybridSearcher(AlphaBetaSearcher):
+    """
+    AlphaBetaSearcher の手の選び方だけを policy で置き換えたもの（評価・静止探索・置換表はそのまま）。
+    - 並べ替え: 前反復の読み筋 → 置換表の手 → policy の logits の高い順
+    - 枝刈り  : full_width_plies 以降の王手されていない局面では上位 top_k 手だけ読む
+    位置は ArrayPosition（board / hands / turn を持つもの）を想定。
+    """
+
+    def __init__(self, forward, top_k: int = HYBRID_TOP_K,
+                 full_width_plies: int = HYBRID_FULL_WIDTH_PLIES, **kwargs):
+        super().__init__(**kwargs)
+        self.forward = forward
+        self.top_k = max(1, int(top_k))
+        self.full_width_plies = max(0, int(full_width_plies))
+        self._logits: dict = {}     # 局面キー → {手: logit}
+        self._buf = np.zeros((0, 9, 9, 43), dtype=np.float32)
+        self.policy_calls = 0
+        self.policy_positions = 0
+
+    def search(self, pos) -> SearchResult:
+        self.policy_calls = 0
+        self.policy_positions = 0
+        return super().search(pos)
+
+    # ---------- policy ----------
+    def _evaluate(self, keys, moves_lists, n):
+        """self._buf[:n] の局面をまとめて推論し、合法手の logits だけを覚えておく"""
+        logits = np.asarray(self.forward(self._buf[:n]))
+        self.policy_calls += 1
+        self.policy_positions += n
+        if len(self._logits) + n > HYBRID_CACHE_ENTRIES:
+            self._logits.clear()
+        for i, (key, moves) in enumerate(zip(keys, moves_lists)):
+            ids = [move_code_to_action_id(m) for m in moves]
+            self._logits[key] = dict(zip(moves, logits[i, ids].tolist()))
+
+    def _reserve(self, n):
+        if len(self._buf) < n:
+            self._buf = np.zeros((max(n, 2 * len(self._buf)), 9, 9, 43), dtype=np.float32)
+
+    def _priors(self, pos, moves) -> dict:
+        key = pos.key()
+        priors = self._logits.get(key)
+        if priors is None:
+            # ルート、または先読みから漏れた局面だけ単発で推論する
+            self._reserve(1)
+            position_to_planes(pos.board, pos.hands, pos.turn, out=self._buf[0])
+            self._evaluate([key], [moves], 1)
+            priors = self._logits[key]
+        return priors
+
+    def _prefetch(self, pos, moves):
+        """これから読む子局面の logits を1回の forward でまとめて求める"""
+        keys, moves_lists = [], []
+        self._reserve(len(moves))
+        for mv in moves:
+            pos.push(mv)
+            key = pos.key()
+            if key not in self._logits:
+                child_moves = pos.moves()
+                if child_moves:
+                    position_to_planes(pos.board, pos.hands, pos.turn, out=self._buf[len(keys)])
+                    keys.append(key)
+                    moves_lists.append(child_moves)
+            pos.pop()
+        if keys:
+            self._evaluate(keys, moves_lists, len(keys))
+
+    # ---------- 手の選び方 ----------
+    def _select_moves(self, pos, moves, pv_move, tt_move, ply, depth):
+        priors = self._priors(pos, moves)
+        neg_inf = -float("inf")
+
+        def key(mv):
+            if pv_move is not None and mv == pv_move:
+                return (2, 0.0, 0)
+            if tt_move is not None and pos.encode(mv) == tt_move:
+                return (1, 0.0, 0)
+            return (0, priors.get(mv, neg_inf), order_key(pos, mv))
+        ordered = sorted(moves, key=key, reverse=True)
+
+        if ply >= self.full_width_plies and len(ordered) > self.top_k and not pos.in_check():
+            ordered = ordered[:self.top_k]
+        # 子局面も内部ノード（depth-1 >= 1）なら、その並べ替えに使う logits をまとめて用意する
+        if depth >= 2 and not self._stop:
+            self._prefetch(pos, ordered)
+        return ordered
@@ -0,0 +1,56 @@
+# engine/kifu.py
+# 棋譜アーカイブ（kifu/*.json）を python-shogi の局面として再生するヘルパ
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import shogi
+
+# 反転棋譜（kifu/pvp_flip）は盤を180度回しているので、初期局面の「後手番」から始まる
+FLIPPED_START_SFEN = shogi.STARTING_SFEN.replace(" b ", " w ")
+
+
+def game_moves(data: dict) -> list:
+    """moves 配列、無ければ kifu[].usi から USI 列を取り出す"""
+    moves = data.get("moves")
+    if not moves:
+        karr = data.get("kifu")
+        if isinstance(karr, list):
+            moves = [m.get("usi") for m in karr if isinstance(m, dict) and m.get("usi")]
+        else:
+            moves = []
+    return [m for m in moves if isinstance(m, str) and m]
+
+
+def start_board(data: dict) -> shogi.Board:
+    return shogi.Board(FLIPPED_START_SFEN if data.get("flipped") else shogi.STARTING_SFEN)
+
+
+def load_games(folder: str):
+    """folder 内の *.json を (path, data) で返す（読めないものは飛ばす）"""
+    for p in sorted(Path(folder).glob("*.json")):
+        try:
+            data = json.loads(p.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        if isinstance(data, dict):
+            yield p, data
+
+
+def replay(data: dict):
+    """
+    1局を再生し、各手の直前の (board, move) を順に返す。
+    board は同じオブジェクトを使い回すので、保持したいときは sfen() 等で写し取ること。
+    非合法手に当たったらそこで打ち切る。
+    """
+    board = start_board(data)
+    for usi in game_moves(data):
+        try:
+            move = shogi.Move.from_usi(usi)
+        except Exception:
+            return
+        if move not in board.legal_moves:
+            return
+        yield board, move
+        board.push(move)
@@ -0,0 +1,210 @@
+# engine/mcts.py
+# policy / value ネットワークを使う MCTS（ai_type "mcts"）
+#
+#   searcher = MCTSSearcher(forward, playouts=800, batch_size=16, time_ms=1000)
+#   result = searcher.search(ArrayPosition.from_board(board))     # SearchResult（move は int 符号）
+#
+# forward(x: (N,9,9,43) float32) -> (logits (N,A), value (N,) または None)
+#   （learn/infer.PolicyAgent.search_forward(with_value=True)）
+# CPU で1局面ずつ推論すると固定費ばかりかかるので、virtual loss で別々の葉を batch_size 個まで選び、
+# まとめて1回の forward で評価してから逆伝播する。
+# value head の無いモデルでは、葉の値を静止探索の評価値から tanh(score / MCTS_VALUE_SCALE) で作る。
+from __future__ import annotations
+
+import math
+import time
+
+import numpy as np
+
+from learn.encode import position_to_planes
+
+from .hybrid import move_code_to_action_id
+from .search import INF, MATE_SCORE, Quiescence, SearchResult
+
+MCTS_PLAYOUTS = 800          # 1手あたりの最大プレイアウト数
+MCTS_BATCH_SIZE = 16         # 1回の forward にまとめる葉の数
+MCTS_C_PUCT = 1.5            # 探索項の重み
+MCTS_VIRTUAL_LOSS = 3        # 評価待ちの枝に一時的に足す負け数（同じ葉ばかり選ばないように）
+MCTS_VALUE_SCALE = 600.0     # 評価値 ↔ 勝率 [-1, 1] の換算（score ≒ VALUE_SCALE * atanh(value)）
+MCTS_NODES_PER_PLAYOUT = 100 # SearchBudget.nodes（αβ のノード数）をプレイアウト数に直す比
+
+
+def value_to_score(q: float) -> int:
+    """[-1, 1] の値 → 評価値（αβ と同じ単位）"""
+    q = max(-0.999, min(0.999, q))
+    return int(MCTS_VALUE_SCALE * math.atanh(q))
+
+
+class _Node:
+    """1局面。子の統計は手の並び（moves）と同じ添字の配列で持つ"""
+    __slots__ = ("moves", "P", "N", "W", "children", "visits")
+
+    def __init__(self, moves, priors):
+        self.moves = moves
+        self.P = priors
+        n = len(moves)
+        self.N = [0] * n       # 子の訪問回数（virtual loss 込み）
+        self.W = [0.0] * n     # 子の価値の合計（この局面の手番側から見た値）
+        self.children = [None] * n
+        self.visits = 0
+
+    def select(self, c_puct):
+        sqrt_n = math.sqrt(self.visits + 1)
+        best, best_u = 0, -INF
+        for i in range(len(self.moves)):
+            n = self.N[i]
+            q = self.W[i] / n if n else 0.0
+            u = q + c_puct * self.P[i] * sqrt_n / (1 + n)
+            if u > best_u:
+                best, best_u = i, u
+        return best
+
+
+class MCTSSearcher:
+    """
+    PUCT の MCTS。局面は ArrayPosition（push / pop / moves / key / board / hands / turn）。
+    time_ms / playouts / stop_event のどれかで止まり、訪問回数が最多の手を返す。
+    """
+
+    def __init__(self, forward, playouts: int = MCTS_PLAYOUTS, batch_size: int = MCTS_BATCH_SIZE,
+                 time_ms=None, stop_event=None, c_puct: float = MCTS_C_PUCT,
+                 virtual_loss: int = MCTS_VIRTUAL_LOSS):
+        self.forward = forward
+        self.playouts = max(1, int(playouts))
+        self.batch_size = max(1, int(batch_size))
+        self.time_ms = time_ms
+        self.stop_event = stop_event
+        self.c_puct = c_puct
+        self.virtual_loss = virtual_loss
+        self._qs = Quiescence()
+        self._buf = np.zeros((self.batch_size, 9, 9, 43), dtype=np.float32)
+        self._use_static = True   # value head が無ければ静止探索の評価値を使う（最初の forward で判定）
+        self.forward_calls = 0
+        self.evaluated = 0
+        self.max_depth = 0
+
+    # ---------- 評価 ----------
+    def _evaluate(self, pos_moves, n):
+        """self._buf[:n] を1回の forward で評価 → [(priors, value), ...]"""
+        logits, values = self.forward(self._buf[:n])
+        logits = np.asarray(logits)
+        self._use_static = values is None
+        self.forward_calls += 1
+        self.evaluated += n
+        out = []
+        for i, (moves, static) in enumerate(pos_moves):
+            ids = [move_code_to_action_id(m) for m in moves]
+            sub = logits[i, ids].astype(np.float64)
+            sub = np.exp(sub - sub.max())
+            priors = (sub / sub.sum()).tolist()
+            v = float(values[i]) if values is not None else math.tanh(static / MCTS_VALUE_SCALE)
+            out.append((priors, v))
+        return out
+
+    def _static(self, pos):
+        return self._qs.search(pos, -INF, INF, 0) if self._use_static else 0
+
+    # ---------- 1回分（葉を最大 batch_size 個） ----------
+    def _run_batch(self, pos, root):
+        pending = []      # (path, moves, static)
+        seen = set()
+        n_buf = 0
+        for _ in range(self.batch_size):
+            node, path = root, []
+            while True:
+                i = node.select(self.c_puct)
+                # virtual loss: 評価が済むまでこの枝を負け扱いにして、次の選択で別の枝を選ばせる
+                node.N[i] += self.virtual_loss
+                node.W[i] -= self.virtual_loss
+                node.visits += self.virtual_loss
+                path.append((node, i))
+                pos.push(node.moves[i])
+                child = node.children[i]
+                if child is None:
+                    break
+                node = child
+            self.max_depth = max(self.max_depth, len(path))
+
+            key = pos.key()
+            moves = pos.moves() if key not in seen else None
+            if key in seen:
+                # 同じ葉をもう一度選んだ: 今回のまとめはここまで
+                value = None
+            elif not moves:
+                # 手詰まり（詰み）: 手番側の負けが確定
+                value = -1.0
+            else:
+                value = None
+                seen.add(key)
+                position_to_planes(pos.board, pos.hands, pos.turn, out=self._buf[n_buf])
+                n_buf += 1
+                pending.append((path, moves, self._static(pos)))
+            for _ in path:
+                pos.pop()
+
+            if value is not None:
+                self._backup(path, value)
+            elif moves is None:
+                self._undo_virtual(path)
+                break
+
+        if pending:
+            results = self._evaluate([(m, s) for _, m, s in pending], n_buf)
+            for (path, moves, _), (priors, value) in zip(pending, results):
+                parent, i = path[-1]
+                if parent.children[i] is None:
+                    parent.children[i] = _Node(moves, priors)
+                self._backup(path, value)
+
+    def _undo_virtual(self, path):
+        vl = self.virtual_loss
+        for node, i in path:
+            node.N[i] -= vl
+            node.W[i] += vl
+            node.visits -= vl
+
+    def _backup(self, path, value):
+        """value は葉の局面の手番側から見た値。親へ向かって符号を反転しながら足す"""
+        vl = self.virtual_loss
+        v = -value
+        for node, i in reversed(path):
+            node.N[i] += 1 - vl
+            node.W[i] += v + vl
+            node.visits += 1 - vl
+            v = -v
+
+    # ---------- 探索 ----------
+    def search(self, pos) -> SearchResult:
+        t0 = time.perf_counter()
+        deadline = t0 + self.time_ms / 1000.0 if self.time_ms is not None else None
+        self.forward_calls = self.evaluated = self.max_depth = 0
+
+        moves = pos.moves()
+        if not moves:
+            return SearchResult(score=-MATE_SCORE, elapsed=time.perf_counter() - t0)
+        position_to_planes(pos.board, pos.hands, pos.turn, out=self._buf[0])
+        (priors, value), = self._evaluate([(moves, self._static(pos))], 1)
+        root = _Node(moves, priors)
+
+        stopped = False
+        while root.visits < self.playouts:
+            if self.stop_event is not None and self.stop_event.is_set():
+                stopped = True
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                stopped = True
+                break
+            self._run_batch(pos, root)
+
+        best = max(range(len(root.moves)), key=lambda i: root.N[i])
+        q = root.W[best] / root.N[best] if root.N[best] else value
+        # 読み筋: 訪問回数の多い子をたどる
+        pv, node = [], root
+        while node is not None and node.visits:
+            i = max(range(len(node.moves)), key=lambda j: node.N[j])
+            pv.append(node.moves[i])
+            node = node.children[i]
+        return SearchResult(
+            move=root.moves[best], score=value_to_score(q), depth=self.max_depth,
+            nodes=root.visits, elapsed=time.perf_counter() - t0, pv=pv, stopped=stopped,
+        )
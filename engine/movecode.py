@@ -0,0 +1,25 @@
+# engine/movecode.py
+# 指し手の int 符号（置換表・定跡・プロセス間共有で使う共通形式）
+#   bit 0..6  : to_square（python-shogi の 0..80）
+#   bit 7..13 : from_square（0..80）/ 打ち駒は 81 + 駒種（82..88）
+#   bit 14    : 成り
+import shogi
+
+DROP_BASE = 81
+PROMOTE_BIT = 1 << 14
+
+
+def encode_move(move: shogi.Move) -> int:
+    if move.drop_piece_type:
+        frm = DROP_BASE + move.drop_piece_type
+    else:
+        frm = move.from_square
+    return move.to_square | (frm << 7) | (PROMOTE_BIT if move.promotion else 0)
+
+
+def decode_move(code: int) -> shogi.Move:
+    to = code & 0x7F
+    frm = (code >> 7) & 0x7F
+    if frm > DROP_BASE:
+        return shogi.Move(None, to, drop_piece_type=frm - DROP_BASE)
+    return shogi.Move(frm, to, bool(code & PROMOTE_BIT))
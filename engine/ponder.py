@@ -0,0 +1,156 @@
+# engine/ponder.py
+# 先読み（pondering）: 人間が考えている間に「相手の本命の手 → それへのAIの応手」を裏で用意しておく
+#
+#   ponder = Ponderer(think)            # think(board, stop_event) -> shogi.Move
+#   ponder.start(board, tag)            # AI が指した直後（人間の手番）に呼ぶ
+#   ponder.stop()                       # 人間が指したら止める（用意できた応手は残す）
+#   move = ponder.lookup(board, tag)    # AI の手番で、今の局面の応手が用意できていれば返す
+#   ponder.cancel()                     # リセット・投了・ログアウトで止めて捨てる
+#
+# stop() / cancel() は作業スレッドの終了を PONDER_JOIN_TIMEOUT 秒だけ待ち、終わっていなければ False を返す
+# （running のまま）。置換表など think が使っているものを閉じる・使い回すのは running が False になってから。
+#
+# tag は応手を作ったときの設定（ai_type・予算など）。設定が変わっていたら使わない。
+from __future__ import annotations
+
+import threading
+
+import shogi
+
+from .board_adapter import is_legal_move
+from .position import ArrayPosition
+from .search import INF, Quiescence
+
+PONDER_CANDIDATES = 3      # 先読みする相手の候補手の数
+PONDER_JOIN_TIMEOUT = 2.0  # stop() で作業スレッドの終了を待つ秒数
+
+
+def _position_key(board: shogi.Board) -> str:
+    # 手数を除いた SFEN（盤・手番・持ち駒）
+    return " ".join(board.sfen().split()[:3])
+
+
+def rank_replies(board: shogi.Board, n: int = PONDER_CANDIDATES, stop_event=None) -> list:
+    """
+    手番側（人間）の合法手を 1手 + 静止探索 の浅い読みで評価し、良さそうな順に n 手返す。
+    return: [shogi.Move, ...]
+    """
+    pos = ArrayPosition.from_board(board)
+    qs = Quiescence()
+    scored = []
+    for m in pos.moves():
+        if stop_event is not None and stop_event.is_set():
+            break
+        pos.push(m)
+        score = -qs.search(pos, -INF, INF, 1)
+        pos.pop()
+        scored.append((score, m))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [pos.to_shogi_move(m) for _, m in scored[:n]]
+
+
+class Ponderer:
+    """
+    1局ぶんの先読み。作業スレッドは1本だけで、start のたびに前の先読みは止めて作り直す。
+    用意した応手は {局面キー: (tag, usi)} に持つ。
+    think は別スレッドから呼ばれるので、置換表など対局の状態を使う場合は
+    AI の手番の探索と重ならないよう、探索の前に必ず stop() すること。
+    """
+
+    def __init__(self, think, candidates: int = PONDER_CANDIDATES):
+        self.think = think
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- 制御 ----------
+    def start(self, board: shogi.Board, tag) -> None:
+        """board は人間の手番の局面。コピーして裏で読む（前の先読みが終わるのを待ってから）。"""
+        self.join()
+        with self._lock:
+            self._cache.clear()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(shogi.Board(board.sfen()), tag, self._stop_event),
+            name="ponder", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=PONDER_JOIN_TIMEOUT) -> bool:
+        """
+        先読みを止める（用意できた応手は残す）。timeout 秒（None なら終わるまで）待って
+        作業スレッドが終わっていれば True。終わっていなければ False で、running のまま
+        """
+        self._stop_event.set()
+        th = self._thread
+        if th is not None and th is not threading.current_thread():
+            th.join(timeout)
+            if th.is_alive():
+                return False
+        self._thread = None
+        return True
+
+    def join(self) -> None:
+        """先読みを止めて、作業スレッドが終わるまで待つ"""
+        self.stop(timeout=None)
+
+    def cancel(self, timeout=PONDER_JOIN_TIMEOUT) -> bool:
+        """先読みを止めて、用意した応手も捨てる。戻り値は stop() と同じ"""
+        stopped = self.stop(timeout)
+        with self._lock:
+            self._cache.clear()
+        return stopped
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ---------- 参照 ----------
+    def lookup(self, board: shogi.Board, tag):
+        """今の局面の応手が同じ設定で用意できていれば shogi.Move を返す（非合法なら None）"""
+        with self._lock:
+            hit = self._cache.get(_position_key(board))
+        if hit is None or hit[0] != tag:
+            self.misses += 1
+            return None
+        move = shogi.Move.from_usi(hit[1])
+        if not is_legal_move(board, move):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return move
+
+    def stats(self) -> dict:
+        with self._lock:
+            prepared = len(self._cache)
+        total = self.hits + self.misses
+        return {
+            "running": self.running,
+            "prepared": prepared,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # ---------- 作業スレッド ----------
+    def _run(self, board, tag, stop_event):
+        try:
+            replies = rank_replies(board, self.candidates, stop_event)
+            for reply in replies:
+                if stop_event.is_set():
+                    return
+                board.push(reply)
+                try:
+                    move = self.think(board, stop_event)
+                    # 途中で止められた探索の手は信用しない
+                    if move is not None and not stop_event.is_set():
+                        with self._lock:
+                            self._cache[_position_key(board)] = (tag, move.usi())
+                        print(f"🧠 ponder: {reply.usi()} → {move.usi()}")
+                finally:
+                    board.pop()
+        except Exception as e:
+            print(f"⚠️ ponder 失敗: {e.__class__.__name__}: {e}")
@@ -0,0 +1,629 @@
+# engine/position.py
+# 配列ベースの局面＋合法手生成（python-shogi の legal_moves / push / pop の高速な代替）
+#
+#   board[81] : 0=空, +駒種=先手, -駒種=後手（駒種は python-shogi の 1..14）
+#   hands[2][8]: 手駒の枚数（添字は駒種 1..7）
+#   手は engine/movecode.py の int 符号のまま扱う（Move オブジェクトを作らない）
+#
+# 合法性の判定（特に打ち歩詰め）は python-shogi と同じ近似に揃えてある。
+# 一致は `python -m engine.position --verify kifu/pvp` で棋譜アーカイブと突き合わせて確認できる。
+from __future__ import annotations
+
+import shogi
+
+from .evaluate import HAND_VALUES, PST
+from .movecode import DROP_BASE, PROMOTE_BIT, decode_move, encode_move
+from .zobrist import HAND_KEYS, HAND_TYPES, PIECE_KEYS, SIDE_KEY, UNPROMOTE
+
+BLACK, WHITE = shogi.BLACK, shogi.WHITE
+PAWN, LANCE, KNIGHT, SILVER, GOLD, BISHOP, ROOK, KING = range(1, 9)
+PROM_PAWN, PROM_LANCE, PROM_KNIGHT, PROM_SILVER, PROM_BISHOP, PROM_ROOK = range(9, 15)
+
+PROMOTED = [p or 0 for p in shogi.PIECE_PROMOTED]   # 駒種 → 成駒（成れない駒は 0）
+_ALL_TYPES = sum(1 << pt for pt in range(1, 15))
+_NO_KING = _ALL_TYPES & ~(1 << KING)
+
+# ---- 駒の動き（先手から見た (dr, dc)。dr<0 が前） ----
+_GOLD_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, 0))
+_KING_STEPS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+_DIAG = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+_ORTHO = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+_STEP_DIRS = {
+    PAWN: ((-1, 0),),
+    KNIGHT: ((-2, -1), (-2, 1)),
+    SILVER: ((-1, -1), (-1, 0), (-1, 1), (1, -1), (1, 1)),
+    GOLD: _GOLD_STEPS,
+    KING: _KING_STEPS,
+    PROM_PAWN: _GOLD_STEPS,
+    PROM_LANCE: _GOLD_STEPS,
+    PROM_KNIGHT: _GOLD_STEPS,
+    PROM_SILVER: _GOLD_STEPS,
+    PROM_BISHOP: _ORTHO,
+    PROM_ROOK: _DIAG,
+}
+_SLIDE_DIRS = {
+    LANCE: ((-1, 0),),
+    BISHOP: _DIAG,
+    ROOK: _ORTHO,
+    PROM_BISHOP: _DIAG,
+    PROM_ROOK: _ORTHO,
+}
+
+
+def _orient(dirs, color):
+    return tuple((dr if color == BLACK else -dr, dc) for dr, dc in dirs)
+
+
+def _ray(sq, dr, dc):
+    r, c = divmod(sq, 9)
+    out = []
+    r += dr; c += dc
+    while 0 <= r < 9 and 0 <= c < 9:
+        out.append(r * 9 + c)
+        r += dr; c += dc
+    return tuple(out)
+
+
+def _build_tables():
+    # STEPS[color][pt][sq] : 1マス（桂は2段）で行けるマス
+    # SLIDES[color][pt][sq]: 走り駒の方向ごとのマス列
+    steps = [[[()] * 81 for _ in range(15)] for _ in range(2)]
+    slides = [[[()] * 81 for _ in range(15)] for _ in range(2)]
+    for color in (BLACK, WHITE):
+        for pt in range(1, 15):
+            sdirs = _orient(_STEP_DIRS.get(pt, ()), color)
+            ldirs = _orient(_SLIDE_DIRS.get(pt, ()), color)
+            for sq in range(81):
+                r, c = divmod(sq, 9)
+                steps[color][pt][sq] = tuple(
+                    (r + dr) * 9 + (c + dc) for dr, dc in sdirs
+                    if 0 <= r + dr < 9 and 0 <= c + dc < 9)
+                slides[color][pt][sq] = tuple(
+                    ray for ray in (_ray(sq, dr, dc) for dr, dc in ldirs) if ray)
+
+    # 利きの逆引き
+    # STEP_ATTACKERS[color][sq]: ((from_sq, 駒種ビット), ...)  color の駒が from から sq に1マス利く
+    # SLIDE_ATTACKERS[color][sq]: ((ray, 駒種ビット), ...)      sq から外へ ray を辿って最初の駒が走り駒なら利く
+    step_att = [[{} for _ in range(81)] for _ in range(2)]
+    for color in (BLACK, WHITE):
+        for pt in range(1, 15):
+            for f in range(81):
+                for t in steps[color][pt][f]:
+                    step_att[color][t][f] = step_att[color][t].get(f, 0) | (1 << pt)
+    step_att = [[tuple(d.items()) for d in per_sq] for per_sq in step_att]
+
+    slide_att = [[() for _ in range(81)] for _ in range(2)]
+    for color in (BLACK, WHITE):
+        for sq in range(81):
+            rays = []
+            for dr, dc in _KING_STEPS:
+                mask = 0
+                for pt, dirs in _SLIDE_DIRS.items():
+                    # 攻め駒は sq へ向かって (-dr, -dc) 方向に走る
+                    if (-dr, -dc) in _orient(dirs, color):
+                        mask |= 1 << pt
+                ray = _ray(sq, dr, dc)
+                if mask and ray:
+                    rays.append((ray, mask))
+            slide_att[color][sq] = tuple(rays)
+    return steps, slides, step_att, slide_att
+
+
+STEPS, SLIDES, STEP_ATTACKERS, SLIDE_ATTACKERS = _build_tables()
+
+# 成れるマス（敵陣）/ 行き所のない駒（不成では置けない）
+PROMO_ZONE = [[(sq // 9) <= 2 for sq in range(81)], [(sq // 9) >= 6 for sq in range(81)]]
+
+
+def _dead_end(color, pt, sq):
+    r = sq // 9 if color == BLACK else 8 - sq // 9
+    return (pt in (PAWN, LANCE) and r == 0) or (pt == KNIGHT and r <= 1)
+
+
+DEAD_END = [[[_dead_end(c, pt, sq) for sq in range(81)] for pt in range(15)] for c in (BLACK, WHITE)]
+_CAN_PROMOTE = [False] * 15
+for _pt in (PAWN, LANCE, KNIGHT, SILVER, BISHOP, ROOK):
+    _CAN_PROMOTE[_pt] = True
+# 歩の前のマス（打ち歩詰めの判定用）
+PAWN_FRONT = [[sq - 9 if sq >= 9 else -1 for sq in range(81)],
+              [sq + 9 if sq < 72 else -1 for sq in range(81)]]
+
+
+class ArrayPosition:
+    """
+    探索用の局面。engine/board_adapter.PyShogiPosition と同じインタフェース
+    （moves / push / pop / captured / mover / promotes / in_check / gives_check / evaluate / key / encode /
+    to_shogi_move）
+    を持つので、AlphaBetaSearcher にそのまま渡せる。
+    Zobrist ハッシュと評価値（先手視点）は push/pop で差分更新する。
+    """
+
+    def __init__(self):
+        self.board = [0] * 81
+        self.hands = [[0] * 8, [0] * 8]
+        self.turn = BLACK
+        self.kings = [None, None]
+        self._key = 0
+        self._score = 0
+        self._undo = []
+
+    # ---------- 生成 ----------
+    @classmethod
+    def from_board(cls, board: shogi.Board) -> "ArrayPosition":
+        pos = cls()
+        for sq in shogi.SQUARES:
+            piece = board.piece_at(sq)
+            if piece is None:
+                continue
+            pos.board[sq] = piece.piece_type if piece.color == BLACK else -piece.piece_type
+            if piece.piece_type == KING:
+                pos.kings[piece.color] = sq
+        for color in (BLACK, WHITE):
+            for pt, cnt in board.pieces_in_hand[color].items():
+                pos.hands[color][pt] = cnt
+        pos.turn = board.turn
+        pos._key, pos._score = pos._full_key_and_score()
+        return pos
+
+    @classmethod
+    def from_sfen(cls, sfen: str) -> "ArrayPosition":
+        return cls.from_board(shogi.Board(sfen))
+
+    def to_board(self) -> shogi.Board:
+        """python-shogi の Board に戻す（表示・検証用。探索中には使わない）"""
+        b = shogi.Board()
+        b.clear()
+        for sq, p in enumerate(self.board):
+            if p:
+                b.set_piece_at(sq, shogi.Piece(abs(p), BLACK if p > 0 else WHITE))
+        for color in (BLACK, WHITE):
+            for pt in HAND_TYPES:
+                if self.hands[color][pt]:
+                    b.add_piece_into_hand(pt, color, self.hands[color][pt])
+        b.turn = self.turn
+        return shogi.Board(b.sfen())
+
+    def _full_key_and_score(self):
+        key = 0
+        score = 0
+        for sq, p in enumerate(self.board):
+            if p > 0:
+                key ^= PIECE_KEYS[BLACK][p][sq]
+                score += PST[BLACK][p][sq]
+            elif p < 0:
+                key ^= PIECE_KEYS[WHITE][-p][sq]
+                score -= PST[WHITE][-p][sq]
+        for color, sign in ((BLACK, 1), (WHITE, -1)):
+            for pt in HAND_TYPES:
+                n = self.hands[color][pt]
+                key ^= HAND_KEYS[color][pt][n]
+                score += sign * HAND_VALUES[pt] * n
+        if self.turn == WHITE:
+            key ^= SIDE_KEY
+        return key, score
+
+    # ---------- 利き ----------
+    def attacked(self, sq, by, types=_ALL_TYPES) -> bool:
+        """by 側の駒（types のビットに含まれる駒種）が sq に利いているか"""
+        bd = self.board
+        sign = 1 if by == BLACK else -1
+        for f, mask in STEP_ATTACKERS[by][sq]:
+            p = bd[f] * sign
+            if p > 0 and (mask & types) >> p & 1:
+                return True
+        for ray, mask in SLIDE_ATTACKERS[by][sq]:
+            for t in ray:
+                p = bd[t]
+                if p:
+                    p *= sign
+                    if p > 0 and (mask & types) >> p & 1:
+                        return True
+                    break
+        return False
+
+    def in_check(self) -> bool:
+        k = self.kings[self.turn]
+        return k is not None and self.attacked(k, self.turn ^ 1)
+
+    def _pinned(self, us):
+        """自玉と敵の走り駒の間に挟まれた自駒のマス集合"""
+        k = self.kings[us]
+        if k is None:
+            return set()
+        bd = self.board
+        sign = 1 if us == BLACK else -1
+        pinned = set()
+        for ray, mask in SLIDE_ATTACKERS[us ^ 1][k]:
+            own = -1
+            for t in ray:
+                p = bd[t] * sign
+                if p == 0:
+                    continue
+                if p > 0:
+                    if own >= 0:
+                        break
+                    own = t
+                    continue
+                if own >= 0 and mask >> -p & 1:
+                    pinned.add(own)
+                break
+        return pinned
+
+    # ---------- 指し手生成 ----------
+    def pseudo_moves(self, drops=True):
+        """自殺手・打ち歩詰めを含む疑似合法手（python-shogi の pseudo_legal_moves 相当）。drops=False で盤上の駒のみ"""
+        us = self.turn
+        bd = self.board
+        sign = 1 if us == BLACK else -1
+        zone = PROMO_ZONE[us]
+        dead = DEAD_END[us]
+        steps = STEPS[us]
+        slides = SLIDES[us]
+        out = []
+        append = out.append
+
+        for f in range(81):
+            pt = bd[f] * sign
+            if pt <= 0:
+                continue
+            targets = []
+            for t in steps[pt][f]:
+                if bd[t] * sign <= 0:
+                    targets.append(t)
+            for ray in slides[pt][f]:
+                for t in ray:
+                    q = bd[t] * sign
+                    if q > 0:
+                        break
+                    targets.append(t)
+                    if q:
+                        break
+            base = f << 7
+            can_prom = _CAN_PROMOTE[pt]
+            dead_pt = dead[pt]
+            for t in targets:
+                if not dead_pt[t]:
+                    append(base | t)
+                if can_prom and (zone[f] or zone[t]):
+                    append(base | t | PROMOTE_BIT)
+
+        hand = self.hands[us]
+        drops = [pt for pt in HAND_TYPES if hand[pt]] if drops else ()
+        if drops:
+            pawn_files = set()
+            if hand[PAWN]:
+                mine = PAWN * sign
+                pawn_files = {sq % 9 for sq in range(81) if bd[sq] == mine}
+            for t in range(81):
+                if bd[t]:
+                    continue
+                for pt in drops:
+                    if dead[pt][t]:
+                        continue
+                    if pt == PAWN and t % 9 in pawn_files:
+                        continue
+                    append(t | ((DROP_BASE + pt) << 7))
+        return out
+
+    def moves(self):
+        """合法手（int 符号のリスト）"""
+        return self._legal(self.pseudo_moves())
+
+    def tactical_moves(self, checks=False):
+        """駒取り・成り（checks=True なら王手も）に絞った合法手。静止探索用"""
+        bd = self.board
+        out = []
+        for m in self.pseudo_moves(drops=False):
+            if m & PROMOTE_BIT or bd[m & 0x7F]:
+                out.append(m)
+            elif checks and self.gives_check(m):
+                out.append(m)
+        if checks:
+            out += self._check_drops()
+        return self._legal(out)
+
+    def _check_drops(self):
+        """王手になる駒打ち（玉から逆に利きを辿ったマスにだけ打つ）"""
+        us = self.turn
+        k = self.kings[us ^ 1]
+        hand = self.hands[us]
+        if k is None or not any(hand):
+            return []
+        bd = self.board
+        dead = DEAD_END[us]
+        targets = {}
+        for f, mask in STEP_ATTACKERS[us][k]:
+            if not bd[f]:
+                targets[f] = targets.get(f, 0) | mask
+        for ray, mask in SLIDE_ATTACKERS[us][k]:
+            for t in ray:
+                if bd[t]:
+                    break
+                targets[t] = targets.get(t, 0) | mask
+        pawn_files = ()
+        if hand[PAWN]:
+            mine = PAWN if us == BLACK else -PAWN
+            pawn_files = {sq % 9 for sq in range(81) if bd[sq] == mine}
+        out = []
+        for t, mask in targets.items():
+            for pt in HAND_TYPES:
+                if hand[pt] and mask >> pt & 1 and not dead[pt][t]:
+                    if pt == PAWN and t % 9 in pawn_files:
+                        continue
+                    out.append(t | ((DROP_BASE + pt) << 7))
+        return out
+
+    def _legal(self, pseudo):
+        """疑似合法手から自殺手・打ち歩詰めを除く"""
+        us = self.turn
+        them = us ^ 1
+        bd = self.board
+        k = self.kings[us]
+        if k is None:
+            return pseudo
+        check = self.attacked(k, them)
+        # 王手されているとき、玉以外の手は「王手駒を取る」か「間に入る」マスへの手しか合法になりえない
+        evasion = self._evasion_squares(k, them) if check else None
+        pinned = self._pinned(us)
+        out = []
+        for m in pseudo:
+            t = m & 0x7F
+            f = (m >> 7) & 0x7F
+            if f > DROP_BASE:
+                if check and (t not in evasion or not self._safe_after(
+                        None, t, (f - DROP_BASE) * (1 if us == BLACK else -1), k)):
+                    continue
+                if f - DROP_BASE == PAWN and self._is_pawn_drop_mate(t):
+                    continue
+                out.append(m)
+            elif f == k:
+                if self._safe_after(f, t, bd[f], t):
+                    out.append(m)
+            elif check:
+                if t in evasion and self._safe_after(f, t, bd[f], k):
+                    out.append(m)
+            elif f in pinned:
+                if self._safe_after(f, t, bd[f], k):
+                    out.append(m)
+            else:
+                out.append(m)
+        return out
+
+    def _evasion_squares(self, k, them):
+        """k に王手している駒のマスと、走り駒の王手なら玉との間の空きマス"""
+        bd = self.board
+        sign = 1 if them == BLACK else -1
+        squares = set()
+        for f, mask in STEP_ATTACKERS[them][k]:
+            p = bd[f] * sign
+            if p > 0 and mask >> p & 1:
+                squares.add(f)
+        for ray, mask in SLIDE_ATTACKERS[them][k]:
+            between = []
+            for t in ray:
+                p = bd[t]
+                if not p:
+                    between.append(t)
+                    continue
+                p *= sign
+                if p > 0 and mask >> p & 1:
+                    squares.add(t)
+                    squares.update(between)
+                break
+        return squares
+
+    def _safe_after(self, f, t, piece, king_sq):
+        """f→t（f=None は打ち）を仮に指したとき king_sq に相手の利きが無いか"""
+        bd = self.board
+        old_t = bd[t]
+        if f is not None:
+            bd[f] = 0
+        bd[t] = piece
+        safe = not self.attacked(king_sq, self.turn ^ 1)
+        bd[t] = old_t
+        if f is not None:
+            bd[f] = piece
+        return safe
+
+    def _is_pawn_drop_mate(self, t):
+        """打ち歩詰めか（python-shogi の was_check_by_dropping_pawn と同じ判定）"""
+        us = self.turn
+        them = us ^ 1
+        k = self.kings[them]
+        if k is None or PAWN_FRONT[us][t] != k:
+            return False
+        bd = self.board
+        bd[t] = PAWN if us == BLACK else -PAWN
+        try:
+            tsign = 1 if them == BLACK else -1
+            for s in STEPS[them][KING][k]:
+                if bd[s] * tsign <= 0 and not self.attacked(s, us):
+                    return False
+            if self.attacked(t, them, _NO_KING):
+                return False
+            return True
+        finally:
+            bd[t] = 0
+
+    # ---------- 着手 / 戻し ----------
+    def push(self, m):
+        us = self.turn
+        them = us ^ 1
+        bd = self.board
+        t = m & 0x7F
+        f = (m >> 7) & 0x7F
+        pst = PST[us]
+        key = self._key ^ SIDE_KEY
+        hand = self.hands[us]
+        cap = 0
+        if f > DROP_BASE:
+            pt = f - DROP_BASE
+            n = hand[pt]
+            hand[pt] = n - 1
+            key ^= HAND_KEYS[us][pt][n] ^ HAND_KEYS[us][pt][n - 1] ^ PIECE_KEYS[us][pt][t]
+            d = pst[pt][t] - HAND_VALUES[pt]
+            bd[t] = pt if us == BLACK else -pt
+        else:
+            p = bd[f]
+            pt = p if p > 0 else -p
+            npt = PROMOTED[pt] if m & PROMOTE_BIT else pt
+            key ^= PIECE_KEYS[us][pt][f] ^ PIECE_KEYS[us][npt][t]
+            d = pst[npt][t] - pst[pt][f]
+            q = bd[t]
+            if q:
+                cap = q if q > 0 else -q
+                base = UNPROMOTE[cap]
+                n = hand[base]
+                hand[base] = n + 1
+                key ^= PIECE_KEYS[them][cap][t] ^ HAND_KEYS[us][base][n] ^ HAND_KEYS[us][base][n + 1]
+                d += PST[them][cap][t] + HAND_VALUES[base]
+            bd[f] = 0
+            bd[t] = npt if us == BLACK else -npt
+            if pt == KING:
+                self.kings[us] = t
+        self._undo.append((m, cap, self._key, self._score))
+        self._key = key
+        self._score += d if us == BLACK else -d
+        self.turn = them
+
+    def pop(self):
+        m, cap, key, score = self._undo.pop()
+        them = self.turn
+        us = them ^ 1
+        bd = self.board
+        t = m & 0x7F
+        f = (m >> 7) & 0x7F
+        hand = self.hands[us]
+        if f > DROP_BASE:
+            hand[f - DROP_BASE] += 1
+            bd[t] = 0
+        else:
+            p = bd[t]
+            pt = p if p > 0 else -p
+            if m & PROMOTE_BIT:
+                pt = UNPROMOTE[pt]
+            bd[f] = pt if us == BLACK else -pt
+            if pt == KING:
+                self.kings[us] = f
+            if cap:
+                hand[UNPROMOTE[cap]] -= 1
+                bd[t] = cap if them == BLACK else -cap
+            else:
+                bd[t] = 0
+        self._key = key
+        self._score = score
+        self.turn = us
+        return m
+
+    # ---------- 探索インタフェース ----------
+    def captured(self, m) -> int:
+        if (m >> 7) & 0x7F > DROP_BASE:
+            return 0
+        q = self.board[m & 0x7F]
+        return q if q > 0 else -q
+
+    def mover(self, m) -> int:
+        f = (m >> 7) & 0x7F
+        if f > DROP_BASE:
+            return f - DROP_BASE
+        p = self.board[f]
+        return p if p > 0 else -p
+
+    def promotes(self, m) -> bool:
+        return bool(m & PROMOTE_BIT)
+
+    def gives_check(self, m) -> bool:
+        """m を指すと相手玉に王手がかかるか（盤を仮に動かして利きを見る）"""
+        us = self.turn
+        k = self.kings[us ^ 1]
+        if k is None:
+            return False
+        bd = self.board
+        t = m & 0x7F
+        f = (m >> 7) & 0x7F
+        sign = 1 if us == BLACK else -1
+        if f > DROP_BASE:
+            piece = (f - DROP_BASE) * sign
+        else:
+            p = bd[f]
+            piece = PROMOTED[p * sign] * sign if m & PROMOTE_BIT else p
+            bd[f] = 0
+        old_t = bd[t]
+        bd[t] = piece
+        check = self.attacked(k, us)
+        bd[t] = old_t
+        if f <= DROP_BASE:
+            bd[f] = p
+        return check
+
+    def evaluate(self) -> int:
+        return self._score if self.turn == BLACK else -self._score
+
+    def key(self) -> int:
+        return self._key
+
+    def encode(self, m) -> int:
+        return m
+
+    def to_shogi_move(self, m) -> shogi.Move:
+        return decode_move(m)
+
+    def usi(self, m) -> str:
+        return decode_move(m).usi()
+
+
+# ==============================
+# python-shogi との突き合わせ
+# ==============================
+def verify_against_python_shogi(folder: str = "kifu/pvp", verbose: bool = True):
+    """
+    folder 内の棋譜を再生し、全局面で
+      - 合法手集合（USI）が python-shogi と一致するか
+      - 全合法手の push/pop 後にハッシュ・評価値・盤が元に戻るか
+    を確認する。return: (局面数, 不一致数)
+    """
+    from .evaluate import evaluate_board
+    from .kifu import load_games, replay
+    from .zobrist import board_hash
+
+    positions = mismatches = 0
+    for p, data in load_games(folder):
+        pos = None
+        for i, (board, move) in enumerate(replay(data)):
+            if pos is None:
+                pos = ArrayPosition.from_board(board)
+            positions += 1
+            want = {m.usi() for m in board.legal_moves}
+            legal = pos.moves()
+            got = {pos.usi(m) for m in legal}
+            ok = (want == got
+                  and pos.key() == board_hash(board)
+                  and pos._score == evaluate_board(board))
+            snapshot = (list(pos.board), [list(h) for h in pos.hands], pos._key, pos._score)
+            for m in legal:
+                pos.push(m)
+                pos.pop()
+            ok = ok and snapshot == (pos.board, pos.hands, pos._key, pos._score)
+            if not ok:
+                mismatches += 1
+                if verbose:
+                    print(f"❌ {p.name} ply={i} sfen={board.sfen()}")
+                    print(f"   python-shogi only: {sorted(want - got)}")
+                    print(f"   array only      : {sorted(got - want)}")
+            pos.push(encode_move(move))
+    if verbose:
+        print(f"✅ [{folder}] verified positions={positions} mismatches={mismatches}")
+    return positions, mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Verify ArrayPosition move generation against python-shogi.")
+    ap.add_argument("--verify", nargs="*", default=["kifu/pvp"], help="棋譜フォルダ（複数可）")
+    args = ap.parse_args()
+    bad = 0
+    for folder in args.verify:
+        _, mm = verify_against_python_shogi(folder)
+        bad += mm
+    raise SystemExit(1 if bad else 0)
@@ -0,0 +1,61 @@
+# engine/result_cache.py
+# 対局をまたいで使う「局面 → エンジンの答え」のキャッシュ（LRU で上限つき）
+#
+# 同じエンジン・同じ設定なら同じ局面には同じ答えを返せばよい（序盤や kifu/pvp_flip の反転初手など）。
+# キーは呼び出し側が (局面ハッシュ, ai_type, モデルの版, 探索設定) のようなタプルで作る。
+# 置換表（engine/tt.py）が1局の中の読みの再利用なのに対し、こちらは最終結果だけをプロセス全体で共有する。
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+
+RESULT_CACHE_ENTRIES = 4096
+
+
+class ResultCache:
+    """スレッド安全な LRU。get / put / clear / stats"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """見つかれば値（最近使った扱いにする）、無ければ None"""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,315 @@
+# engine/search.py
+# 反復深化 + negamax αβ 探索（末端は駒取り・成り・王手だけを延長する静止探索）
+from __future__ import annotations
+
+import random
+import time
+from dataclasses import dataclass, field
+
+from .evaluate import PIECE_VALUES
+from .tt import EXACT, LOWER, UPPER
+
+INF = 10 ** 9
+MATE_SCORE = 100000   # 詰みの評価値（ply を引いて「早い詰み」を優先）
+MAX_PLY = 64
+
+# 並べ替えのボーナス（大きいほど先に読む）
+_ORDER_PV      = 1 << 30
+_ORDER_TT      = 1 << 29
+_ORDER_CAPTURE = 1 << 20
+_ORDER_PROMOTE = 1 << 16
+_ORDER_JITTER  = 1 << 10   # Lazy SMP の補助ワーカーが並べ替えに混ぜる乱数の幅
+
+# 静止探索
+QS_NODE_BUDGET = 32    # 末端1つから展開してよい静止探索ノード数（使い切ったら静的評価で打ち切る）
+QS_CHECK_PLIES = 1     # 王手も延長する静止探索の手数（それより先は駒取り・成りのみ）
+QS_DELTA_MARGIN = 200  # delta pruning の余裕
+
+# 持ち時間のうちこの割合を使い切っていたら次の反復深化に入らない
+NEXT_ITERATION_RATIO = 0.5
+
+
+@dataclass
+class SearchResult:
+    move: object = None          # 最善手（位置インタフェースの手。shogi.Move とは限らない）
+    score: int = 0               # 手番側から見た評価値
+    depth: int = 0               # 完了した反復の深さ
+    nodes: int = 0
+    qnodes: int = 0              # うち静止探索のノード数
+    elapsed: float = 0.0         # 秒
+    stopped: bool = False        # 持ち時間・ノード上限で途中打ち切りしたか
+    pv: list = field(default_factory=list)
+
+
+def order_key(pos, mv) -> int:
+    """駒取り(MVV-LVA) → 成り → その他 の並べ替えキー"""
+    s = 0
+    victim = pos.captured(mv)
+    if victim:
+        # MVV-LVA: 取る駒は高く、取る側は安く
+        s += _ORDER_CAPTURE + PIECE_VALUES[victim] * 16 - PIECE_VALUES[pos.mover(mv)]
+    if pos.promotes(mv):
+        s += _ORDER_PROMOTE
+    return s
+
+
+class Quiescence:
+    """
+    静止探索。深さ0の局面で駒の取り合いが終わるまで読み、水平線効果を抑える。
+    - 王手されていなければ「何もしない」（静的評価）を下限に取る stand-pat
+    - 延長するのは 駒取り・成り・（最初の check_plies 手だけ）王手
+    - 王手されている局面は全ての応手を読む（応手が無ければ詰み）
+    - 取っても alpha に届かない駒取りは読まない（delta pruning）
+    - 1回の search で展開するノード数は node_budget まで。超えたら静的評価で打ち切る
+    """
+
+    def __init__(self, node_budget: int = QS_NODE_BUDGET, check_plies: int = QS_CHECK_PLIES):
+        self.node_budget = max(1, int(node_budget))
+        self.check_plies = max(0, int(check_plies))
+        self.nodes = 0
+        self._left = 0
+
+    def search(self, pos, alpha=-INF, beta=INF, ply=0) -> int:
+        """手番側から見た値。ply はルートからの手数（詰みスコアの補正用）"""
+        self._left = self.node_budget
+        return self._qsearch(pos, alpha, beta, ply, 0)
+
+    def _qsearch(self, pos, alpha, beta, ply, qply):
+        self.nodes += 1
+        self._left -= 1
+
+        in_check = pos.in_check()
+        if in_check:
+            moves = pos.moves()
+            if not moves:
+                return -MATE_SCORE + ply
+            if ply >= MAX_PLY:
+                return pos.evaluate()
+            best = -INF
+        else:
+            best = pos.evaluate()
+            if best >= beta or self._left <= 0 or ply >= MAX_PLY:
+                return best
+            if best > alpha:
+                alpha = best
+            moves = pos.tactical_moves(checks=qply < self.check_plies)
+        moves.sort(key=lambda mv: order_key(pos, mv), reverse=True)
+
+        stand = best
+        for mv in moves:
+            # 予算切れでも、王手回避は最低1手読んでから返す
+            if self._left <= 0 and best > -INF:
+                break
+            # delta pruning: 取った駒（盤から消える分 + 手駒に入る分）を足しても alpha に届かなければ読まない
+            if not in_check and not pos.promotes(mv):
+                victim = pos.captured(mv)
+                if victim and stand + PIECE_VALUES[victim] * 2 + QS_DELTA_MARGIN <= alpha:
+                    continue
+            pos.push(mv)
+            score = -self._qsearch(pos, -beta, -alpha, ply + 1, qply + 1)
+            pos.pop()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+
+class AlphaBetaSearcher:
+    """
+    反復深化の negamax αβ。
+    - 手の並べ替え: 前反復の読み筋(PV) → 置換表の手 → 駒取り(MVV-LVA) → 成り → その他
+    - 位置オブジェクトは engine/board_adapter.PyShogiPosition と同じインタフェースを想定
+    - tt（engine/tt.TranspositionTable）を渡すと局面の合流を検出し、手番をまたいで再利用する
+    - 深さ0では Quiescence（駒取り・成り・王手のみの延長）で評価する。quiescence=False で静的評価のみ
+    - time_ms / node_limit を渡すと締切で探索を打ち切り、それまでに読めた最善手を返す（anytime）
+      打ち切った反復でも、ルートで読み終えた手が前の反復の最善手より良ければそちらを採る
+    - stop_event（threading.Event）を渡すと、別スレッドから set() して打ち切れる（先読みの中断用）
+    - order_seed / start_depth は Lazy SMP（engine/smp.py）の補助ワーカー用。
+      並べ替えに乱数を混ぜ、反復の開始深さをずらして、主ワーカーと違う順で木を読む
+    """
+
+    def __init__(self, max_depth: int = 3, tt=None, quiescence: bool = True,
+                 qs_budget: int = QS_NODE_BUDGET, time_ms=None, node_limit=None, stop_event=None,
+                 order_seed: int = 0, start_depth: int = 1):
+        self.max_depth = max(1, int(max_depth))
+        self.tt = tt
+        self.qs = Quiescence(qs_budget) if quiescence else None
+        self.time_ms = time_ms
+        self.node_limit = node_limit
+        self.stop_event = stop_event
+        self._rng = random.Random(order_seed) if order_seed else None
+        self.start_depth = max(1, min(int(start_depth), self.max_depth))
+        self.nodes = 0
+        self._deadline = None
+        self._stop = False
+        self._root_score = 0
+        self.pv: list = []
+        self._pv_table = [[] for _ in range(MAX_PLY + 1)]
+
+    def search(self, pos) -> SearchResult:
+        t0 = time.perf_counter()
+        self.nodes = 0
+        self.pv = []
+        self._stop = False
+        self._deadline = t0 + self.time_ms / 1000.0 if self.time_ms is not None else None
+        if self.qs is not None:
+            self.qs.nodes = 0
+        if self.tt is not None:
+            self.tt.new_search()
+        result = SearchResult()
+
+        for depth in range(self.start_depth, self.max_depth + 1):
+            score = self._negamax(pos, depth, -INF, INF, 0, True)
+            pv = list(self._pv_table[0])
+            if self._stop:
+                result.stopped = True
+                # 途中まででも、前の反復の最善手（最初に読む手）を上回った手があれば採用
+                if pv and (result.move is None or pv[0] != result.move):
+                    result.move = pv[0]
+                    result.score = self._root_score
+                    result.pv = pv
+                break
+            if not pv:
+                # 合法手なし（詰み）
+                result.score = score
+                break
+            self.pv = pv
+            result.move = pv[0]
+            result.score = score
+            result.depth = depth
+            result.pv = pv
+            # 詰みを読み切ったらそれ以上深く読まない
+            if abs(score) >= MATE_SCORE - MAX_PLY:
+                break
+            # 次の反復は今までの数倍かかるので、持ち時間の半分を過ぎていたら始めない
+            if (self._deadline is not None
+                    and time.perf_counter() - t0 > (self._deadline - t0) * NEXT_ITERATION_RATIO):
+                break
+
+        if result.move is None and result.stopped:
+            # 深さ1すら読み終わらないほど予算が小さいとき: 並べ替えの先頭を返す
+            moves = pos.moves()
+            if moves:
+                result.move = self._order_moves(pos, moves)[0]
+                result.pv = [result.move]
+        result.qnodes = self.qs.nodes if self.qs is not None else 0
+        result.nodes = self.nodes + result.qnodes
+        result.elapsed = time.perf_counter() - t0
+        return result
+
+    # ---------- 内部 ----------
+    def _out_of_budget(self) -> bool:
+        if self.stop_event is not None and self.stop_event.is_set():
+            self._stop = True
+        elif self._deadline is not None and time.perf_counter() >= self._deadline:
+            self._stop = True
+        elif self.node_limit is not None:
+            qnodes = self.qs.nodes if self.qs is not None else 0
+            if self.nodes + qnodes >= self.node_limit:
+                self._stop = True
+        return self._stop
+
+    def _negamax(self, pos, depth, alpha, beta, ply, pv_node):
+        self._pv_table[ply] = []
+        # ルートは最低1手読むため、打ち切りの判定は ply>0 だけ
+        if ply > 0 and (self._stop or self._out_of_budget()):
+            return 0
+
+        if depth <= 0 and self.qs is not None and ply < MAX_PLY:
+            # 末端のノード数は静止探索側で数える
+            return self.qs.search(pos, alpha, beta, ply)
+        self.nodes += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return pos.evaluate()
+
+        tt = self.tt
+        tt_move = None
+        if tt is not None:
+            key = pos.key()
+            entry = tt.probe(key)
+            if entry is not None:
+                tt_move = entry[4]
+                # ルートでは手を返す必要があるので打ち切らない
+                if ply > 0 and entry[1] >= depth:
+                    score = _score_from_tt(entry[2], ply)
+                    flag = entry[3]
+                    if (flag == EXACT
+                            or (flag == LOWER and score >= beta)
+                            or (flag == UPPER and score <= alpha)):
+                        return score
+
+        moves = pos.moves()
+        if not moves:
+            # 将棋は手詰まり＝負け
+            return -MATE_SCORE + ply
+
+        alpha_orig = alpha
+        pv_move = self.pv[ply] if (pv_node and ply < len(self.pv)) else None
+        best = -INF
+        best_move = None
+        for mv in self._select_moves(pos, moves, pv_move, tt_move, ply, depth):
+            pos.push(mv)
+            score = -self._negamax(pos, depth - 1, -beta, -alpha, ply + 1,
+                                   pv_move is not None and mv == pv_move)
+            pos.pop()
+            if self._stop:
+                # 読みかけの値は信用できないので捨てる（置換表にも入れない）
+                return 0
+
+            if score > best:
+                best = score
+                best_move = mv
+                if score > alpha:
+                    alpha = score
+                    self._pv_table[ply] = [mv] + self._pv_table[ply + 1]
+                    if ply == 0:
+                        self._root_score = score
+                    if alpha >= beta:
+                        break
+
+        if tt is not None:
+            if best >= beta:
+                flag = LOWER
+            elif best <= alpha_orig:
+                flag = UPPER
+            else:
+                flag = EXACT
+            tt.store(key, depth, _score_to_tt(best, ply), flag, pos.encode(best_move))
+        return best
+
+    def _select_moves(self, pos, moves, pv_move, tt_move, ply, depth):
+        """内部ノードで読む手の列（並べ替え済み）。派生クラス（engine/hybrid.py）で枝刈りを足せる"""
+        return self._order_moves(pos, moves, pv_move, tt_move)
+
+    def _order_moves(self, pos, moves, pv_move=None, tt_move=None):
+        rng = self._rng
+
+        def key(mv):
+            if pv_move is not None and mv == pv_move:
+                return _ORDER_PV
+            if tt_move is not None and pos.encode(mv) == tt_move:
+                return _ORDER_TT
+            if rng is not None:
+                return order_key(pos, mv) + rng.randrange(_ORDER_JITTER)
+            return order_key(pos, mv)
+        return sorted(moves, key=key, reverse=True)
+
+
+# 詰みスコアは「ルートからの手数」込みなので、置換表には「その局面からの手数」で入れる
+def _score_to_tt(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score + ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score, ply):
+    if score >= MATE_SCORE - MAX_PLY:
+        return score - ply
+    if score <= -MATE_SCORE + MAX_PLY:
+        return score + ply
+    return score
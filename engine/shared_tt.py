@@ -0,0 +1,181 @@
+# engine/shared_tt.py
+# プロセス間で共有する置換表（multiprocessing.shared_memory 上の固定長 int 配列）
+#
+# engine/tt.TranspositionTable と同じインタフェース（new_search / probe / store / clear / stats）を持つので、
+# AlphaBetaSearcher にそのまま渡せる。Lazy SMP（engine/smp.py）の各ワーカーが同じ表を読み書きする。
+#
+# 1エントリ = 64bit 語 2つ: [key ^ data, data]
+#   data の bit  0..31 : score + 2**31
+#          bit 32..47 : move_code + 1（0 = 手なし）
+#          bit 48..55 : depth（0..255）
+#          bit 56..57 : flag（EXACT / LOWER / UPPER）
+#          bit 58..63 : generation（下位6bit）
+# 書き込みはロックしない。途中で別プロセスに上書きされた（ちぎれた）エントリは
+# key ^ data が一致しなくなるので probe で外れ扱いになる。
+from __future__ import annotations
+
+import weakref
+from multiprocessing import shared_memory
+
+# 先頭の管理領域（64bit 語）
+_HEADER_WORDS = 4
+_H_GENERATION = 0   # 探索の世代（親が new_search で進め、ワーカーは読むだけ）
+_H_STOP = 1         # 0 以外なら探索を打ち切る（Lazy SMP の中断用）
+_H_SIZE = 2         # エントリ数
+
+_WORD = 8
+_GEN_MASK = 0x3F
+_MASK64 = (1 << 64) - 1
+
+
+def _pack(depth, score, flag, move_code, generation):
+    mv = 0 if move_code is None else move_code + 1
+    return ((score + (1 << 31)) & 0xFFFFFFFF
+            | mv << 32
+            | max(0, min(255, depth)) << 48
+            | flag << 56
+            | (generation & _GEN_MASK) << 58)
+
+
+def _unpack(key, data):
+    mv = (data >> 32) & 0xFFFF
+    return (key,
+            (data >> 48) & 0xFF,
+            (data & 0xFFFFFFFF) - (1 << 31),
+            (data >> 56) & 0x3,
+            mv - 1 if mv else None,
+            (data >> 58) & _GEN_MASK)
+
+
+def _release(shm, owner):
+    # close は参照中のビューが残っていると失敗するので、先に名前を消しておく
+    if owner:
+        try:
+            shm.unlink()
+        except Exception:
+            pass
+    try:
+        shm.close()
+    except Exception:
+        pass
+
+
+class SharedStopFlag:
+    """表の管理領域にある中断フラグ。threading.Event と同じ is_set / set / clear を持つ"""
+
+    def __init__(self, words):
+        self._words = words
+
+    def is_set(self) -> bool:
+        return self._words[_H_STOP] != 0
+
+    def set(self):
+        self._words[_H_STOP] = 1
+
+    def clear(self):
+        self._words[_H_STOP] = 0
+
+
+class SharedTranspositionTable:
+    """
+    SharedTranspositionTable(max_entries)      : 親プロセスで作成（共有メモリを確保）
+    SharedTranspositionTable.attach(name)      : ワーカーで既存の表につなぐ
+    親が捨てられる（close / GC）と共有メモリも解放する。
+    統計（probes / hits / stores）はプロセスごとの値。
+    """
+
+    def __init__(self, max_entries: int = 1 << 16, name: str | None = None):
+        owner = name is None
+        if owner:
+            size = 1
+            while size < max(1, int(max_entries)):
+                size <<= 1
+            shm = shared_memory.SharedMemory(create=True, size=(_HEADER_WORDS + 2 * size) * _WORD)
+        else:
+            # つなぐのは親から spawn したワーカーだけ（resource_tracker を親と共有するので、
+            # ワーカーが終わっても共有メモリは消えない。破棄は作成した親が行う）
+            shm = shared_memory.SharedMemory(name=name)
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self._header = shm.buf[:_HEADER_WORDS * _WORD].cast("Q")
+        if owner:
+            self._header[_H_SIZE] = size
+        self.size = self._header[_H_SIZE]
+        self._mask = self.size - 1
+        self._words = shm.buf[_HEADER_WORDS * _WORD:(_HEADER_WORDS + 2 * self.size) * _WORD].cast("Q")
+        self.generation = self._header[_H_GENERATION]
+        self.stop_flag = SharedStopFlag(self._header)
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self._finalizer = weakref.finalize(self, _release, shm, owner)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedTranspositionTable":
+        return cls(name=name)
+
+    def close(self):
+        """共有メモリを手放す（作成したプロセスなら破棄）。以後この表は使えない"""
+        self._header.release()
+        self._words.release()
+        self._finalizer()
+
+    def new_search(self):
+        """作成したプロセスは世代を進め、つないだプロセスは現在の世代に合わせる"""
+        if self.owner:
+            self._header[_H_GENERATION] = (self._header[_H_GENERATION] + 1) & _GEN_MASK
+        self.generation = self._header[_H_GENERATION]
+
+    def probe(self, key: int):
+        self.probes += 1
+        i = (key & self._mask) << 1
+        words = self._words
+        data = words[i + 1]
+        if data and words[i] ^ data == key:
+            self.hits += 1
+            return _unpack(key, data)
+        return None
+
+    def store(self, key: int, depth: int, score: int, flag: int, move_code):
+        i = (key & self._mask) << 1
+        words = self._words
+        old = words[i + 1]
+        if old:
+            old_key = words[i] ^ old
+            if (old_key != key and (old >> 58) == (self.generation & _GEN_MASK)
+                    and depth < (old >> 48) & 0xFF):
+                return
+        data = _pack(depth, score, flag, move_code, self.generation)
+        words[i] = (key ^ data) & _MASK64
+        words[i + 1] = data
+        self.stores += 1
+
+    def clear(self):
+        n = 2 * self.size * _WORD
+        start = _HEADER_WORDS * _WORD
+        self._shm.buf[start:start + n] = bytes(n)
+
+    @property
+    def used(self) -> int:
+        data = self._words[1::2]
+        return self.size - data.tolist().count(0)
+
+    def memory_ceiling_bytes(self) -> int:
+        """共有メモリの大きさ（確保した時点で全体ぶん使う）"""
+        return self._shm.size
+
+    def stats(self) -> dict:
+        used = self.used
+        return {
+            "size": self.size,
+            "used": used,
+            "fill": used / self.size,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": (self.hits / self.probes) if self.probes else 0.0,
+            "stores": self.stores,
+            "generation": self.generation,
+            "memory_ceiling_bytes": self.memory_ceiling_bytes(),
+            "shared": True,
+        }
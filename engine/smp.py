@@ -0,0 +1,140 @@
+# engine/smp.py
+# Lazy SMP: 複数プロセスで同じ局面を並べ替え順を変えて読み、共有置換表で結果を融通し合う
+#
+#   searcher = LazySMPSearcher(workers=8, max_depth=8, tt=SharedTranspositionTable(1 << 18), time_ms=1000)
+#   result = searcher.search(board)            # SearchResult（move は engine/movecode の int 符号）
+#
+# Python のスレッドは GIL で並列に動かないので、ワーカーはプロセス（spawn）で作り、プロセスプールを使い回す。
+# ワーカーが読み込むのは engine/smp_worker.py だけ（親の shogi_main.py は読み直さない）。
+# プールは1回の探索ごとに借りて返す（checkout_pool）。同時に読む対局どうしは別々のプールを使うので
+# 互いの探索の後ろに並ばず、使い終わったプールは SMP_MAX_IDLE_POOLS 個まで次の探索に使い回す。
+# 主ワーカー（worker 0）は通常の並べ替え、補助ワーカーは乱数を混ぜた並べ替えと開始深さのずれで別の順に読む。
+# 主ワーカーが終わったら共有表の中断フラグで補助ワーカーも止め、一番深く読み終えた結果を採る。
+from __future__ import annotations
+
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import shogi
+
+from . import smp_worker
+from .search import SearchResult
+from .shared_tt import SharedTranspositionTable
+
+SMP_DEFAULT_TT_ENTRIES = 1 << 18
+SMP_MAX_IDLE_POOLS = 2      # 使い終わっても閉じずに残しておくプールの数
+_STOP_POLL_SEC = 0.01       # 外からの中断（先読みの停止など）を見に行く間隔
+
+_idle_pools: dict = {}      # ワーカー数 → [使っていないプール]
+_pool_lock = threading.Lock()
+
+
+def default_workers() -> int:
+    return max(1, os.cpu_count() or 1)
+
+
+def _spawn_pool(workers: int):
+    """
+    spawn のワーカーは親の __main__ を import し直すので、プールを作る（プロセスを起動する）間だけ
+    __main__ を engine/smp_worker.py に差し替えて、ワーカーにはそれだけを読ませる
+    """
+    ctx = multiprocessing.get_context("spawn")
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = smp_worker
+    try:
+        return ctx.Pool(processes=workers)
+    finally:
+        if main is not None:
+            sys.modules["__main__"] = main
+
+
+@contextmanager
+def checkout_pool(workers: int):
+    """workers 個のワーカーのプールを1回の探索のあいだ借りる（空いているものが無ければ作る）"""
+    with _pool_lock:
+        free = _idle_pools.get(workers)
+        pool = free.pop() if free else None
+    if pool is None:
+        pool = _spawn_pool(workers)
+    try:
+        yield pool
+    except BaseException:
+        # 途中で失敗したプールは中のジョブの状態が分からないので使い回さない
+        pool.terminate()
+        raise
+    with _pool_lock:
+        if sum(len(v) for v in _idle_pools.values()) < SMP_MAX_IDLE_POOLS:
+            _idle_pools.setdefault(workers, []).append(pool)
+            pool = None
+    if pool is not None:
+        pool.terminate()
+
+
+def shutdown_pool():
+    """使っていないプールをすべて閉じる"""
+    with _pool_lock:
+        pools = [p for v in _idle_pools.values() for p in v]
+        _idle_pools.clear()
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+
+# ---------- 親側 ----------
+class LazySMPSearcher:
+    """
+    AlphaBetaSearcher の並列版。tt は SharedTranspositionTable（無ければ探索ごとに作って捨てる）。
+    stop_event（threading.Event など is_set を持つもの）を渡すと外から打ち切れる。
+    """
+
+    def __init__(self, workers: int | None = None, max_depth: int = 3, tt=None,
+                 time_ms=None, node_limit=None, stop_event=None, quiescence: bool = True):
+        self.workers = max(1, int(workers or default_workers()))
+        self.max_depth = max(1, int(max_depth))
+        self.tt = tt
+        self.time_ms = time_ms
+        self.node_limit = node_limit
+        self.stop_event = stop_event
+        self.quiescence = quiescence
+        self.last_workers: list = []
+
+    def search(self, board: shogi.Board) -> SearchResult:
+        t0 = time.perf_counter()
+        tt = self.tt if isinstance(self.tt, SharedTranspositionTable) else \
+            SharedTranspositionTable(SMP_DEFAULT_TT_ENTRIES)
+        try:
+            tt.new_search()
+            tt.stop_flag.clear()
+            sfen = board.sfen()
+            with checkout_pool(self.workers) as pool:
+                jobs = [pool.apply_async(smp_worker.worker_search,
+                                         ((sfen, tt.name, i, self.max_depth, self.time_ms,
+                                           self.node_limit, self.quiescence),))
+                        for i in range(self.workers)]
+
+                main = jobs[0]
+                while not main.ready():
+                    main.wait(_STOP_POLL_SEC)
+                    if self.stop_event is not None and self.stop_event.is_set():
+                        tt.stop_flag.set()
+                tt.stop_flag.set()
+                results = [j.get() for j in jobs]
+        finally:
+            tt.stop_flag.clear()
+            if tt is not self.tt:
+                tt.close()
+
+        self.last_workers = results
+        # 一番深く読み終えた結果（同じ深さなら主ワーカー）
+        best = max(results, key=lambda r: (r["depth"], r["worker"] == 0))
+        return SearchResult(
+            move=best["move"], score=best["score"], depth=best["depth"],
+            nodes=sum(r["nodes"] for r in results),
+            qnodes=sum(r["qnodes"] for r in results),
+            elapsed=time.perf_counter() - t0,
+            pv=best["pv"], stopped=best["stopped"],
+        )
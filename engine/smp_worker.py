@@ -0,0 +1,46 @@
+# engine/smp_worker.py
+# Lazy SMP（engine/smp.py）のワーカープロセス側
+#
+# spawn のワーカーは起動時に親の __main__ を import し直す。親が shogi_main.py だと
+# TensorFlow・Flask・policy モデル・学習データのキャッシュまでワーカーごとに読み込んでしまうので、
+# engine/smp.py はプールを作る間だけ __main__ をこのモジュールに差し替える。
+# ワーカーはこのモジュール（探索・共有置換表）だけを読めばよいので、ここでは重いものを import しない。
+from __future__ import annotations
+
+from collections import OrderedDict
+
+from .position import ArrayPosition
+from .search import AlphaBetaSearcher
+from .shared_tt import SharedTranspositionTable
+
+_MAX_ATTACHED = 8           # ワーカーがつないだままにしておく共有表の数
+
+_attached: "OrderedDict[str, SharedTranspositionTable]" = OrderedDict()
+
+
+def _attach(name: str) -> SharedTranspositionTable:
+    tt = _attached.get(name)
+    if tt is None:
+        tt = SharedTranspositionTable.attach(name)
+        _attached[name] = tt
+        while len(_attached) > _MAX_ATTACHED:
+            _attached.popitem(last=False)[1].close()
+    else:
+        _attached.move_to_end(name)
+    return tt
+
+
+def worker_search(args) -> dict:
+    sfen, tt_name, worker_id, max_depth, time_ms, node_limit, quiescence = args
+    tt = _attach(tt_name)
+    searcher = AlphaBetaSearcher(
+        max_depth=max_depth, tt=tt, quiescence=quiescence, time_ms=time_ms, node_limit=node_limit,
+        stop_event=tt.stop_flag,
+        # 補助ワーカーは並べ替えに乱数を混ぜ、奇数番は1手深い反復から始める
+        order_seed=worker_id, start_depth=1 + (worker_id % 2),
+    )
+    r = searcher.search(ArrayPosition.from_sfen(sfen))
+    return {
+        "worker": worker_id, "move": r.move, "score": r.score, "depth": r.depth,
+        "nodes": r.nodes, "qnodes": r.qnodes, "stopped": r.stopped, "pv": r.pv,
+    }
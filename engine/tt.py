@@ -0,0 +1,80 @@
+# engine/tt.py
+# 置換表（Transposition Table）
+# 1局ぶんの AI 手番をまたいで使い回す想定（game_states[player_id]["tt"] に保持）
+from __future__ import annotations
+
+import sys
+
+# 評価値の種類
+EXACT = 0   # 窓内で確定
+LOWER = 1   # fail-high（下限）
+UPPER = 2   # fail-low（上限）
+
+# 1エントリあたりの概算バイト数（リストのスロット + タプル + 64bit キー + 評価値）
+# 手は int 符号で持つので Move オブジェクトは保持しない。
+_ENTRY_BYTES = 8 + sys.getsizeof((0, 0, 0, 0, 0, 0)) + sys.getsizeof(1 << 63) + 28
+
+
+class TranspositionTable:
+    """
+    固定サイズ（2 のべき乗）のハッシュ表。衝突時の置き換えは深さ優先：
+      - 空き / 同じ局面 / 古い世代のエントリ は常に上書き
+      - それ以外は新しい深さ >= 既存の深さ のときだけ上書き
+    エントリ: (key, depth, score, flag, move_code, generation)
+    """
+
+    def __init__(self, max_entries: int = 1 << 16):
+        size = 1
+        while size < max(1, int(max_entries)):
+            size <<= 1
+        self.size = size
+        self._mask = size - 1
+        self._table: list = [None] * size
+        self.generation = 0
+        self.used = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """探索ごとに世代を進める（前の手の結果は残るが、置き換えられやすくなる）"""
+        self.generation = (self.generation + 1) & 0xFFFF
+
+    def probe(self, key: int):
+        self.probes += 1
+        e = self._table[key & self._mask]
+        if e is not None and e[0] == key:
+            self.hits += 1
+            return e
+        return None
+
+    def store(self, key: int, depth: int, score: int, flag: int, move_code):
+        idx = key & self._mask
+        old = self._table[idx]
+        if old is None:
+            self.used += 1
+        elif old[0] != key and old[5] == self.generation and depth < old[1]:
+            return
+        self._table[idx] = (key, depth, score, flag, move_code, self.generation)
+        self.stores += 1
+
+    def clear(self):
+        self._table = [None] * self.size
+        self.used = 0
+
+    def memory_ceiling_bytes(self) -> int:
+        """全スロットが埋まったときの概算メモリ"""
+        return sys.getsizeof(self._table) + self.size * (_ENTRY_BYTES - 8)
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "used": self.used,
+            "fill": self.used / self.size,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": (self.hits / self.probes) if self.probes else 0.0,
+            "stores": self.stores,
+            "generation": self.generation,
+            "memory_ceiling_bytes": self.memory_ceiling_bytes(),
+        }
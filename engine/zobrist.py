@@ -0,0 +1,66 @@
+# engine/zobrist.py
+# 盤面・手駒・手番の Zobrist ハッシュ（64bit）
+# python-shogi 内蔵の zobrist_hash() は先手の手駒しか見ないため、探索用に自前で持つ。
+import random
+
+import shogi
+
+_MASK64 = (1 << 64) - 1
+_rng = random.Random(0x5F3759DF)   # 固定シード（プロセス間で同じ値になる）
+
+# PIECE_KEYS[color][piece_type][square]
+PIECE_KEYS = [[[_rng.getrandbits(64) for _ in range(81)] for _ in range(15)] for _ in range(2)]
+# HAND_KEYS[color][piece_type][count]  count=0..18
+HAND_KEYS = [[[_rng.getrandbits(64) for _ in range(19)] for _ in range(15)] for _ in range(2)]
+SIDE_KEY = _rng.getrandbits(64)    # 後手番のとき XOR
+
+HAND_TYPES = (shogi.PAWN, shogi.LANCE, shogi.KNIGHT, shogi.SILVER,
+              shogi.GOLD, shogi.BISHOP, shogi.ROOK)
+
+# 成駒 → 元の駒種（取った駒を手駒に戻すとき用）
+UNPROMOTE = list(range(15))
+for _base, _prom in enumerate(shogi.PIECE_PROMOTED):
+    if _prom:
+        UNPROMOTE[_prom] = _base
+
+
+def board_hash(board: shogi.Board) -> int:
+    """python-shogi の Board から全走査でハッシュを作る（探索の開始時だけ使う）"""
+    h = 0
+    for sq in shogi.SQUARES:
+        pt = board.piece_type_at(sq)
+        if pt:
+            h ^= PIECE_KEYS[board.piece_at(sq).color][pt][sq]
+    for color in (shogi.BLACK, shogi.WHITE):
+        hand = board.pieces_in_hand[color]
+        for pt in HAND_TYPES:
+            h ^= HAND_KEYS[color][pt][hand[pt]]
+    if board.turn == shogi.WHITE:
+        h ^= SIDE_KEY
+    return h
+
+
+def move_delta(board: shogi.Board, move: shogi.Move) -> int:
+    """
+    push する前の局面で呼ぶ。現在のハッシュに XOR すると push 後のハッシュになる。
+    """
+    color = board.turn
+    to = move.to_square
+    h = SIDE_KEY
+    if move.drop_piece_type:
+        pt = move.drop_piece_type
+        n = board.pieces_in_hand[color][pt]
+        h ^= HAND_KEYS[color][pt][n] ^ HAND_KEYS[color][pt][n - 1]
+        h ^= PIECE_KEYS[color][pt][to]
+        return h
+
+    pt = board.piece_type_at(move.from_square)
+    h ^= PIECE_KEYS[color][pt][move.from_square]
+    h ^= PIECE_KEYS[color][shogi.PIECE_PROMOTED[pt] if move.promotion else pt][to]
+    cap = board.piece_type_at(to)
+    if cap:
+        h ^= PIECE_KEYS[color ^ 1][cap][to]
+        base = UNPROMOTE[cap]
+        n = board.pieces_in_hand[color][base]
+        h ^= HAND_KEYS[color][base][n] ^ HAND_KEYS[color][base][n + 1]
+    return h
@@ -1,5 +1,8 @@
 # learn/apply_usi.py
 from copy import deepcopy
+
+import numpy as np
+
 from .sfen_action import sfen_to_index
 from .constants import DROP_ORDER
 
@@ -83,3 +86,78 @@ def apply_usi(board_2d, hands, side_to_move, usi):
 
     return board, hands2, next_side
 
+
+
+# ==============================
+# 整数の局面（学習データの再生用）
+# ==============================
+
+# 駒種 1..14 は PIECES（P L N S G B R K +P +L +N +S +B +R）の順 +1。python-shogi の駒種と同じ番号
+_PROMOTE_PT = [0, 9, 10, 11, 12, 0, 13, 14, 0, 0, 0, 0, 0, 0, 0]   # 成れない駒は 0
+_DEMOTE_PT = [0, 1, 2, 3, 4, 5, 6, 7, 8, 1, 2, 3, 4, 6, 7]          # 取った駒 → 持ち駒の駒種
+_DROP_PT = {p: i + 1 for i, p in enumerate(DROP_ORDER)}
+
+# 平手の初期局面（マス番号は python-shogi と同じ 段 * 9 + (9 - 筋)。0 = 9a）
+_BACK_RANK = [2, 3, 4, 5, 8, 5, 4, 3, 2]   # 香 桂 銀 金 玉 金 銀 桂 香
+_INITIAL_BOARD = np.zeros(81, dtype=np.int8)
+_INITIAL_BOARD[0:9] = [-p for p in _BACK_RANK]
+_INITIAL_BOARD[9 + 1], _INITIAL_BOARD[9 + 7] = -7, -6        # 後手 飛 8b・角 2b
+_INITIAL_BOARD[18:27] = -1
+_INITIAL_BOARD[54:63] = 1
+_INITIAL_BOARD[63 + 1], _INITIAL_BOARD[63 + 7] = 6, 7        # 先手 角 8h・飛 2h
+_INITIAL_BOARD[72:81] = _BACK_RANK
+
+def usi_square(s: str) -> int:
+    """USI のマス（"7g"）→ python-shogi のマス番号（段 * 9 + (9 - 筋)）"""
+    return (ord(s[1]) - 97) * 9 + 9 - (ord(s[0]) - 48)
+
+
+class CompactPosition:
+    """
+    整数で持つ局面。apply_usi はその場で書き換える（盤・持ち駒のコピーを作らない）。
+      board: int8[81]  0=空 / +駒種=先手 / -駒種=後手（マス番号は python-shogi と同じ）
+      hands: int8[14]  先手の DROP_ORDER 7種 → 後手の 7種の枚数
+      turn : 0=先手 / 1=後手
+    learn/encode.positions_to_planes にそのまま渡せる（planes は python-shogi の Board から作るものと同じ）。
+    """
+    __slots__ = ("board", "hands", "turn")
+
+    def __init__(self, board=None, hands=None, turn: int = 0):
+        self.board = np.array(_INITIAL_BOARD if board is None else board, dtype=np.int8)
+        self.hands = np.zeros(14, dtype=np.int8) if hands is None else np.array(hands, dtype=np.int8)
+        self.turn = int(turn)
+
+    def copy(self) -> "CompactPosition":
+        return CompactPosition(self.board, self.hands, self.turn)
+
+    def mover_of(self, usi: str):
+        """usi を指す側（移動元の駒の持ち主 0/1）。打ち駒・移動元が空なら None"""
+        if "*" in usi:
+            return None
+        p = self.board[usi_square(usi[:2])]
+        return None if p == 0 else (0 if p > 0 else 1)
+
+    def apply_usi(self, usi: str):
+        """usi を1手進める（その場で書き換え）。移動元が空の異常な手は手番だけ進める（apply_usi と同じ扱い）"""
+        board, sign = self.board, (1 if self.turn == 0 else -1)
+        if "*" in usi:
+            pt = _DROP_PT[usi[0]]
+            board[usi_square(usi[2:4])] = sign * pt
+            i = self.turn * 7 + pt - 1
+            if self.hands[i] > 0:
+                self.hands[i] -= 1
+        else:
+            frm, to = usi_square(usi[:2]), usi_square(usi[2:4])
+            moving = int(board[frm])
+            if moving:
+                captured = int(board[to])
+                if captured:
+                    base = _DEMOTE_PT[abs(captured)]
+                    if base <= 7:                      # 玉は持ち駒にしない
+                        self.hands[self.turn * 7 + base - 1] += 1
+                pt = abs(moving)
+                if len(usi) == 5 and usi[4] == "+" and _PROMOTE_PT[pt]:
+                    pt = _PROMOTE_PT[pt]
+                board[frm] = 0
+                board[to] = sign * pt
+        self.turn ^= 1
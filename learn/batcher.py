@@ -0,0 +1,129 @@
+# learn/batcher.py
+# 推論のまとめ役（micro-batching）: 同時に来た1局面ずつの推論要求を数ミリ秒ためて1回の forward にまとめる
+#
+#   batcher = InferenceBatcher(forward, max_batch=16, max_wait_ms=3)
+#   logits = batcher.infer(x)          # x: (9,9,C)。別スレッドから同時に呼んでよい → (A,)
+#   batcher.close()
+#
+# 複数の AI 対局が同時に手を求めても、forward の回数は「要求数」ではなく「まとまった回数」で済む。
+# forward は作業スレッド1本からしか呼ばれないので、TFLite インタプリタのようにスレッド安全でないものも渡せる。
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+BATCH_MAX_SIZE = 16      # 1回の forward にまとめる最大局面数
+BATCH_MAX_WAIT_MS = 3.0  # 最初の要求が来てから待つ最大時間
+
+
+class InferenceBatcher:
+    """
+    forward(x: (N,9,9,C) float32) -> logits (N,A) をまとめて呼ぶ。
+    作業スレッドは最初の要求で立ち上げる（デーモンスレッド）。
+    """
+
+    def __init__(self, forward, max_batch: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.forward = forward
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        # 統計
+        self.requests = 0
+        self.batches = 0
+        self.max_seen = 0
+        self.forward_ms = 0.0
+
+    # ---------- 呼び出し側 ----------
+    def submit(self, x: np.ndarray) -> Future:
+        """x: (9,9,C) の1局面。結果の logits (A,) を持つ Future を返す"""
+        fut = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("InferenceBatcher is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="infer-batcher", daemon=True)
+                self._thread.start()
+            # close() の停止の合図より前に必ず並ぶよう、ロックを持ったまま積む
+            self._queue.put((np.asarray(x, dtype=np.float32), fut))
+        return fut
+
+    def infer(self, x: np.ndarray, timeout: float | None = None) -> np.ndarray:
+        return self.submit(x).result(timeout)
+
+    def close(self):
+        """作業スレッドを止める（待っている要求は処理してから止まる）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            th = self._thread
+            self._queue.put(None)
+        if th is not None:
+            th.join()
+        # 作業スレッドが拾わなかった要求が残っていれば、待っている側を起こす
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("InferenceBatcher is closed"))
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_seen,
+            "mean_forward_ms": self.forward_ms / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    # ---------- 作業スレッド ----------
+    def _collect(self, first) -> tuple[list, bool]:
+        """first に続く要求を max_wait の間、max_batch まで集める。return: (items, 停止要求が来たか)"""
+        items = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            items, stop = self._collect(first)
+            # キャンセル済みの要求は外す
+            items = [(x, f) for x, f in items if f.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                t0 = time.perf_counter()
+                logits = np.asarray(self.forward(np.stack([x for x, _ in items])))
+                self.forward_ms += (time.perf_counter() - t0) * 1000.0
+            except Exception as e:
+                for _, f in items:
+                    f.set_exception(e)
+                continue
+            self.requests += len(items)
+            self.batches += 1
+            self.max_seen = max(self.max_seen, len(items))
+            for i, (_, f) in enumerate(items):
+                f.set_result(logits[i])
@@ -2,6 +2,9 @@
 PIECES = ["P","L","N","S","G","B","R","K","+P","+L","+N","+S","+B","+R"]
 PIECE2IDX = {p: i for i, p in enumerate(PIECES)}  # 0..13
 
+# 入力の面数: 駒 28（先後×14種）+ 手駒 14（先後×7種）+ 手番 1
+NUM_PLANES = 28 + 14 + 1
+
 # 打ち駒に使う7種の順序
 DROP_ORDER = ["P","L","N","S","G","B","R"]
 DROP2IDX = {p: i for i, p in enumerate(DROP_ORDER)}
@@ -9,153 +9,9 @@ from typing import List, Tuple, Optional
 import numpy as np
 
 # プロジェクト内モジュール
-from .encode import board_to_planes
+from .encode import pack_samples, positions_to_planes, samples_to_planes
 from .sfen_action import usi_to_action_id
-from .apply_usi import apply_usi
-from .utils import initial_board_2d
-
-
-# ==============================
-# 互換ラッパ（戻り値の型ゆらぎを吸収）
-# ==============================
-def _take3(x):
-    """
-    (board, hands, side) に正規化して返す。
-    - list/tuple: 先頭3つ
-    - dict: 'board','hands','side'（sideは 'turn','side_to_move','turn_player' なども許容）
-    """
-    if isinstance(x, (list, tuple)):
-        if len(x) >= 3:
-            return x[0], x[1], x[2]
-        raise ValueError(f"expected >=3 items, got len={len(x)} in {type(x)}")
-
-    if isinstance(x, dict):
-        b = x.get("board")
-        h = x.get("hands")
-        s = x.get("side", x.get("turn", x.get("side_to_move", x.get("turn_player"))))
-        if b is not None and h is not None and s is not None:
-            return b, h, s
-        raise ValueError(f"dict result missing keys: has={list(x.keys())[:8]}")
-
-    raise ValueError(f"unexpected result type: {type(x)}")
-
-
-def _sfen_row_to_cells(row: str) -> list:
-    """SFEN1段分をセル配列へ展開（数字は空マスの繰り返し）"""
-    cells = []
-    for ch in row:
-        if ch.isdigit():
-            cells.extend([""] * int(ch))
-        elif ch == ".":
-            cells.append("")
-        else:
-            cells.append(ch)
-    return cells
-
-
-def _normalize_board_2d(board) -> list:
-    """
-    board が str / list[str] / list[list[str]] / SFEN でも 9x9 の list[list[str]] にして返す。
-    """
-    # 既に 9x9 二次元配列
-    if isinstance(board, list) and board and isinstance(board[0], list):
-        if len(board) == 9 and all(isinstance(r, list) and len(r) == 9 for r in board):
-            return board
-
-    # "row/.../row" 形式
-    if isinstance(board, str) and "/" in board:
-        rows = board.split("/")
-        norm = []
-        for row in rows:
-            cells = _sfen_row_to_cells(row.strip())
-            if len(cells) < 9:
-                cells += [""] * (9 - len(cells))
-            if len(cells) > 9:
-                cells = cells[:9]
-            norm.append(cells)
-        if len(norm) < 9:
-            norm += [[""] * 9 for _ in range(9 - len(norm))]
-        if len(norm) > 9:
-            norm = norm[:9]
-        return norm
-
-    # list[str]（各段が文字列）
-    if isinstance(board, list) and board and isinstance(board[0], str):
-        norm = []
-        for row in board:
-            if "," in row or " " in row:
-                cells = [c.strip() for c in row.replace(",", " ").split() if c.strip()]
-            else:
-                cells = list(row)
-            if len(cells) < 9:
-                cells += [""] * (9 - len(cells))
-            if len(cells) > 9:
-                cells = cells[:9]
-            norm.append(cells)
-        if len(norm) < 9:
-            norm += [[""] * 9 for _ in range(9 - len(norm))]
-        if len(norm) > 9:
-            norm = norm[:9]
-        return norm
-
-    # list（長さ9で各要素がスカラ）の場合
-    if isinstance(board, list) and len(board) == 9 and all(not isinstance(r, (list, dict)) for r in board):
-        norm = []
-        for r in board:
-            s = str(r)
-            cells = list(s)[:9]
-            if len(cells) < 9:
-                cells += [""] * (9 - len(cells))
-            norm.append(cells)
-        return norm
-
-    # 不明→空盤
-    return [[""] * 9 for _ in range(9)]
-
-
-def _normalize_hands(h):
-    """
-    hands を {"sente": {...}, "gote": {...}} に統一。
-    """
-    def as_piece_dict(x):
-        return x if isinstance(x, dict) else {}
-
-    if isinstance(h, dict):
-        s = h.get("sente", h.get("black", h.get("b", h.get("B"))))
-        g = h.get("gote", h.get("white", h.get("w", h.get("W"))))
-        return {"sente": as_piece_dict(s), "gote": as_piece_dict(g)}
-
-    if isinstance(h, (list, tuple)) and len(h) == 2:
-        return {"sente": as_piece_dict(h[0]), "gote": as_piece_dict(h[1])}
-
-    return {"sente": {}, "gote": {}}
-
-
-def _normalize_side(s):
-    """
-    side を "sente" / "gote" に統一。
-    """
-    if isinstance(s, str):
-        ls = s.lower()
-        if ls in ("sente", "black", "b"):
-            return "sente"
-        if ls in ("gote", "white", "w"):
-            return "gote"
-    if isinstance(s, (int, bool)):
-        return "sente" if int(s) == 1 else "gote"
-    return "sente"
-
-
-def _unpack_initial_board():
-    b, h, s = _take3(initial_board_2d())
-    return _normalize_board_2d(b), _normalize_hands(h), _normalize_side(s)
-
-
-def _apply_usi_compat(board, hands, side, usi):
-    b = _normalize_board_2d(board)
-    h = _normalize_hands(hands)
-    s = _normalize_side(side)
-    return _take3(apply_usi(b, h, s, usi))
+from .apply_usi import CompactPosition
 
 
 # ==============================
@@ -198,12 +54,29 @@ def _save_json(path: Path, obj):
 
 
 # ==============================
-# 1ゲームのエンコード
+# 勝敗（value head の教師）
 # ==============================
-def _encode_single_game(kifu_json: dict):
-    board, hands, side = _unpack_initial_board()
-    X, y = [], []
+def first_player_result(kifu_json: dict) -> float:
+    """
+    先に指した側から見た勝敗: 勝ち +1 / 負け -1 / 不明・引き分け 0
+    - 対人棋譜: first / winner が "main" / "sub"
+    - AI 棋譜 : first が "player" / "ai"、result が player 視点の "win" / "lose"
+    """
+    first = kifu_json.get("first")
+    winner = kifu_json.get("winner")
+    if first in ("main", "sub") and winner in ("main", "sub"):
+        return 1.0 if winner == first else -1.0
+    result = kifu_json.get("result")
+    if first in ("player", "ai") and result in ("win", "lose"):
+        player_won = result == "win"
+        return 1.0 if (first == "player") == player_won else -1.0
+    return 0.0
+
 
+# ==============================
+# 1ゲームのエンコード
+# ==============================
+def _game_moves(kifu_json: dict) -> list:
     moves = kifu_json.get("moves")
     if not moves:
         karr = kifu_json.get("kifu")
@@ -211,8 +84,31 @@ def _encode_single_game(kifu_json: dict):
             moves = [m.get("usi") for m in karr if isinstance(m, dict) and m.get("usi")]
         else:
             moves = []
+    return moves
+
+
+def replay_game(kifu_json: dict):
+    """
+    1局を整数の局面のまま再生する。return: (boards (n,81), hands (n,14), turns (n,), y (n,), v (n,))
+    v は各局面の手番側から見た最終的な勝敗（value head の教師）。
+    局面は CompactPosition で平手から1手ずつその場で進め、各手の直前の局面を書き溜める
+    （配信側の shogi_board_to_planes と同じ盤の向き）。
+    先に指すのが後手の棋譜（AI が先手番を持った対局・反転棋譜）は、初手の駒の持ち主から判断する。
+    """
+    moves = _game_moves(kifu_json)
+    z = first_player_result(kifu_json)
+
+    pos = CompactPosition()
+    if moves and pos.mover_of(moves[0]) == 1:
+        pos.turn = 1
+
+    n = len(moves)
+    boards = np.empty((n, 81), dtype=np.int8)
+    hands = np.empty((n, 14), dtype=np.int8)
+    turns = np.empty(n, dtype=np.int8)
+    y, v = [], []
 
-    for usi in moves:
+    for ply, usi in enumerate(moves):
         try:
             aid = usi_to_action_id(usi)
         except Exception:
@@ -220,12 +116,23 @@ def _encode_single_game(kifu_json: dict):
         if aid is None:
             continue
 
-        X.append(board_to_planes(_normalize_board_2d(board), _normalize_hands(hands), _normalize_side(side)))
+        k = len(y)
+        boards[k] = pos.board
+        hands[k] = pos.hands
+        turns[k] = pos.turn
         y.append(aid)
+        v.append(z if ply % 2 == 0 else -z)
 
-        board, hands, side = _apply_usi_compat(board, hands, side, usi)
+        pos.apply_usi(usi)
 
-    return np.asarray(X, np.float32), np.asarray(y, np.int32)
+    k = len(y)
+    return boards[:k], hands[:k], turns[:k], np.asarray(y, np.int32), np.asarray(v, np.float32)
+
+
+def _encode_single_game(kifu_json: dict):
+    """return: (X, y, v)。1局ぶんをまとめて planes にする"""
+    boards, hands, turns, y, v = replay_game(kifu_json)
+    return positions_to_planes(boards, hands, turns), y, v
 
 
 # ==============================
@@ -268,30 +175,9 @@ def _is_finished_record(data: dict) -> bool:
     return False
 
 
-def load_folder_as_dataset(
-    folder: str,
-    finished_only: bool = False,
-    registry_path: Optional[str] = None,
-    only_unfingerprinted: bool = True,
-    collect_mark_list: bool = False,
-):
-    """
-    指定フォルダ内の *.json を走査して (X,y) を構築。
-    - finished_only=True: 終局フラグのある棋譜のみ
-    - registry_path: 既学習の fingerprint をスキップ（増分）
-    - collect_mark_list=True: 'fingerprint' を付与すべき (path, fp) を返す
-    """
-    folder_p = Path(folder)
-    if not folder_p.exists():
-        raise FileNotFoundError(f"folder not found: {folder}")
-
-    regset = _load_registry_set(registry_path) if registry_path else set()
-
-    Xs: List[np.ndarray] = []
-    Ys: List[np.ndarray] = []
-    kept = skipped_unfinished = skipped_seen = 0
-    mark_list: List[Tuple[str, str]] = []
-
+def _scan_folder(folder_p: Path, finished_only: bool, regset: set, use_registry: bool,
+                 collect_mark_list: bool, counts: dict, mark_list: list):
+    """学習に使う棋譜を (path, fp, data) で順に返す（counts・mark_list を更新する）"""
     for p in sorted(folder_p.glob("*.json")):
         data = _load_json(p)
         if not isinstance(data, dict):
@@ -301,7 +187,7 @@ def load_folder_as_dataset(
         if finished_only:
             finished_flag = _is_finished_record(data)
             if not finished_flag:
-                skipped_unfinished += 1
+                counts["skipped_unfinished"] += 1
                 continue
 
         # 2) 指紋
@@ -312,19 +198,65 @@ def load_folder_as_dataset(
                 mark_list.append((str(p), fp))
 
         # 3) 増分スキップ
-        if only_unfingerprinted and registry_path and fp in regset:
-            skipped_seen += 1
+        if use_registry and fp in regset:
+            counts["skipped_seen"] += 1
             continue
 
-        # 4) encode
-        X, Y = _encode_single_game(data)
-        if X.size == 0 or Y.size == 0:
+        yield p, fp, data
+
+
+def load_folder_as_dataset(
+    folder: str,
+    finished_only: bool = False,
+    registry_path: Optional[str] = None,
+    only_unfingerprinted: bool = True,
+    collect_mark_list: bool = False,
+    with_value: bool = False,
+    cache=None,
+    packed: bool = False,
+):
+    """
+    指定フォルダ内の *.json を走査して (X,y) を構築。
+    - finished_only=True: 終局フラグのある棋譜のみ
+    - registry_path: 既学習の fingerprint をスキップ（増分）
+    - collect_mark_list=True: 'fingerprint' を付与すべき (path, fp) を返す
+    - with_value=True: value head の教師 V も返す（(X, y, V[, marks])）
+    - cache: learn/shards.ShardStore。エンコード済みの棋譜は指紋で引いて memmap から読み、
+             無い棋譜はエンコードしてキャッシュに足す
+    - packed=True: X を planes (N,9,9,43) float32 ではなく詰めた局面 (N,95) uint8（encode.pack_samples）で返す。
+             メモリは約 1/147。planes への展開は学習時に入力パイプラインで行う（stream.make_memory_datasets）
+    """
+    folder_p = Path(folder)
+    if not folder_p.exists():
+        raise FileNotFoundError(f"folder not found: {folder}")
+
+    regset = _load_registry_set(registry_path) if registry_path else set()
+
+    games: List[tuple] = []   # 1局ずつ (samples, y, v)
+    counts = {"skipped_unfinished": 0, "skipped_seen": 0}
+    kept = cached = 0
+    mark_list: List[Tuple[str, str]] = []
+
+    for p, fp, data in _scan_folder(folder_p, finished_only, regset,
+                                    bool(only_unfingerprinted and registry_path),
+                                    collect_mark_list, counts, mark_list):
+        # 4) encode（キャッシュにあればそれを使う）
+        rec = cache.get(fp) if cache is not None else None
+        if rec is not None:
+            game = (rec["sample"], rec["y"], rec["v"])
+            cached += 1
+        else:
+            boards, hands, turns, y, v = replay_game(data)
+            if cache is not None and len(y):
+                cache.put(fp, boards, hands, turns, y, v)
+            game = (pack_samples(boards, hands, turns), y, v)
+        if len(game[1]) == 0:
             continue
-        Xs.append(X)
-        Ys.append(Y)
+        games.append(game)
         kept += 1
 
-    if not Xs:
+    skipped_unfinished, skipped_seen = counts["skipped_unfinished"], counts["skipped_seen"]
+    if not games:
         print(f"📝 kept=0, skipped_unfinished={skipped_unfinished}, skipped_seen={skipped_seen}")
         # フォールバック：終局のみで0件なら未終局も許可して再読込
         if finished_only and skipped_unfinished > 0:
@@ -335,14 +267,66 @@ def load_folder_as_dataset(
                 registry_path=registry_path,
                 only_unfingerprinted=only_unfingerprinted,
                 collect_mark_list=collect_mark_list,
+                with_value=with_value,
+                cache=cache,
+                packed=packed,
             )
         raise RuntimeError(f"データが見つかりませんでした: {folder}")
 
-    print(f"🗂️ load [{folder}]: kept={kept} skipped_unfinished={skipped_unfinished} skipped_seen={skipped_seen}")
+    print(f"🗂️ load [{folder}]: kept={kept} (cached={cached}) skipped_unfinished={skipped_unfinished} skipped_seen={skipped_seen}")
 
-    Xc = np.concatenate(Xs, axis=0)
-    Yc = np.concatenate(Ys, axis=0)
-    return (Xc, Yc, mark_list) if collect_mark_list else (Xc, Yc)
+    Sc, Yc, Vc = (np.concatenate(cols, axis=0) for cols in zip(*games))
+    Xc = Sc if packed else samples_to_planes(Sc)
+    out = (Xc, Yc, Vc) if with_value else (Xc, Yc)
+    return out + (mark_list,) if collect_mark_list else out
+
+
+def index_folder(
+    folder: str,
+    finished_only: bool = False,
+    registry_path: Optional[str] = None,
+    only_unfingerprinted: bool = True,
+    cache=None,
+):
+    """
+    load_folder_as_dataset と同じ棋譜を選ぶが、局面は読み込まずに「どの棋譜を使うか」だけ返す（ストリーミング学習用）。
+    cache を渡すと、まだ無い棋譜をここでエンコードしてキャッシュに足しておく（1局ずつ。全体を持たない）。
+    return: (entries [(path, fp, 局面数)], marks)
+    """
+    folder_p = Path(folder)
+    if not folder_p.exists():
+        raise FileNotFoundError(f"folder not found: {folder}")
+
+    regset = _load_registry_set(registry_path) if registry_path else set()
+    counts = {"skipped_unfinished": 0, "skipped_seen": 0}
+    entries: List[tuple] = []
+    mark_list: List[Tuple[str, str]] = []
+
+    for p, fp, data in _scan_folder(folder_p, finished_only, regset,
+                                    bool(only_unfingerprinted and registry_path),
+                                    True, counts, mark_list):
+        rec = cache.get(fp) if cache is not None else None
+        if rec is not None:
+            n = len(rec)
+        else:
+            game = replay_game(data)
+            n = len(game[3])
+            if cache is not None and n:
+                cache.put(fp, *game)
+        if n:
+            entries.append((str(p), fp, n))
+
+    skipped_unfinished, skipped_seen = counts["skipped_unfinished"], counts["skipped_seen"]
+    if not entries:
+        print(f"📝 kept=0, skipped_unfinished={skipped_unfinished}, skipped_seen={skipped_seen}")
+        if finished_only and skipped_unfinished > 0:
+            print("↩️ 終局のみでは0件だったため、未終局も許可して再読み込みします")
+            return index_folder(folder, False, registry_path, only_unfingerprinted, cache)
+        raise RuntimeError(f"データが見つかりませんでした: {folder}")
+
+    print(f"🗂️ index [{folder}]: games={len(entries)} positions={sum(n for _, _, n in entries)} "
+          f"skipped_unfinished={skipped_unfinished} skipped_seen={skipped_seen}")
+    return entries, mark_list
 
 
 # ==============================
@@ -356,35 +340,62 @@ def load_two_folders(
     registry_b: Optional[str] = None,
     collect_mark_list: bool = True,
     only_unfingerprinted: bool = True,
+    with_value: bool = False,
+    cache=None,
+    packed: bool = False,
 ):
-    Xa, Ya, mark_a = load_folder_as_dataset(
+    """return: (X, Y, marks)。with_value=True なら (X, Y, V, marks)。packed=True なら X は詰めた局面"""
+    *A, mark_a = load_folder_as_dataset(
         folder_a,
         finished_only=finished_only,
         registry_path=registry_a,
         only_unfingerprinted=only_unfingerprinted,
         collect_mark_list=True,
+        with_value=with_value,
+        cache=cache,
+        packed=packed,
     )
 
-    Xb = Yb = None
+    B = None
     mark_b: List[Tuple[str, str]] = []
 
     if folder_b and Path(folder_b).exists():
-        Xb, Yb, mark_b = load_folder_as_dataset(
+        *B, mark_b = load_folder_as_dataset(
             folder_b,
             finished_only=finished_only,
             registry_path=registry_b or registry_a,
             only_unfingerprinted=only_unfingerprinted,
             collect_mark_list=True,
+            with_value=with_value,
+            cache=cache,
+            packed=packed,
         )
 
-    if Xb is not None:
-        X = np.concatenate([Xa, Xb], axis=0)
-        Y = np.concatenate([Ya, Yb], axis=0)
+    if B is not None:
+        arrays = [np.concatenate([a, b], axis=0) for a, b in zip(A, B)]
         marks = mark_a + mark_b
     else:
-        X, Y, marks = Xa, Ya, mark_a
+        arrays, marks = A, mark_a
 
-    return X, Y, marks
+    return (*arrays, marks)
+
+
+def index_two_folders(
+    folder_a: str,
+    folder_b: Optional[str] = None,
+    finished_only: bool = False,
+    registry_a: Optional[str] = None,
+    registry_b: Optional[str] = None,
+    only_unfingerprinted: bool = True,
+    cache=None,
+):
+    """load_two_folders の index_folder 版。return: (entries, marks)"""
+    entries, marks = index_folder(folder_a, finished_only, registry_a, only_unfingerprinted, cache)
+    if folder_b and Path(folder_b).exists():
+        entries_b, marks_b = index_folder(folder_b, finished_only, registry_b or registry_a,
+                                          only_unfingerprinted, cache)
+        entries, marks = entries + entries_b, marks + marks_b
+    return entries, marks
 
 
 # ==============================
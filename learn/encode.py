@@ -39,3 +39,140 @@ def board_to_planes(board_2d, hands, side_to_move):
     planes[:, :, 42] = 1.0 if side_to_move == "sente" else 0.0
     return planes  # (9,9,43)
 
+
+# 手駒の正規化（駒種 1..7 = DROP_ORDER の順）
+_HAND_SCALE = np.array([1.0 / MAX_HAND[p] for p in DROP_ORDER], dtype=np.float32)
+
+def position_to_planes(board81, hands, turn, out=None):
+    """
+    整数の局面（engine/position.ArrayPosition と同じ形式）→ (9,9,43)。board_to_planes と同じ面の並び。
+    board81: python-shogi のマス順（0 = 9a）で 0=空 / +駒種=先手 / -駒種=後手（駒種 1..14 は PIECES の順 +1）
+    hands  : [先手, 後手]。それぞれ駒種 1..7 を添字とする枚数
+    turn   : 0=先手, 1=後手
+    out に (9,9,43) の float32 配列を渡すと、そこを埋めて返す（探索中の一括推論で使い回す用）
+    """
+    planes = np.zeros((9, 9, 28 + 14 + 1), dtype=np.float32) if out is None else out
+    if out is not None:
+        planes.fill(0.0)
+    flat = planes.reshape(81, -1)
+    for sq, p in enumerate(board81):
+        if p > 0:
+            flat[sq, p - 1] = 1.0
+        elif p < 0:
+            flat[sq, 14 - p - 1] = 1.0
+    planes[:, :, 28:35] = np.asarray(hands[0][1:8], dtype=np.float32) * _HAND_SCALE
+    planes[:, :, 35:42] = np.asarray(hands[1][1:8], dtype=np.float32) * _HAND_SCALE
+    planes[:, :, 42] = 1.0 if turn == 0 else 0.0
+    return planes
+
+
+def shogi_board_to_planes(board, out=None):
+    """
+    python-shogi の Board → (9,9,43)。board_to_planes と同じ面の並び。
+    駒は piece_bb（駒種ごとのビットボード）、持ち駒は pieces_in_hand、手番は board.turn から直接埋めるので、
+    漢字の盤面や captured のリストを経由しない（持ち駒は常に盤面と一致する）。
+    駒種 1..14 は python-shogi の PAWN..PROM_ROOK で、PIECES と同じ順。
+    out に (9,9,43) の float32 配列を渡すと、そこを埋めて返す
+    """
+    planes = np.zeros((9, 9, 28 + 14 + 1), dtype=np.float32) if out is None else out
+    if out is not None:
+        planes.fill(0.0)
+    flat = planes.reshape(81, -1)
+    for color, base in ((0, 0), (1, 14)):       # 0=先手(BLACK), 1=後手(WHITE)
+        occ = board.occupied[color]
+        for pt in range(1, 15):
+            bb = board.piece_bb[pt] & occ
+            while bb:
+                low = bb & -bb
+                flat[low.bit_length() - 1, base + pt - 1] = 1.0
+                bb ^= low
+    for color, base in ((0, 28), (1, 35)):
+        hand = board.pieces_in_hand[color]
+        planes[:, :, base:base + 7] = np.array([hand[pt] for pt in range(1, 8)], dtype=np.float32) * _HAND_SCALE
+    planes[:, :, 42] = 1.0 if board.turn == 0 else 0.0
+    return planes
+
+
+# ==============================
+# まとめてエンコード（学習データ用）
+# ==============================
+# 盤面コード（"P" / "p" / "+P" / "+p" …）→ 整数（0=空 / +駒種=先手 / -駒種=後手。駒種 1..14 は PIECES の順 +1）
+CODE2INT = {"": 0}
+for _i, _p in enumerate(PIECES):
+    CODE2INT[_p] = _i + 1
+    CODE2INT[_p.lower()] = -(_i + 1)
+
+_HAND_SCALE14 = np.concatenate([_HAND_SCALE, _HAND_SCALE])
+
+def board_2d_to_compact(board_2d, hands, side_to_move):
+    """
+    board_to_planes と同じ引数 → 整数の局面 (board int8[81], hands int8[14], turn)。
+    hands[14] は先手の DROP_ORDER 7種 → 後手の 7種、turn は 0=先手 / 1=後手
+    """
+    board = np.array([CODE2INT[c or ""] for row in board_2d for c in row], dtype=np.int8)
+    h = np.array([hands.get(side, {}).get(p, 0) for side in ("sente", "gote") for p in DROP_ORDER],
+                 dtype=np.int8)
+    return board, h, 0 if side_to_move == "sente" else 1
+
+def positions_to_planes(boards, hands, turns, out=None):
+    """
+    N 局面の整数表現 → (N,9,9,43)。1局面ずつの board_to_planes / position_to_planes と同じ面の並び。
+    boards: (N,81) 0=空 / +駒種=先手 / -駒種=後手
+    hands : (N,14)（board_2d_to_compact と同じ並び）または (N,2,8)（ArrayPosition.hands と同じ並び）
+    turns : (N,) 0=先手 / 1=後手
+    マスごとの Python ループは無く、駒は添字配列でまとめて立て、持ち駒・手番はブロードキャストで埋める。
+    out に (M,9,9,43) の float32 配列（M >= N）を渡すと、その先頭 N 個を埋めて返す
+    """
+    b = np.asarray(boards).reshape(-1, 81)
+    n = len(b)
+    if out is None:
+        planes = np.zeros((n, 9, 9, 28 + 14 + 1), dtype=np.float32)
+    else:
+        planes = out[:n]
+        planes.fill(0.0)
+    flat = planes.reshape(n, 81, 28 + 14 + 1)
+
+    # 駒 28面: 先手は駒種-1、後手は 14+駒種-1 のチャンネルに 1 を立てる
+    pos, sq = np.nonzero(b)
+    p = b[pos, sq].astype(np.int64)
+    flat[pos, sq, np.where(p > 0, p - 1, 13 - p)] = 1.0
+
+    # 手駒 14面・手番 1面（盤全体に同じ値）
+    h = np.asarray(hands)
+    if h.ndim == 3:
+        h = h[:, :, 1:8].reshape(n, 14)
+    planes[:, :, :, 28:42] = (h.astype(np.float32) * _HAND_SCALE14)[:, None, None, :]
+    planes[:, :, :, 42] = (np.asarray(turns).reshape(n) == 0)[:, None, None]
+    return planes
+
+
+# ==============================
+# 詰めた1局面（学習データの保存・受け渡し用）
+# ==============================
+# 1局面 = uint8[95]: 先頭 81 バイトが盤（int8 の駒。0=空 / +駒種=先手 / -駒種=後手）、
+# 残り 14 バイトが持ち駒（uint8。先手 7種 → 後手 7種）で、持ち駒の先頭バイトの最上位ビットが手番（1=後手）。
+# planes（float32 で 81*43*4 = 13,932 バイト）の約 1/147。planes に戻すのは samples_to_planes（入力パイプラインの中）
+SAMPLE_BYTES = 81 + 14
+_TURN_BIT = 0x80
+
+def pack_samples(boards, hands, turns) -> np.ndarray:
+    """整数の局面 (N,81) / (N,14) / (N,) → 詰めた局面 (N,95) uint8"""
+    b = np.asarray(boards, dtype=np.int8).reshape(-1, 81)
+    out = np.empty((len(b), SAMPLE_BYTES), dtype=np.uint8)
+    out[:, :81] = b.view(np.uint8)
+    out[:, 81:] = np.asarray(hands, dtype=np.uint8).reshape(-1, 14)
+    out[:, 81] |= (np.asarray(turns).reshape(-1) != 0).astype(np.uint8) * _TURN_BIT
+    return out
+
+def unpack_samples(samples):
+    """詰めた局面 (N,95) → (boards (N,81) int8, hands (N,14) uint8, turns (N,) uint8)"""
+    s = np.asarray(samples, dtype=np.uint8).reshape(-1, SAMPLE_BYTES)
+    boards = s[:, :81].view(np.int8)
+    hands = s[:, 81:].copy()
+    turns = hands[:, 0] >> 7
+    hands[:, 0] &= ~np.uint8(_TURN_BIT)
+    return boards, hands, turns
+
+def samples_to_planes(samples, out=None):
+    """詰めた局面 (N,95) → (N,9,9,43)"""
+    return positions_to_planes(*unpack_samples(samples), out=out)
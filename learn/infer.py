@@ -1,13 +1,20 @@
 # learn/infer.py
 from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
 from typing import Optional, Sequence
 
 import numpy as np
+import tensorflow as tf
 from tensorflow import keras
 
 # ★ ここを修正（utils ではなく、learn パッケージ内のモジュールから）
-from .encode import board_to_planes
+from .batcher import InferenceBatcher, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from .encode import board_to_planes, shogi_board_to_planes
 from .sfen_action import action_id_to_usi
 # pick_from_logits はこのファイル内で定義（下に実装）
 
@@ -18,6 +25,55 @@ CANDIDATES = [
     "models/shogi_model.h5",
 ]
 
+# 推論の経路
+#   "function" : 入力形状を固定して trace した tf.function（既定。predict のような毎回のパイプライン構築が無い）
+#   "tflite"   : 読み込んだモデルを TFLite に変換してインタプリタで実行（CPU の単発推論で最も軽い）
+#   "predict"  : 従来の Model.predict（比較用）
+INFER_BACKEND = "function"
+INFER_BACKENDS = ("function", "tflite", "predict")
+
+# TensorFlow のスレッド数（None = TF の既定）。1手ずつの小さな推論では少ないほうが速いことが多い
+INTRA_OP_THREADS = 2
+INTER_OP_THREADS = 1
+
+# 同時に来た1局面ずつの推論を learn/batcher.py でまとめて1回の forward にする
+INFER_BATCHING = True
+
+# 配信に使うモデルの種類（learn/quantize.py で書き出した TFLite）
+#   "float"   : 学習したモデルそのまま（既定）
+#   "dynamic" : 重みだけ int8（dynamic-range 量子化）
+#   "float16" : 重みを float16 で保存（ファイルは半分。CPU では読み込み時に float32 に戻る）
+#   "int8"    : 重みと活性を int8（棋譜の局面で範囲を校正した post-training 量子化）
+MODEL_VARIANTS = ("float", "dynamic", "float16", "int8")
+SERVE_VARIANT = "float"
+
+# PolicyAgent の既定のモデル名（model_path / CANDIDATES から探すもの）。register() で名前付きのモデルを足せる
+DEFAULT_MODEL = "default"
+
+_threads_configured = False
+
+def configure_threads(intra_op: int | None = INTRA_OP_THREADS, inter_op: int | None = INTER_OP_THREADS):
+    """
+    TF のスレッド数を設定する。TF が最初の演算を実行した後は変更できないので、
+    その場合は警告だけ出して既定のまま続ける（プロセスで最初の1回だけ有効）。
+    """
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    try:
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(int(intra_op))
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(int(inter_op))
+    except RuntimeError as e:
+        print(f"⚠️ TF のスレッド数を設定できません（初期化済み）: {e}")
+
+def quantized_path(path: str, variant: str) -> Path:
+    """models/shogi_policy.keras → models/shogi_policy.<variant>.tflite"""
+    p = Path(path)
+    return p.with_name(f"{p.stem}.{variant}.tflite")
+
 def _load_any_model(path: str):
     try:
         return keras.saving.load_model(path)
@@ -36,82 +92,615 @@ def pick_from_logits(logits: np.ndarray,
     temperature: 0 or neg なら argmax、>0 なら softmax サンプリング
     topk: 上位Kに制限したいときに指定（None ならすべての合法手から）
     return: (選んだ action_id, その選択確率)
+    合法手の logits だけを取り出して（gather）扱うので、行動全体ぶんの配列は作らない。
     """
-    legal = np.asarray(legal_action_ids, dtype=int)
+    legal = np.asarray(legal_action_ids, dtype=np.int64)
     if legal.size == 0:
         # 合法手が無い場合は全域からargmax（理論上ほぼ無いはず）
         aid = int(np.argmax(logits))
         return aid, 1.0
 
-    # 合法手以外は強制的に無効化
-    masked = np.full_like(logits, -1e9, dtype=np.float32)
-    masked[legal] = logits[legal]
+    # 合法手の logits だけを取り出す
+    sub = np.asarray(logits, dtype=np.float32)[legal]
 
     # top-k 制限（任意）
     if topk and topk > 0 and legal.size > topk:
-        legal_top = legal[np.argpartition(masked[legal], -topk)[-topk:]]
-    else:
-        legal_top = legal
+        keep = np.argpartition(sub, -topk)[-topk:]
+        legal, sub = legal[keep], sub[keep]
 
     # 温度 0 なら argmax
     if temperature is None or temperature <= 0:
-        sub = masked[legal_top]
-        idx = int(legal_top[np.argmax(sub)])
-        return idx, 1.0
+        return int(legal[np.argmax(sub)]), 1.0
 
     # softmax サンプリング
-    sub = masked[legal_top] / float(temperature)
+    sub = sub / float(temperature)
     sub = sub - np.max(sub)  # 数値安定化
     probs = np.exp(sub)
     probs_sum = probs.sum()
     if probs_sum <= 0 or not np.isfinite(probs_sum):
         # 全て -inf など（ありえないが保険）：argmaxで返す
-        idx = int(legal_top[np.argmax(sub)])
-        return idx, 1.0
+        return int(legal[np.argmax(sub)]), 1.0
     probs = probs / probs_sum
-    choice = int(np.random.choice(len(legal_top), p=probs))
-    aid = int(legal_top[choice])
+    choice = int(np.random.choice(len(legal), p=probs))
+    aid = int(legal[choice])
     return aid, float(probs[choice])
 
 
-class PolicyAgent:
-    def __init__(self, model_path: str | None = None, lazy: bool = True):
+def split_outputs(outs):
+    """
+    モデルの出力 → (policy logits (N,A), value (N,) または None)。
+    value head 付きのモデル（learn/model.build_model(value_head=True)）は {"policy", "value"} を返す。
+    TFLite のように名前が無い場合は最後の次元が 1 の出力を value とみなす。
+    """
+    if isinstance(outs, dict):
+        policy, value = outs["policy"], outs.get("value")
+    elif isinstance(outs, (list, tuple)):
+        policy = value = None
+        for o in outs:
+            if o.shape[-1] == 1:
+                value = o
+            else:
+                policy = o
+    else:
+        policy, value = outs, None
+    if value is not None:
+        value = np.asarray(value).reshape(-1)
+    return policy, value
+
+def make_forward(model, backend: str = INFER_BACKEND, num_threads: int | None = INTRA_OP_THREADS,
+                 with_value: bool = False):
+    """
+    model の推論関数 forward(x) -> logits(np.ndarray) を作る。x: (N,9,9,C) float32
+    with_value=True なら forward(x) -> (logits, value または None)。
+    tflite は変換に失敗したら function に落とす。
+    """
+    if backend not in INFER_BACKENDS:
+        print(f"⚠️ 未知の backend={backend} のため {INFER_BACKEND} を使います")
+        backend = INFER_BACKEND
+
+    raw = None
+    if backend == "predict":
+        raw = lambda x: model.predict(x, verbose=0)
+
+    if backend == "tflite":
+        try:
+            raw = _make_tflite_forward(model, num_threads)
+        except Exception as e:
+            print(f"⚠️ TFLite 変換に失敗したため function を使います: {e.__class__.__name__}: {e}")
+
+    if raw is None:
+        C = int(model.input_shape[-1])
+        fn = tf.function(lambda x: model(x, training=False),
+                         input_signature=[tf.TensorSpec([None, 9, 9, C], tf.float32)])
+        raw = lambda x: tf.nest.map_structure(lambda t: t.numpy(),
+                                              fn(tf.convert_to_tensor(x, dtype=tf.float32)))
+
+    if with_value:
+        return lambda x: split_outputs(raw(x))
+    return lambda x: split_outputs(raw(x))[0]
+
+def _make_tflite_forward(model, num_threads: int | None):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    interp = tf.lite.Interpreter(model_content=converter.convert(), num_threads=num_threads)
+    return _tflite_forward(interp)
+
+def load_tflite(path: str, num_threads: int | None = INTRA_OP_THREADS):
+    """書き出し済みの .tflite を読む。return: (raw forward, 入力形状 (9,9,C), 出力の数)"""
+    interp = tf.lite.Interpreter(model_path=str(path), num_threads=num_threads)
+    interp.allocate_tensors()
+    shape = tuple(int(d) for d in interp.get_input_details()[0]["shape"][1:])
+    return _tflite_forward(interp), shape, len(interp.get_output_details())
+
+def _tflite_forward(interp):
+    """interp の raw forward（入出力は float32。量子化モデルでも変換はインタプリタの中で行われる）"""
+    inp = interp.get_input_details()[0]
+    outs = interp.get_output_details()
+    state = {"batch": None}
+
+    def forward(x):
+        x = np.asarray(x, dtype=np.float32)
+        if state["batch"] != x.shape[0]:
+            interp.resize_tensor_input(inp["index"], x.shape)
+            interp.allocate_tensors()
+            state["batch"] = x.shape[0]
+        interp.set_tensor(inp["index"], x)
+        interp.invoke()
+        if len(outs) == 1:
+            return interp.get_tensor(outs[0]["index"]).copy()
+        return [interp.get_tensor(o["index"]).copy() for o in outs]
+    return forward
+
+
+def _model_version(path: str) -> str:
+    """モデルの版: ファイル名@更新時刻（同じファイルを学習で上書きしても区別できる）"""
+    stamp = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y%m%d-%H%M%S")
+    return f"{Path(path).name}@{stamp}"
+
+
+class ModelSlot:
+    """読み込み済みの1つの版（モデル・推論関数・batcher）。入れ替え後も使用中の要求はこのまま最後まで使える"""
+
+    def __init__(self, path: str, backend: str, num_threads: int | None,
+                 batching: bool, max_batch: int, max_wait_ms: float):
+        self.path = str(path)
+        self.version = _model_version(path)
+        t0 = time.perf_counter()
+        if self.path.endswith(".tflite"):
+            # learn/quantize.py で書き出した量子化モデル（keras のモデルは持たない）
+            self.model = None
+            raw, self.input_shape, n_outputs = load_tflite(path, num_threads)
+            self.has_value = n_outputs > 1
+            self.backend = "tflite"
+            self._forward = lambda x: split_outputs(raw(x))
+        else:
+            self.model = _load_any_model(path)
+            self.input_shape = tuple(self.model.input_shape[1:])
+            self.has_value = len(self.model.outputs) > 1
+            self.backend = backend
+            self._forward = make_forward(self.model, backend, num_threads, with_value=True)
+        self._lock = threading.Lock()   # forward はスレッド安全とは限らないので1本ずつ呼ぶ
+        # 1回流して trace / メモリ確保を済ませておく（最初の1手だけ遅くならないように）
+        self._forward(np.zeros((1,) + self.input_shape, dtype=np.float32))
+        self.load_ms = (time.perf_counter() - t0) * 1000.0
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+        self.batcher = InferenceBatcher(self.forward, max_batch, max_wait_ms) if batching else None
+
+    def forward(self, x):
+        """x: (N,9,9,C) → policy logits (N,A)"""
+        return self.forward_with_value(x)[0]
+
+    def forward_with_value(self, x):
+        """x: (N,9,9,C) → (policy logits (N,A), value (N,) または None)"""
+        with self._lock:
+            return self._forward(x)
+
+    def infer(self, x: np.ndarray) -> np.ndarray:
+        """x: (N,9,9,C) → logits (N,A)。1局面は batcher 経由"""
+        if self.batcher is not None and len(x) == 1:
+            try:
+                return self.batcher.infer(x[0])[np.newaxis, ...]
+            except RuntimeError:
+                pass   # 入れ替えで batcher が閉じられた直後。直接流す
+        return self.forward(x)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.close()
+
+    def info(self) -> dict:
+        return {"version": self.version, "path": self.path, "backend": self.backend,
+                "has_value": self.has_value, "loaded_at": self.loaded_at, "load_ms": self.load_ms}
+
+
+class ModelManager:
+    """
+    policy モデルの版の管理。active（使用中）と previous（直前の版。即座に戻せる）の2枠を持つ。
+      reload()   : 裏のスレッドで新しい版を読み込み・ウォームアップしてから active に差し替える
+      rollback() : active と previous を入れ替える
+    差し替えは参照の付け替えだけなので、推論中の要求は取得済みの slot で最後まで動く。
+    variant が "float" 以外なら、見つけたモデルの隣の量子化版（quantized_path）を読む。
+    """
+
+    def __init__(self, model_path: str | None = None, backend: str = INFER_BACKEND,
+                 intra_op_threads: int | None = INTRA_OP_THREADS,
+                 inter_op_threads: int | None = INTER_OP_THREADS,
+                 batching: bool = INFER_BATCHING,
+                 max_batch: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 variant: str = SERVE_VARIANT):
+        if variant not in MODEL_VARIANTS:
+            print(f"⚠️ 未知の variant={variant} のため float を使います")
+            variant = "float"
         self.model_path = model_path
-        self.model = None
+        self.variant = variant
+        self.backend = backend
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.batching = batching
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.active: ModelSlot | None = None
+        self.previous: ModelSlot | None = None
+        self._lock = threading.Lock()         # active / previous の付け替え
+        self._load_lock = threading.Lock()    # 読み込みは同時に1つだけ
+        self._reload_thread = None
+        self.last_error = None
+        # このモデルへの推論要求の集計（同じモデルを共有する名前すべての合計）
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
+
+    @property
+    def key(self) -> tuple:
+        """
+        同じモデルかどうかの判定用（実際に読むファイルと variant が同じなら読み込みを共有する）。
+        model_path=None（CANDIDATES から探す既定のモデル）と、同じファイルを明示した登録も同じキーになる
+        """
+        path = self.resolve_path(warn=False)
+        return (str(Path(path).resolve()) if path else None, self.variant)
+
+    def record(self, ms: float):
+        with self._stats_lock:
+            self.requests += 1
+            self.total_ms += ms
+            self.last_ms = ms
+
+    def stats(self) -> dict:
+        slot = self.active
+        return {
+            "model_version": slot.version if slot is not None else None,
+            "requests": self.requests,
+            "last_ms": self.last_ms,
+            "mean_ms": self.total_ms / self.requests if self.requests else 0.0,
+            "batching": slot.batcher.stats() if slot is not None and slot.batcher is not None else None,
+        }
+
+    def resolve_path(self, warn: bool = True):
+        path = None
+        if self.model_path and Path(self.model_path).exists():
+            path = self.model_path
+        else:
+            path = next((p for p in CANDIDATES if Path(p).exists()), None)
+        if path is None or self.variant == "float" or str(path).endswith(".tflite"):
+            return path
+        q = quantized_path(path, self.variant)
+        # 学習で元のモデルが更新された後の古い書き出しは使わない
+        if q.exists() and q.stat().st_mtime >= Path(path).stat().st_mtime:
+            return str(q)
+        if warn:
+            print(f"⚠️ {q} が無いか古いため float のモデルを使います（python -m learn.quantize で書き出せます）")
+        return path
+
+    def _load(self, path: str) -> ModelSlot:
+        configure_threads(self.intra_op_threads, self.inter_op_threads)
+        print(f"🧠 Loading policy model: {path} (backend={self.backend}, variant={self.variant})")
+        return ModelSlot(path, self.backend, self.intra_op_threads,
+                         self.batching, self.max_batch, self.max_wait_ms)
+
+    def ensure_loaded(self) -> ModelSlot | None:
+        """まだ何も読み込んでいなければ（同期で）読み込む。モデルが無ければ None"""
+        slot = self.active
+        if slot is not None:
+            return slot
+        with self._load_lock:
+            if self.active is None:
+                path = self.resolve_path()
+                if not path:
+                    return None
+                self._install(self._load(path))
+        return self.active
+
+    def _install(self, slot: ModelSlot):
+        with self._lock:
+            dropped = self.previous
+            self.previous, self.active = self.active, slot
+        if dropped is not None:
+            dropped.close()
+        print(f"🔁 policy model active: {slot.version}")
+
+    def reload(self, path: str | None = None, background: bool = True):
+        """
+        新しい版を読み込んで差し替える。path 省略時は model_path / CANDIDATES から探す。
+        同じファイル・同じ更新時刻なら何もしない。background=True なら裏のスレッドで行い、すぐ返る。
+        """
+        def run():
+            with self._load_lock:
+                try:
+                    p = path or self.resolve_path()
+                    if not p:
+                        raise FileNotFoundError(f"No policy model found. Tried: {CANDIDATES}")
+                    cur = self.active
+                    if cur is not None and cur.path == str(p) and cur.version == _model_version(p):
+                        print(f"🔁 policy model unchanged: {cur.version}")
+                        return
+                    self._install(self._load(p))
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = f"{e.__class__.__name__}: {e}"
+                    print(f"⚠️ policy model reload failed: {self.last_error}")
+
+        if not background:
+            run()
+            return None
+        th = threading.Thread(target=run, name="model-reload", daemon=True)
+        th.start()
+        self._reload_thread = th
+        return th
+
+    def rollback(self) -> bool:
+        """直前の版に戻す（もう一度呼ぶと元に戻る）。previous が無ければ False"""
+        with self._lock:
+            if self.previous is None:
+                return False
+            self.active, self.previous = self.previous, self.active
+            version = self.active.version
+        print(f"⏪ policy model rolled back to: {version}")
+        return True
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_thread is not None and self._reload_thread.is_alive()
+
+    def status(self) -> dict:
+        active, previous = self.active, self.previous
+        return {
+            "model_path": self.model_path,
+            "variant": self.variant,
+            "active": active.info() if active else None,
+            "previous": previous.info() if previous else None,
+            "reloading": self.reloading,
+            "last_error": self.last_error,
+        }
+
+
+class PolicyAgent:
+    """
+    policy モデルでの指し手選び。モデルは名前で持ち、同時に複数の版を読み込んでおける。
+      DEFAULT_MODEL ("default") : model_path / CANDIDATES から探すモデル
+      register(name, path)      : 名前付きのモデルを足す（A/B 比較や強さ別のモデル）
+    同じファイル・同じ variant を別の名前で登録しても重みは1つだけ読み込む（batcher も共有）。
+    model 引数を省くと default を使う。対局ごとに固定するときは view(name) を渡す。
+    """
+
+    def __init__(self, model_path: str | None = None, lazy: bool = True,
+                 backend: str = INFER_BACKEND,
+                 intra_op_threads: int | None = INTRA_OP_THREADS,
+                 inter_op_threads: int | None = INTER_OP_THREADS,
+                 batching: bool = INFER_BATCHING,
+                 max_batch: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS,
+                 cache=None, variant: str = SERVE_VARIANT):
+        """
+        cache: get(key) / put(key, value) を持つ LRU（engine/result_cache.ResultCache など）。
+               渡すと局面ごとの logits を (planes のハッシュ, モデルの版) をキーに使い回す。
+        variant: "float" / "dynamic" / "float16" / "int8"（MODEL_VARIANTS）。.tflite の model_path も直接読める
+        """
+        self._settings = (backend, intra_op_threads, inter_op_threads, batching, max_batch, max_wait_ms)
+        self.models = ModelManager(model_path, *self._settings, variant)
+        self.pool: dict[str, ModelManager] = {DEFAULT_MODEL: self.models}
+        self._pool_lock = threading.Lock()
+        self.cache = cache
         self.lazy = lazy
+        self.backend = backend
+        self._local = threading.local()   # スレッドごとの入力バッファ（select_move_board）
+        # 1手あたりの推論時間（ミリ秒）の集計（全モデルの合計。モデルごとは ModelManager.stats()）
+        self.calls = 0
+        self.total_ms = 0.0
+        self.last_ms = 0.0
         if not self.lazy:
             self._ensure_model()
 
-    def _resolve_model_path(self):
-        if self.model_path and Path(self.model_path).exists():
-            return self.model_path
-        for p in CANDIDATES:
-            if Path(p).exists():
-                return p
-        return None
-
-    def _ensure_model(self):
-        if self.model is not None:
-            return
-        path = self._resolve_model_path()
-        if not path:
-            if self.lazy:
-                return
+    # ---------- モデルの登録・選択 ----------
+    def register(self, name: str, path: str | None = None, variant: str | None = None) -> ModelManager:
+        """
+        name でモデルを使えるようにする（読み込みは最初に使うとき）。
+        同じ path・variant のモデルが既にあれば、その読み込みを共有する。
+        """
+        variant = variant or self.models.variant
+        with self._pool_lock:
+            mgr = ModelManager(path, *self._settings, variant)
+            for other in self.pool.values():
+                if other.key == mgr.key:
+                    mgr = other
+                    break
+            self.pool[name] = mgr
+        if not self.lazy:
+            self._ensure_model(name)
+        return mgr
+
+    def manager(self, model: str | None = None) -> ModelManager:
+        try:
+            return self.pool[model or DEFAULT_MODEL]
+        except KeyError:
+            raise KeyError(f"unknown policy model: {model} (registered: {sorted(self.pool)})") from None
+
+    def view(self, model: str | None = None) -> "ModelView":
+        """model に固定した PolicyAgent（ai.choose_ai_move の policy にそのまま渡せる）"""
+        self.manager(model)
+        return ModelView(self, model or DEFAULT_MODEL)
+
+    @property
+    def model(self):
+        slot = self.models.active
+        return slot.model if slot is not None else None
+
+    @property
+    def model_version(self):
+        return self.version_of(DEFAULT_MODEL)
+
+    def version_of(self, model: str | None = None):
+        slot = self.manager(model).active
+        return slot.version if slot is not None else None
+
+    def _ensure_model(self, model: str | None = None) -> ModelSlot:
+        slot = self.manager(model).ensure_loaded()
+        if slot is None:
             raise FileNotFoundError(f"No policy model found. Tried: {CANDIDATES}")
-        print(f"🧠 Loading policy model: {path}")
-        self.model = _load_any_model(path)
+        return slot
+
+    def reload(self, path: str | None = None, background: bool = True, model: str | None = None):
+        return self.manager(model).reload(path, background)
+
+    def rollback(self, model: str | None = None) -> bool:
+        return self.manager(model).rollback()
+
+    # ---------- 推論 ----------
+    def _timed(self, mgr: ModelManager, fn, x):
+        t0 = time.perf_counter()
+        out = fn(x)
+        ms = (time.perf_counter() - t0) * 1000.0
+        self.last_ms = ms
+        self.calls += 1
+        self.total_ms += ms
+        mgr.record(ms)
+        return out
+
+    def predict_logits(self, x: np.ndarray, slot: ModelSlot | None = None,
+                       model: str | None = None) -> np.ndarray:
+        """
+        x: (N,9,9,C) → logits (N,A)。推論時間（待ち時間込み）を集計する。
+        1局面（N=1）の要求は batcher で他の対局の要求とまとめて流す。
+        """
+        slot = slot or self._ensure_model(model)
+        return self._timed(self.manager(model), slot.infer, x)
+
+    def search_forward(self, with_value: bool = False, model: str | None = None):
+        """
+        探索（engine/hybrid.py・engine/mcts.py）用に、今の版に固定した推論関数を返す。return: (版, forward)
+        forward(x: (N,9,9,C)) -> logits (N,A)。1手を読む間に版が差し替わっても混ざらない。
+        with_value=True なら forward(x) -> (logits, value)（value head の無いモデルでは value は None）
+        """
+        slot = self._ensure_model(model)
+        if with_value:
+            mgr = self.manager(model)
+            return slot.version, (lambda x: self._timed(mgr, slot.forward_with_value, x))
+        return slot.version, (lambda x: self.predict_logits(x, slot, model))
+
+    def position_logits(self, x: np.ndarray, slot: ModelSlot | None = None,
+                        model: str | None = None) -> np.ndarray:
+        """x: (9,9,C) の1局面 → logits (A,)。cache があれば同じ局面・同じモデルの結果を使い回す"""
+        slot = slot or self._ensure_model(model)
+        if self.cache is None:
+            return self.predict_logits(x[np.newaxis, ...], slot, model)[0]
+        key = (hashlib.blake2b(np.ascontiguousarray(x).tobytes(), digest_size=16).digest(),
+               slot.version)
+        logits = self.cache.get(key)
+        if logits is None:
+            logits = np.array(self.predict_logits(x[np.newaxis, ...], slot, model)[0])
+            logits.setflags(write=False)
+            self.cache.put(key, logits)
+        return logits
+
+    # ---------- 状態 ----------
+    def status(self) -> dict:
+        """名前ごとのモデルの状態（同じモデルを共有する名前は shared_with に並べる）"""
+        out = {}
+        for name, mgr in list(self.pool.items()):
+            st = mgr.status()
+            st["shared_with"] = [n for n, m in self.pool.items() if m is mgr and n != name]
+            out[name] = st
+        return out
+
+    def latency_stats(self) -> dict:
+        slot = self.models.active
+        return {
+            "backend": slot.backend if slot is not None else self.backend,
+            "variant": self.models.variant,
+            "calls": self.calls,
+            "last_ms": self.last_ms,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "model_version": self.model_version,
+            "batching": slot.batcher.stats() if slot is not None and slot.batcher is not None else None,
+            "models": {name: mgr.stats() for name, mgr in list(self.pool.items())},
+            "cache": self.cache.stats() if self.cache is not None and hasattr(self.cache, "stats") else None,
+        }
 
     # ←★ここがあなたの「必要なら追加」部分
     def select_move(self, board_2d, hands, side_to_move, legal_action_ids,
-                    temperature=1.0, topk=None):
-        self._ensure_model()
-        if self.model is None:
-            raise FileNotFoundError(f"No policy model found. Tried: {CANDIDATES}")
-
+                    temperature=1.0, topk=None, info=None, model: str | None = None):
+        """info に dict を渡すと "model_version"（この手を選んだモデルの版）を入れて返す"""
+        # 1手の間は同じ版を使う（途中で差し替えがあっても混ざらない）
+        slot = self._ensure_model(model)
         x = board_to_planes(board_2d, hands, side_to_move)
-        x = x[np.newaxis, ...]
-        logits = self.model.predict(x, verbose=0)[0]
+        # キャッシュした logits にも毎回サンプリングをかけるので、手のばらつきは変わらない
+        logits = self.position_logits(x, slot, model)
         aid, prob = pick_from_logits(logits, legal_action_ids,
                                      temperature=temperature, topk=topk)
         usi = action_id_to_usi(aid)
+        if info is not None:
+            info["model_version"] = slot.version
         return usi, float(prob)
+
+    def select_move_board(self, board, legal_action_ids, temperature=1.0, topk=None, info=None,
+                          model: str | None = None):
+        """
+        select_move の python-shogi Board 版。盤面・持ち駒・手番を Board から直接 planes にする
+        （入力はスレッドごとに確保したバッファを使い回す）
+        """
+        slot = self._ensure_model(model)
+        buf = getattr(self._local, "planes", None)
+        if buf is None:
+            buf = self._local.planes = np.zeros((9, 9, 43), dtype=np.float32)
+        x = shogi_board_to_planes(board, out=buf)
+        logits = self.position_logits(x, slot, model)
+        aid, prob = pick_from_logits(logits, legal_action_ids,
+                                     temperature=temperature, topk=topk)
+        usi = action_id_to_usi(aid)
+        if info is not None:
+            info["model_version"] = slot.version
+        return usi, float(prob)
+
+
+class ModelView:
+    """PolicyAgent を1つのモデル名に固定したもの（対局の開始時に割り当て、その対局の間ずっと使う）"""
+
+    def __init__(self, agent: PolicyAgent, name: str):
+        self.agent = agent
+        self.name = name
+
+    @property
+    def model_version(self):
+        return self.agent.version_of(self.name)
+
+    @property
+    def last_ms(self):
+        return self.agent.manager(self.name).last_ms
+
+    def search_forward(self, with_value: bool = False):
+        return self.agent.search_forward(with_value, model=self.name)
+
+    def select_move(self, *args, **kwargs):
+        return self.agent.select_move(*args, model=self.name, **kwargs)
+
+    def select_move_board(self, *args, **kwargs):
+        return self.agent.select_move_board(*args, model=self.name, **kwargs)
+
+
+def bench_latency(model_path: str | None = None, n: int = 200, backends=INFER_BACKENDS,
+                  intra_op: int | None = INTRA_OP_THREADS, inter_op: int | None = INTER_OP_THREADS) -> dict:
+    """
+    経路ごとの1手あたりの推論時間（ミリ秒）を測る。入力は初期局面の planes。
+    return: {backend: {"mean_ms", "p50_ms", "p95_ms"}}
+    """
+    configure_threads(intra_op, inter_op)
+    agent = PolicyAgent(model_path, lazy=False, variant="float")
+    x = initial_planes()[np.newaxis, ...]
+
+    report = {}
+    for backend in backends:
+        forward = make_forward(agent.model, backend, intra_op)
+        report[backend] = time_forward(forward, x, n)
+        print(f"⏱ {backend:8s} mean={report[backend]['mean_ms']:.2f}ms "
+              f"p50={report[backend]['p50_ms']:.2f}ms p95={report[backend]['p95_ms']:.2f}ms")
+    return report
+
+def initial_planes() -> np.ndarray:
+    """初期局面の planes (9,9,C)（速度測定用の入力）"""
+    from .utils import initial_board_2d
+    return board_to_planes(initial_board_2d(), {"sente": {}, "gote": {}}, "sente")
+
+def time_forward(forward, x: np.ndarray, n: int = 200) -> dict:
+    """forward(x) を n 回呼んだ時間（ミリ秒）→ {"mean_ms", "p50_ms", "p95_ms"}"""
+    forward(x)  # ウォームアップ
+    ts = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        forward(x)
+        ts.append((time.perf_counter() - t0) * 1000.0)
+    ts.sort()
+    return {
+        "mean_ms": sum(ts) / len(ts),
+        "p50_ms": ts[len(ts) // 2],
+        "p95_ms": ts[min(len(ts) - 1, int(len(ts) * 0.95))],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Measure per-move policy inference latency.")
+    ap.add_argument("--model", default=None)
+    ap.add_argument("-n", type=int, default=200, help="測定回数")
+    ap.add_argument("--backends", nargs="*", default=list(INFER_BACKENDS))
+    ap.add_argument("--intra-op", type=int, default=INTRA_OP_THREADS)
+    ap.add_argument("--inter-op", type=int, default=INTER_OP_THREADS)
+    args = ap.parse_args()
+    bench_latency(args.model, args.n, args.backends, args.intra_op, args.inter_op)
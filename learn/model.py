@@ -1,7 +1,14 @@
 from tensorflow import keras
 from .constants import NUM_ACTIONS
 
-def build_model(ch=64, blocks=8, C=43):
+# value head の損失の重み（policy の損失に対して）
+VALUE_LOSS_WEIGHT = 0.5
+
+def build_model(ch=64, blocks=8, C=43, value_head=False):
+    """
+    value_head=False: 出力は policy の logits (A,) のみ（従来どおり）
+    value_head=True : 出力は {"policy": logits (A,), "value": 手番側から見た勝ちやすさ (1,) [-1, 1]}
+    """
     inp = keras.Input(shape=(9,9,C))
     x = keras.layers.Conv2D(ch, 3, padding="same", use_bias=False)(inp)
     x = keras.layers.BatchNormalization()(x); x = keras.layers.ReLU()(x)
@@ -19,13 +26,32 @@ def build_model(ch=64, blocks=8, C=43):
     p = keras.layers.Conv2D(2, 1, use_bias=False)(x)
     p = keras.layers.BatchNormalization()(p); p = keras.layers.ReLU()(p)
     p = keras.layers.Flatten()(p)
-    logits = keras.layers.Dense(NUM_ACTIONS)(p)
 
-    model = keras.Model(inp, logits)
+    if not value_head:
+        logits = keras.layers.Dense(NUM_ACTIONS)(p)
+
+        model = keras.Model(inp, logits)
+        model.compile(
+            optimizer=keras.optimizers.Adam(1e-3),
+            loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+            metrics=["accuracy"]
+        )
+        return model
+
+    logits = keras.layers.Dense(NUM_ACTIONS, name="policy")(p)
+
+    v = keras.layers.Conv2D(1, 1, use_bias=False)(x)
+    v = keras.layers.BatchNormalization()(v); v = keras.layers.ReLU()(v)
+    v = keras.layers.Flatten()(v)
+    v = keras.layers.Dense(64, activation="relu")(v)
+    value = keras.layers.Dense(1, activation="tanh", name="value")(v)
+
+    model = keras.Model(inp, {"policy": logits, "value": value})
     model.compile(
         optimizer=keras.optimizers.Adam(1e-3),
-        loss=keras.losses.SparseCategoricalCrossentropy(from_logits=True),
-        metrics=["accuracy"]
+        loss={"policy": keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+              "value": keras.losses.MeanSquaredError()},
+        loss_weights={"policy": 1.0, "value": VALUE_LOSS_WEIGHT},
+        metrics={"policy": ["accuracy"]}
     )
     return model
-
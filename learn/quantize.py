@@ -0,0 +1,170 @@
+# learn/quantize.py
+# CPU 配信用の軽量モデル（TFLite）の書き出しと、float のモデルとの比較レポート
+#
+#   python -m learn.quantize                                  # dynamic / float16 / int8 を書き出してレポート
+#   python -m learn.quantize --variants int8 --report-only    # 書き出し済みのものを比べるだけ
+#
+# 書き出し先は infer.quantized_path()（models/shogi_policy.keras → models/shogi_policy.int8.tflite）。
+# 配信側は PolicyAgent(variant="int8")（または infer.SERVE_VARIANT）でこのファイルを読む。
+# ネットワークの重みの大半は policy の Dense（162 → 13,689）なので、重みを int8 にするだけでも
+# ファイルとメモリは約 1/4 になる。指し手が変わらないかは棋譜の局面で top-1 / top-5 の一致率を見て確かめる。
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from .dataset import load_two_folders
+from .shards import ShardStore
+from .infer import (
+    CANDIDATES, MODEL_VARIANTS, INTRA_OP_THREADS,
+    _load_any_model, configure_threads, initial_planes, load_tflite, make_forward,
+    quantized_path, split_outputs, time_forward,
+)
+
+QUANT_VARIANTS = tuple(v for v in MODEL_VARIANTS if v != "float")
+CALIBRATION_SAMPLES = 256     # int8 の範囲校正に使う局面数
+REPORT_SAMPLES = 2000         # 一致率を測る局面数（棋譜から無作為に選ぶ）
+REPORT_LATENCY_RUNS = 200     # 1手あたりの推論時間の測定回数
+REPORT_PATH = "models/quantize_report.json"
+
+
+def _find_model(model_path: str | None) -> str:
+    if model_path:
+        return model_path
+    for p in CANDIDATES:
+        if Path(p).exists():
+            return p
+    raise FileNotFoundError(f"No policy model found. Tried: {CANDIDATES}")
+
+
+def load_positions(folder: str = "kifu/pvp", extra_folder: str | None = "kifu/pvp_flip",
+                   n: int | None = None, seed: int = 0):
+    """棋譜の局面 (X, y)。n を指定すると無作為に n 局面だけ選ぶ"""
+    X, y, _marks = load_two_folders(folder, extra_folder, only_unfingerprinted=False, cache=ShardStore())
+    if n is not None and len(X) > n:
+        idx = np.random.default_rng(seed).choice(len(X), size=n, replace=False)
+        X, y = X[idx], y[idx]
+    return X.astype(np.float32), y
+
+
+def export_quantized(model_path: str | None = None, variant: str = "dynamic",
+                     calibration: np.ndarray | None = None, out: str | None = None) -> Path:
+    """
+    float のモデルを variant（"dynamic" / "float16" / "int8"）の TFLite に書き出す。
+    int8 は calibration（(N,9,9,C) の局面。省略時は棋譜から CALIBRATION_SAMPLES 局面）で活性の範囲を決める。
+    入出力は float32 のまま（呼び出し側は float のモデルと同じように使える）。
+    """
+    if variant not in QUANT_VARIANTS:
+        raise ValueError(f"unknown variant: {variant} (choose from {QUANT_VARIANTS})")
+    model_path = _find_model(model_path)
+    model = _load_any_model(model_path)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif variant == "int8":
+        if calibration is None:
+            calibration, _ = load_positions(n=CALIBRATION_SAMPLES)
+
+        def representative():
+            for i in range(len(calibration)):
+                yield [calibration[i:i + 1]]
+        converter.representative_dataset = representative
+
+    out_path = Path(out) if out else quantized_path(model_path, variant)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_bytes(converter.convert())
+    print(f"🗜 export [{variant}]: {out_path} ({out_path.stat().st_size / 1e6:.2f} MB)")
+    return out_path
+
+
+def _batched(forward, X: np.ndarray, batch: int = 256) -> np.ndarray:
+    return np.concatenate([np.asarray(forward(X[i:i + batch])) for i in range(0, len(X), batch)])
+
+
+def _topk(logits: np.ndarray, k: int) -> np.ndarray:
+    return np.argpartition(logits, -k, axis=1)[:, -k:]
+
+
+def compare_variants(model_path: str | None = None, variants=QUANT_VARIANTS,
+                     X: np.ndarray | None = None, y: np.ndarray | None = None,
+                     latency_runs: int = REPORT_LATENCY_RUNS,
+                     num_threads: int | None = INTRA_OP_THREADS) -> dict:
+    """
+    float のモデルと各 variant の書き出しを同じ局面で比べる。
+      top1_agree : float の最善手と variant の最善手が同じ割合
+      top5_agree : float の最善手が variant の上位5手に入る割合
+      move_top1 / move_top5 : 棋譜で実際に指された手の的中率（float の行は基準）
+      mean_ms / p50_ms / p95_ms : 1局面ずつ推論したときの時間、size_mb : ファイルの大きさ
+    """
+    model_path = _find_model(model_path)
+    if X is None:
+        X, y = load_positions(n=REPORT_SAMPLES)
+    x1 = initial_planes()[np.newaxis, ...]
+
+    model = _load_any_model(model_path)
+    float_forward = make_forward(model, "function", num_threads)
+    ref = _batched(float_forward, X)
+    ref_best = ref.argmax(axis=1)
+
+    def row(logits, forward, path):
+        top5 = _topk(logits, 5)
+        r = {
+            "top1_agree": float(np.mean(logits.argmax(axis=1) == ref_best)),
+            "top5_agree": float(np.mean((top5 == ref_best[:, None]).any(axis=1))),
+            "size_mb": Path(path).stat().st_size / 1e6,
+        }
+        if y is not None:
+            r["move_top1"] = float(np.mean(logits.argmax(axis=1) == y))
+            r["move_top5"] = float(np.mean((top5 == y[:, None]).any(axis=1)))
+        r.update(time_forward(forward, x1, latency_runs))
+        return r
+
+    report = {"model": str(model_path), "positions": int(len(X)),
+              "variants": {"float": row(ref, float_forward, model_path)}}
+    for variant in variants:
+        path = quantized_path(model_path, variant)
+        if not path.exists():
+            print(f"⚠️ {path} がありません（skip）")
+            continue
+        raw, _shape, _n = load_tflite(path, num_threads)
+        forward = lambda x, raw=raw: split_outputs(raw(x))[0]
+        report["variants"][variant] = row(_batched(forward, X), forward, path)
+
+    print(f"📊 {report['model']} / {report['positions']} positions")
+    print(f"{'variant':8s} {'top1_agree':>10s} {'top5_agree':>10s} {'move_top1':>9s} {'move_top5':>9s} "
+          f"{'mean_ms':>8s} {'p95_ms':>8s} {'size_mb':>8s}")
+    for name, r in report["variants"].items():
+        print(f"{name:8s} {r['top1_agree']:10.3f} {r['top5_agree']:10.3f} "
+              f"{r.get('move_top1', float('nan')):9.3f} {r.get('move_top5', float('nan')):9.3f} "
+              f"{r['mean_ms']:8.2f} {r['p95_ms']:8.2f} {r['size_mb']:8.2f}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Export quantized TFLite policy models and compare them with the float model.")
+    ap.add_argument("--model", default=None)
+    ap.add_argument("--variants", nargs="*", default=list(QUANT_VARIANTS), choices=list(QUANT_VARIANTS))
+    ap.add_argument("--folder", default="kifu/pvp")
+    ap.add_argument("--extra-folder", default="kifu/pvp_flip")
+    ap.add_argument("--samples", type=int, default=REPORT_SAMPLES, help="一致率を測る局面数")
+    ap.add_argument("--calibration", type=int, default=CALIBRATION_SAMPLES, help="int8 の校正に使う局面数")
+    ap.add_argument("-n", type=int, default=REPORT_LATENCY_RUNS, help="推論時間の測定回数")
+    ap.add_argument("--report-only", action="store_true", default=False, help="書き出さずに比べるだけ")
+    ap.add_argument("--report", default=REPORT_PATH, help="レポート(JSON)の保存先")
+    args = ap.parse_args()
+
+    configure_threads()
+    X, y = load_positions(args.folder, args.extra_folder, n=max(args.samples, args.calibration))
+    if not args.report_only:
+        for v in args.variants:
+            export_quantized(args.model, v, calibration=X[:args.calibration])
+    report = compare_variants(args.model, args.variants, X[:args.samples], y[:args.samples], args.n)
+    Path(args.report).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.report).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"✅ report: {args.report}")
@@ -1,4 +1,6 @@
 # learn/sfen_action.py
+import numpy as np
+
 from .constants import FILE_LET, DROP_ORDER, DROP2IDX, BASE_MOVE
 
 def sfen_to_index(s: str) -> int:
@@ -34,3 +36,29 @@ def action_id_to_usi(aid: int) -> str:
     pc = DROP_ORDER[pidx]
     return f"{pc}*{index_to_sfen(t)}"
 
+
+# ==== python-shogi の Move → action_id（USI 文字列を経由しない表引き） ====
+# python-shogi のマス番号は 段 * 9 + (9 - 筋)（0 = 9a, 80 = 1i）、
+# action のマス番号は 段 * 9 + (筋 - 1)（sfen_to_index と同じ）なので、段の中で左右が逆になる。
+SQUARE_TO_INDEX = np.array([(sq // 9) * 9 + (8 - sq % 9) for sq in range(81)], dtype=np.int64)
+
+# BOARD_ACTIONS[from_square, to_square, promotion]（python-shogi のマス番号）
+BOARD_ACTIONS = ((SQUARE_TO_INDEX[:, None] * 81 + SQUARE_TO_INDEX[None, :]) * 2)[:, :, None] + np.arange(2)
+
+# DROP_ACTIONS[drop_piece_type, to_square]。python-shogi の PAWN=1 .. ROOK=7 は DROP_ORDER と同じ順
+DROP_ACTIONS = np.zeros((len(DROP_ORDER) + 1, 81), dtype=np.int64)
+DROP_ACTIONS[1:] = BASE_MOVE + np.arange(len(DROP_ORDER))[:, None] * 81 + SQUARE_TO_INDEX[None, :]
+
+# 1手ずつ引くときは numpy のスカラー参照より list のほうが速い
+_BOARD_FLAT = BOARD_ACTIONS.ravel().tolist()
+_DROP_FLAT = DROP_ACTIONS.ravel().tolist()
+
+def move_to_action_id(move) -> int:
+    """python-shogi の Move（from_square / to_square / promotion / drop_piece_type）→ action_id"""
+    if move.drop_piece_type:
+        return _DROP_FLAT[move.drop_piece_type * 81 + move.to_square]
+    return _BOARD_FLAT[(move.from_square * 81 + move.to_square) * 2 + (1 if move.promotion else 0)]
+
+def moves_to_action_ids(moves) -> np.ndarray:
+    """合法手の列（board.legal_moves など）→ action_id の配列"""
+    return np.fromiter((move_to_action_id(m) for m in moves), dtype=np.int64)
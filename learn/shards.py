@@ -0,0 +1,218 @@
+# learn/shards.py
+# 学習データのキャッシュ: 1局ぶんの局面・教師を一度だけエンコードしてディスクに書き、次からは np.memmap で読む
+#
+#   store = ShardStore()                       # kifu/cache/shards-v2/
+#   store.put_game(fp, kifu_json)              # 未登録ならエンコードして追記（/save_kifu2 の後に裏で呼ぶ）
+#   boards, hands, turns, y, v = store.load([fp, ...])
+#   X = positions_to_planes(boards, hands, turns)
+#
+# キーは dataset.make_fingerprint（棋譜の内容から作る指紋）。局面は planes（1局面 13,932 バイト）ではなく
+# encode.pack_samples で詰めた 95 バイト（盤 int8[81] + 持ち駒 uint8[14]、手番は持ち駒の先頭バイトの最上位ビット）で持ち、
+# 教師と合わせて 1局面 103 バイト。planes に戻すのは読む側（samples_to_planes / positions_to_planes）。
+#
+# ファイル構成（書き込むプロセスごとに別のシャード。複数プロセスが同時に書いてもぶつからない）
+#   shard-<日時>-<pid>.bin   : RECORD_DTYPE のレコードを追記したもの
+#   shard-<日時>-<pid>.json  : {指紋: [先頭のレコード番号, 局面数]}（レコードを書いてから置き換える）
+# エンコードの中身を変えたら SHARD_FORMAT を上げる（古いキャッシュは別ディレクトリなので使われない。
+# 残った shards-v<古い番号>/ は prune_old_formats() で消す。kifu/cache/ ごと消しても作り直されるだけ）。
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from .encode import SAMPLE_BYTES, pack_samples, unpack_samples
+
+SHARD_FORMAT = 2
+SHARD_ROOT = "kifu/cache"
+SHARD_MAX_RECORDS = 1 << 20       # 1シャードあたりの最大局面数（約 100MB）で次のファイルへ
+
+RECORD_DTYPE = np.dtype([
+    ("sample", np.uint8, SAMPLE_BYTES),
+    ("y", np.int32),
+    ("v", np.float32),
+])
+
+
+class ShardStore:
+    """指紋 → 1局ぶんのレコード（詰めた局面 sample, y, v）。スレッド安全（書き込みは1本ずつ）"""
+
+    def __init__(self, root: str = SHARD_ROOT):
+        self.dir = Path(root) / f"shards-v{SHARD_FORMAT}"
+        self._lock = threading.Lock()
+        self._writer = None          # (bin のパス, json のパス, {指紋: [start, count]}, 書いた局面数)
+        self._index = None           # 指紋 → (bin のパス, start, count)
+        self._index_mtimes = {}
+        self._maps = {}              # bin のパス → (np.memmap, 読んだときのサイズ)
+
+    # ---------- 索引 ----------
+    def index(self) -> dict:
+        """全シャードの索引（変わった sidecar だけ読み直す）"""
+        with self._lock:
+            return dict(self._refresh_index())
+
+    def _refresh_index(self) -> dict:
+        if self._index is None:
+            self._index = {}
+        if not self.dir.exists():
+            return self._index
+        for js in sorted(self.dir.glob("shard-*.json")):
+            mtime = js.stat().st_mtime
+            if self._index_mtimes.get(js) == mtime:
+                continue
+            try:
+                entries = json.loads(js.read_text(encoding="utf-8"))
+            except Exception:
+                continue   # 置き換え途中など。次回読む
+            self._index_mtimes[js] = mtime
+            bin_path = js.with_suffix(".bin")
+            for fp, (start, count) in entries.items():
+                self._index[fp] = (bin_path, int(start), int(count))
+        return self._index
+
+    def has(self, fp: str) -> bool:
+        with self._lock:
+            return fp in self._refresh_index()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._refresh_index())
+
+    # ---------- 書き込み ----------
+    def _open_writer(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        stem = f"shard-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}"
+        self._writer = [self.dir / f"{stem}.bin", self.dir / f"{stem}.json", {}, 0]
+
+    def put(self, fp: str, boards, hands, turns, y, v) -> bool:
+        """1局ぶんを追記する。既にあれば何もしない（False）"""
+        n = len(y)
+        rec = np.zeros(n, dtype=RECORD_DTYPE)
+        rec["sample"], rec["y"], rec["v"] = pack_samples(boards, hands, turns), y, v
+        with self._lock:
+            index = self._refresh_index()
+            if fp in index:
+                return False
+            if self._writer is None or self._writer[3] + n > SHARD_MAX_RECORDS:
+                self._open_writer()
+            bin_path, js_path, entries, start = self._writer
+            with open(bin_path, "ab") as f:
+                f.write(rec.tobytes())
+            entries[fp] = [start, n]
+            self._writer[3] = start + n
+            # レコードを書き終えてから索引を置き換える（読む側は索引にある範囲しか読まない）
+            tmp = js_path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(entries), encoding="utf-8")
+            os.replace(tmp, js_path)
+            self._index_mtimes[js_path] = js_path.stat().st_mtime
+            index[fp] = (bin_path, start, n)
+        return True
+
+    def put_game(self, fp: str, kifu_json: dict) -> bool:
+        """棋譜をエンコードして追記する。既にある・局面が無いなら False"""
+        from .dataset import replay_game
+        if self.has(fp):
+            return False
+        boards, hands, turns, y, v = replay_game(kifu_json)
+        if len(y) == 0:
+            return False
+        return self.put(fp, boards, hands, turns, y, v)
+
+    # ---------- 読み込み ----------
+    def _records(self, bin_path: Path) -> np.memmap:
+        size = bin_path.stat().st_size
+        cached = self._maps.get(bin_path)
+        if cached is None or cached[1] != size:
+            # 追記されていたら map し直す。別のプロセスが書いている途中だと末尾のレコードが欠けているので、
+            # 揃っているレコードの数だけ map する（索引にあるのは書き終えたレコードだけ）
+            n = size // RECORD_DTYPE.itemsize
+            cached = (np.memmap(bin_path, dtype=RECORD_DTYPE, mode="r", shape=(n,)), size)
+            self._maps[bin_path] = cached
+        return cached[0]
+
+    def get(self, fp: str):
+        """1局ぶんのレコード（memmap の一部。読み取り専用）。無ければ None"""
+        with self._lock:
+            loc = self._refresh_index().get(fp)
+            if loc is None:
+                return None
+            bin_path, start, count = loc
+            return self._records(bin_path)[start:start + count]
+
+    def load(self, fps) -> tuple:
+        """指紋の順に1局ずつ並べた (boards (N,81), hands (N,14), turns (N,), y (N,), v (N,))"""
+        parts = []
+        for fp in fps:
+            rec = self.get(fp)
+            if rec is None:
+                raise KeyError(f"not in dataset cache: {fp}")
+            parts.append(rec)
+        rec = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD_DTYPE)
+        return (*unpack_samples(rec["sample"]), rec["y"], rec["v"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            index = self._refresh_index()
+            shards = sorted(self.dir.glob("shard-*.bin")) if self.dir.exists() else []
+            return {
+                "dir": str(self.dir),
+                "games": len(index),
+                "positions": sum(c for _, _, c in index.values()),
+                "shards": len(shards),
+                "bytes": sum(p.stat().st_size for p in shards),
+            }
+
+
+def prune_old_formats(root: str = SHARD_ROOT) -> list:
+    """root の下の、今の SHARD_FORMAT ではない shards-v*/ を消す。return: 消したディレクトリ"""
+    current = f"shards-v{SHARD_FORMAT}"
+    removed = []
+    root_p = Path(root)
+    if not root_p.exists():
+        return removed
+    for d in sorted(root_p.glob("shards-v*")):
+        if d.is_dir() and d.name != current:
+            shutil.rmtree(d, ignore_errors=True)
+            removed.append(str(d))
+    return removed
+
+
+def encode_missing(folders=("kifu/pvp", "kifu/pvp_flip"), store: ShardStore | None = None,
+                   paths=None) -> int:
+    """
+    folders（または paths で渡した棋譜）のうち、まだキャッシュに無い棋譜をエンコードして追記する。
+    指紋は学習時と同じ（棋譜の "fingerprint" があればそれ、無ければ make_fingerprint）。return: 追記した局数
+    """
+    from .dataset import _load_json, make_fingerprint
+    store = store or ShardStore()
+    if paths is None:
+        paths = [p for folder in folders if Path(folder).exists() for p in sorted(Path(folder).glob("*.json"))]
+    added = 0
+    for p in paths:
+        data = _load_json(Path(p))
+        if not isinstance(data, dict):
+            continue
+        fp = data.get("fingerprint")
+        if not isinstance(fp, str) or len(fp) < 32:
+            fp = make_fingerprint(data)
+        if store.put_game(fp, data):
+            added += 1
+    return added
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Encode kifu into the memory-mapped dataset cache.")
+    ap.add_argument("folders", nargs="*", default=["kifu/pvp", "kifu/pvp_flip"])
+    ap.add_argument("--root", default=SHARD_ROOT)
+    args = ap.parse_args()
+    for d in prune_old_formats(args.root):
+        print(f"🧹 removed old dataset cache: {d}")
+    store = ShardStore(args.root)
+    added = encode_missing(args.folders, store)
+    print(f"🗃️ dataset cache: +{added} games {store.stats()}")
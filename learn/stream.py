@@ -0,0 +1,154 @@
+# learn/stream.py
+# ストリーミング学習の入力パイプライン: 全局面の X を作らず、棋譜から少しずつ読んでバッチにする
+#
+#   entries, marks = index_two_folders(..., cache=store)
+#   train_ds, val_ds, steps, val_steps = make_datasets(entries, store, batch_size=64)
+#   model.fit(train_ds, epochs=5, steps_per_epoch=steps, validation_data=val_ds, validation_steps=val_steps)
+#
+# 流れ（tf.data）:
+#   1局ずつの詰めた局面（encode.pack_samples の 95 バイト。learn/shards.py の memmap、
+#   cache が無ければ棋譜 JSON をその場で再生）
+#   → 局面ごとにばらす → シャッフル（SHUFFLE_BUFFER 局面ぶんだけ保持）→ バッチ
+#   → samples_to_planes で planes に展開（並列）→ 先読み
+# planes になるのはバッチにした後だけなので、シャッフル用のバッファも詰めた局面のまま持つ。
+# 全局面をメモリに載せる学習（train.py --packed）も make_memory_datasets で同じ展開を通す。
+# 手元に持つのは「使う棋譜の一覧」とシャッフル用のバッファだけなので、棋譜が増えてもメモリは増えない。
+# 検証用は指紋で棋譜ごとに分ける（validation_split のように配列をコピーしない・同じ対局の局面が両方に入らない）。
+from __future__ import annotations
+
+import math
+from pathlib import Path
+
+import numpy as np
+import tensorflow as tf
+
+from .constants import NUM_PLANES
+from .dataset import _load_json, replay_game
+from .encode import SAMPLE_BYTES, pack_samples, samples_to_planes
+
+SHUFFLE_BUFFER = 50_000     # シャッフル用に保持する局面数（詰めた局面なので 1局面 ≒ 100 バイト）
+PREFETCH_BATCHES = 4        # 学習と並行して用意しておくバッチ数
+VAL_FRACTION = 0.1          # 検証に回す棋譜の割合（指紋で決めるので毎回同じ棋譜になる）
+
+
+def split_entries(entries, val_fraction: float = VAL_FRACTION):
+    """index_folder の entries を指紋で学習用・検証用に分ける"""
+    cut = int(val_fraction * 1000)
+    train, val = [], []
+    for e in entries:
+        (val if int(e[1][:8], 16) % 1000 < cut else train).append(e)
+    # どちらかが空にならないように（1局しかなければ学習用に回し、検証用は無し）
+    if not val and len(train) > 1:
+        val.append(train.pop())
+    if not train and val:
+        train.append(val.pop())
+    return train, val
+
+
+def _game_records(entries, cache, shuffle: bool, seed: int):
+    """
+    1局ずつ (samples, y, v) を返すジェネレータ。
+    shuffle なら棋譜の順を変えながら終わりなく繰り返し、そうでなければ1周で終わる。
+    1周して1局面も出せなければ（棋譜が無い・全部0局面）繰り返さずに終わる
+    """
+    def gen():
+        rng = np.random.default_rng(seed)
+        while True:
+            order = rng.permutation(len(entries)) if shuffle else range(len(entries))
+            produced = False
+            for i in order:
+                path, fp, _n = entries[i]
+                rec = cache.get(fp) if cache is not None else None
+                if rec is not None:
+                    produced = True
+                    yield rec["sample"], rec["y"], rec["v"]
+                    continue
+                data = _load_json(Path(path))
+                if isinstance(data, dict):
+                    boards, hands, turns, y, v = replay_game(data)
+                    if len(y):
+                        produced = True
+                        yield pack_samples(boards, hands, turns), y, v
+            if not shuffle or not produced:
+                return
+    return gen
+
+
+def _expand(samples):
+    x = tf.numpy_function(lambda s: samples_to_planes(s), [samples], tf.float32)
+    x.set_shape([None, 9, 9, NUM_PLANES])
+    return x
+
+
+def _to_example(with_value: bool):
+    def to_example(s, y, v):
+        x = _expand(s)
+        return (x, {"policy": y, "value": v}) if with_value else (x, y)
+    return to_example
+
+
+def make_dataset(entries, cache=None, batch_size: int = 64, shuffle: bool = True,
+                 with_value: bool = False, seed: int = 0,
+                 shuffle_buffer: int = SHUFFLE_BUFFER, prefetch: int = PREFETCH_BATCHES):
+    """
+    entries（index_folder の [(path, fp, 局面数)]）から (x, y) のバッチ列を作る。
+    shuffle=True（学習用）は終わりなく続き、False（検証用）は全局面を1周して終わる。
+    with_value=True なら y は {"policy": y, "value": v}
+    """
+    signature = (
+        tf.TensorSpec([None, SAMPLE_BYTES], tf.uint8),
+        tf.TensorSpec([None], tf.int32),
+        tf.TensorSpec([None], tf.float32),
+    )
+    ds = tf.data.Dataset.from_generator(_game_records(entries, cache, shuffle, seed), output_signature=signature)
+    ds = ds.unbatch()
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size, drop_remainder=shuffle)
+    ds = ds.map(_to_example(with_value), num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    return ds.prefetch(prefetch)
+
+
+def make_datasets(entries, cache=None, batch_size: int = 64, with_value: bool = False,
+                  val_fraction: float = VAL_FRACTION, seed: int = 0):
+    """
+    学習用・検証用のデータセットと1エポックあたりのステップ数。
+    return: (train_ds, val_ds, steps_per_epoch, validation_steps)。検証用の棋譜が無ければ val_ds は None
+    """
+    train, val = split_entries(entries, val_fraction)
+    n_train = sum(n for _, _, n in train)
+    n_val = sum(n for _, _, n in val)
+    if n_train == 0:
+        raise RuntimeError("学習に使える局面がありません（stream）")
+    print(f"🌊 stream: train={len(train)} games / {n_train} positions, val={len(val)} games / {n_val} positions")
+    train_ds = make_dataset(train, cache, batch_size, True, with_value, seed)
+    steps = max(1, n_train // batch_size)
+    if not val:
+        return train_ds, None, steps, None
+    val_ds = make_dataset(val, cache, batch_size, False, with_value, seed)
+    return train_ds, val_ds, steps, math.ceil(n_val / batch_size)
+
+
+def make_memory_datasets(S, y, v=None, batch_size: int = 64, with_value: bool = False,
+                         val_fraction: float = VAL_FRACTION, seed: int = 0,
+                         prefetch: int = PREFETCH_BATCHES):
+    """
+    詰めた局面 S (N,95)（load_two_folders(packed=True)）をメモリに持ったまま学習するためのデータセット。
+    validation_split と同じく末尾の val_fraction を検証用にし、planes への展開はバッチごとに行う。
+    return: (train_ds, val_ds)。検証用が 0 局面なら val_ds は None
+    """
+    n_val = int(len(S) * val_fraction)
+    n_train = len(S) - n_val
+    v = np.zeros(len(S), np.float32) if v is None else v
+    print(f"🧮 packed: {len(S)} positions, {S.nbytes / 1e6:.1f} MB "
+          f"(planes {len(S) * 81 * NUM_PLANES * 4 / 1e6:.1f} MB), val={n_val}")
+
+    def build(lo, hi, shuffle):
+        ds = tf.data.Dataset.from_tensor_slices((S[lo:hi], y[lo:hi], v[lo:hi]))
+        if shuffle:
+            ds = ds.shuffle(hi - lo, seed=seed, reshuffle_each_iteration=True)
+        ds = ds.batch(batch_size)
+        ds = ds.map(_to_example(with_value), num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+        return ds.prefetch(prefetch)
+
+    return build(0, n_train, True), (build(n_train, len(S), False) if n_val else None)
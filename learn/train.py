@@ -5,13 +5,16 @@ import json
 import numpy as np
 from tensorflow import keras
 
+from .constants import NUM_PLANES
 from .dataset import (
+    index_two_folders,
     load_two_folders,
     mark_fingerprints,
     wipe_fingerprints,
 )
 
-from .model import build_model
+from .model import build_model, VALUE_LOSS_WEIGHT
+from .shards import ShardStore, SHARD_ROOT
 
 # ---------- registry I/O ----------
 def _load_registry_set(path: str | None) -> set[str]:
@@ -55,6 +58,16 @@ def main():
     ap.add_argument("--ch", type=int, default=64)
     ap.add_argument("--blocks", type=int, default=8)
     ap.add_argument("--verbose", type=int, default=1)
+    ap.add_argument("--value-head", action="store_true", default=False,
+                    help="勝敗（winner/result）から value head も学習する（MCTS 用）")
+    ap.add_argument("--dataset-cache", default=SHARD_ROOT,
+                    help="エンコード済み棋譜のキャッシュ（learn/shards.py）の置き場所")
+    ap.add_argument("--no-dataset-cache", action="store_true", default=False,
+                    help="キャッシュを使わず毎回すべての棋譜をエンコードする")
+    ap.add_argument("--stream", action="store_true", default=False,
+                    help="全局面の X をメモリに作らず、棋譜から少しずつ読んで学習する（learn/stream.py）")
+    ap.add_argument("--packed", action="store_true", default=False,
+                    help="全局面を詰めた局面（1局面 95 バイト）でメモリに持ち、planes にはバッチごとに展開する")
     ap.add_argument("--write-fingerprints", action="store_true", default=True,
                     help="学習成功後に棋譜JSONへfingerprintを書き戻す")
     ap.add_argument("--full-retrain", action="store_true", default=False,
@@ -70,55 +83,125 @@ def main():
         wipe_fingerprints([args.folder] + ([args.extra_folder] if args.extra_folder else []))
 
     print(f"📦 load: {args.folder} (+ {args.extra_folder})")
-    X, y, marks = load_two_folders(
-        folder_a=args.folder,
-        folder_b=args.extra_folder,
-        finished_only=args.finished_only,
-        registry_a=args.registry,
-        registry_b=args.extra_registry,
-        #collect_mark_list=True,
-        collect_mark_list=True,
-        # 全再学習なら未学習スキップを無効化
-        #only_unfingerprinted=not args.full_retrain,
-        only_unfingerprinted=not args.full_retrain,  # 全再学習なら registry を無視
-    )
-    print(f"📚 dataset: X={X.shape}, y={y.shape}, marks={len(marks)}")
+    cache = None if args.no_dataset_cache else ShardStore(args.dataset_cache)
+    if args.stream:
+        # 使う棋譜の一覧だけ作り、局面は学習しながら読む
+        from .stream import make_datasets
+        entries, marks = index_two_folders(
+            folder_a=args.folder,
+            folder_b=args.extra_folder,
+            finished_only=args.finished_only,
+            registry_a=args.registry,
+            registry_b=args.extra_registry,
+            only_unfingerprinted=not args.full_retrain,  # 全再学習なら registry を無視
+            cache=cache,
+        )
+        train_ds, val_ds, steps, val_steps = make_datasets(entries, cache, args.batch, args.value_head)
+        C = NUM_PLANES
+        print(f"📚 dataset (stream): games={len(entries)}, steps/epoch={steps}, marks={len(marks)}")
+    else:
+        X, y, *V, marks = load_two_folders(
+            folder_a=args.folder,
+            folder_b=args.extra_folder,
+            finished_only=args.finished_only,
+            registry_a=args.registry,
+            registry_b=args.extra_registry,
+            #collect_mark_list=True,
+            collect_mark_list=True,
+            # 全再学習なら未学習スキップを無効化
+            #only_unfingerprinted=not args.full_retrain,
+            only_unfingerprinted=not args.full_retrain,  # 全再学習なら registry を無視
+            with_value=args.value_head,
+            cache=cache,
+            packed=args.packed,
+        )
+        C = NUM_PLANES if args.packed else X.shape[-1]
+        print(f"📚 dataset: X={X.shape}, y={y.shape}, marks={len(marks)}")
+        if args.packed:
+            from .stream import make_memory_datasets
+            train_ds, val_ds = make_memory_datasets(X, y, V[0] if V else None, args.batch, args.value_head)
 
     # ---- モデル構築・学習 ----
     #model = build_model(ch=args.ch, blocks=args.blocks, C=X.shape[-1])
-    model = build_model(ch=args.ch, blocks=args.blocks, C=X.shape[-1])
+    model = build_model(ch=args.ch, blocks=args.blocks, C=C, value_head=args.value_head)
     # --- 追加: Top-k 指標＋clipnorm ---
-    model.compile(
-        optimizer=keras.optimizers.Adam(learning_rate=1e-3, clipnorm=1.0),
-        loss="sparse_categorical_crossentropy",
-        metrics=[
-            "sparse_categorical_accuracy",                          # ← 明示
-            keras.metrics.SparseTopKCategoricalAccuracy(k=5,  name="top5_acc"),  # ← こちらを使用
-            keras.metrics.SparseTopKCategoricalAccuracy(k=10, name="top10_acc"),
-        ],
-    )
+    policy_metrics = [
+        "sparse_categorical_accuracy",                          # ← 明示
+        keras.metrics.SparseTopKCategoricalAccuracy(k=5,  name="top5_acc"),  # ← こちらを使用
+        keras.metrics.SparseTopKCategoricalAccuracy(k=10, name="top10_acc"),
+    ]
+    if args.value_head:
+        # 出力が {"policy", "value"} の2つ。指標名は "policy_top5_acc" のように出力名が前に付く
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=1e-3, clipnorm=1.0),
+            loss={"policy": keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+                  "value": keras.losses.MeanSquaredError()},
+            loss_weights={"policy": 1.0, "value": VALUE_LOSS_WEIGHT},
+            metrics={"policy": policy_metrics},
+        )
+        monitor = "val_policy_top5_acc"
+        if not args.stream and not args.packed:
+            y = {"policy": y, "value": V[0]}
+            print(f"📈 value targets: mean={V[0].mean():+.3f} decided={np.count_nonzero(V[0])}/{len(V[0])}")
+    else:
+        model.compile(
+            optimizer=keras.optimizers.Adam(learning_rate=1e-3, clipnorm=1.0),
+            loss="sparse_categorical_crossentropy",
+            metrics=policy_metrics,
+        )
+        monitor = "val_top5_acc"   # ← 上で name="top5_acc" にしたのでこのままでOK
+
+    # 検証用の局面が無い（棋譜が1局だけ・少ない）ときは val_* の指標が出ないので、学習側の指標で見る
+    # （そのままだと ModelCheckpoint が一度も保存しない）
+    if args.stream or args.packed:
+        has_val = val_ds is not None
+    else:
+        has_val = int(len(X) * 0.1) > 0
+    loss_monitor = "val_loss"
+    if not has_val:
+        print("⚠️ 検証用の局面がありません。学習データの指標でチェックポイントを選びます")
+        monitor, loss_monitor = monitor[len("val_"):], "loss"
 
     callbacks = [
         keras.callbacks.ModelCheckpoint(
             "models/shogi_policy_best.keras",
-            monitor="val_top5_acc",   # ← 上で name="top5_acc" にしたのでこのままでOK
+            monitor=monitor,
             save_best_only=True
         ),
-        keras.callbacks.ReduceLROnPlateau(monitor="val_loss", factor=0.5,
+        keras.callbacks.ReduceLROnPlateau(monitor=loss_monitor, factor=0.5,
                                           patience=2, min_lr=1e-5, verbose=1),
-        keras.callbacks.EarlyStopping(monitor="val_loss", patience=5,
+        keras.callbacks.EarlyStopping(monitor=loss_monitor, patience=5,
                                       restore_best_weights=True),
     ]
 
-    model.fit(
-        X, y,
-        epochs=args.epochs,
-        batch_size=args.batch,
-        shuffle=True,
-        validation_split=0.1,
-        callbacks=callbacks,
-        verbose=args.verbose,
-    )
+    if args.stream:
+        model.fit(
+            train_ds,
+            epochs=args.epochs,
+            steps_per_epoch=steps,
+            validation_data=val_ds,
+            validation_steps=val_steps,
+            callbacks=callbacks,
+            verbose=args.verbose,
+        )
+    elif args.packed:
+        model.fit(
+            train_ds,
+            epochs=args.epochs,
+            validation_data=val_ds,
+            callbacks=callbacks,
+            verbose=args.verbose,
+        )
+    else:
+        model.fit(
+            X, y,
+            epochs=args.epochs,
+            batch_size=args.batch,
+            shuffle=True,
+            validation_split=0.1 if has_val else 0.0,
+            callbacks=callbacks,
+            verbose=args.verbose,
+        )
 
     # ---- 保存 ----
     Path("models").mkdir(parents=True, exist_ok=True)
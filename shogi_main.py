@@ -13,8 +13,16 @@ from pathlib import Path
 from utils.snapshots import save_snapshot, list_snapshots, load_snapshot
 
 from learn.infer import PolicyAgent
-from learn.sfen_action import usi_to_action_id
+from learn.sfen_action import usi_to_action_id, moves_to_action_ids
 from learn.flipgen import generate_flips
+from engine.board_adapter import is_legal_move
+from engine.tt import TranspositionTable
+from engine.budget import LEVELS, resolve_budget
+from engine.ponder import Ponderer
+from engine.shared_tt import SharedTranspositionTable
+from engine.book import build_book, get_book
+from engine.result_cache import ResultCache
+from learn.shards import ShardStore, encode_missing, prune_old_formats
 
 # ==== 学習ジョブの状態 ====
 from threading import Thread
@@ -28,6 +36,22 @@ SQUARES = shogi.SQUARE_NAMES  # index -> '7f' 等
 BASE_DIR = Path(__file__).resolve().parent
 KIFU_ROOT = BASE_DIR / "kifu"    
 KIFU_LOG_PATH = "saved_games/kifu_log.json"
+# ==== 探索AI ====
+TT_MAX_ENTRIES = 1 << 16   # 1局あたりの置換表スロット数（2のべき乗に切り上げ）
+AI_DEFAULT_LEVEL = "normal"  # 強さの既定（engine/budget.LEVELS のキー）
+AI_MAX_TIME_MS = 10000       # クライアントが指定できる1手の持ち時間の上限
+PONDER_ENABLED = True        # 人間の手番中に AI の応手を先読みしておく
+PONDER_AI_TYPES = {"minimax", "alphabeta", "hybrid", "mcts"}   # 先読みする ai_type（探索に時間がかかるもの）
+# alphabeta を Lazy SMP（engine/smp.py）で読むプロセス数。既定は 1（並列化しない）。
+# 2 以上にしたときだけ対局ごとの置換表が共有メモリになり、探索ごとにワーカーのプールを借りる
+# （CPU を使い切るなら engine.smp.default_workers()）
+SEARCH_WORKERS = 1
+
+# 学習ジョブを learn/train.py --stream（局面を少しずつ読む。棋譜が増えてもメモリが増えない）で起動する
+TRAIN_STREAM = False
+# --stream でないときに learn/train.py --packed（全局面を 95 バイトの詰めた局面で持ち、バッチごとに planes へ展開）で起動する
+TRAIN_PACKED = False
+
 # ==== 管理者ID ====
 ALLOWED_TRAIN_IDS = {"shogi_master"}  # 必要なら追加: {"shogi_master", "admin"}
 
@@ -87,6 +111,10 @@ def _run_training(params):
             cmd += ["--extra-folder", extra_folder]
         if params.get("extra_registry"):
             cmd += ["--extra-registry", params["extra_registry"]]
+        if params.get("stream", TRAIN_STREAM):
+            cmd += ["--stream"]
+        elif params.get("packed", TRAIN_PACKED):
+            cmd += ["--packed"]
 
         _append_log(f"🚀 launch: {' '.join(cmd)}")
     
@@ -114,6 +142,18 @@ def _run_training(params):
         rc = proc.wait()
         train_state["rc"] = rc
         _append_log(f"✅ finished (rc={rc})")
+        if rc == 0:
+            # 量子化モデルで配信している場合は、新しいモデルから書き出し直してから差し替える
+            if agent.models.variant != "float":
+                from learn.quantize import export_quantized
+                _append_log(f"🗜 export {agent.models.variant} model")
+                try:
+                    export_quantized(variant=agent.models.variant)
+                except Exception as e:
+                    _append_log(f"⚠️ export failed ({e}); serving the float model")
+            # 対局を止めずに新しいモデルへ差し替える（裏で読み込み・ウォームアップしてから切替）
+            _append_log("🔁 policy model reload started")
+            agent.reload()
     except Exception as e:
         _append_log(f"💥 trainer exception: {e}")
         train_state["rc"] = -1
@@ -208,6 +248,40 @@ def _is_finished_game(obj: dict) -> bool:
     if obj.get("reason") in ("checkmate","mate","resign","time","sennichite","jishogi"): return True
     return False
 
+# ==== 定跡 ====
+_book_lock = threading.Lock()
+
+def _rebuild_book_async():
+    """定跡を裏で差分更新する（kifu/pvp・kifu/pvp_flip の新しい棋譜だけを足す）"""
+    def run():
+        with _book_lock:
+            try:
+                build_book()
+                get_book()   # 新しいファイルを map し直しておく
+            except Exception as e:
+                print(f"⚠️ 定跡の更新に失敗: {e.__class__.__name__}: {e}")
+    threading.Thread(target=run, daemon=True).start()
+
+# ==== 学習データのキャッシュ（learn/shards.py） ====
+# 保存された棋譜はすぐ裏でエンコードしておき、学習の開始時には指紋で引くだけにする
+dataset_cache = ShardStore()
+_dataset_cache_lock = threading.Lock()
+
+def _encode_kifu_async(paths=None):
+    """paths（省略時は kifu/pvp・kifu/pvp_flip 全体）のうち未エンコードの棋譜をキャッシュに足す"""
+    def run():
+        with _dataset_cache_lock:
+            try:
+                if paths is None:
+                    for d in prune_old_formats():
+                        print(f"🧹 removed old dataset cache: {d}")
+                added = encode_missing(store=dataset_cache, paths=paths)
+                if added:
+                    print(f"🗃️ dataset cache: +{added} games")
+            except Exception as e:
+                print(f"⚠️ 学習データのキャッシュ更新に失敗: {e.__class__.__name__}: {e}")
+    threading.Thread(target=run, daemon=True).start()
+
 def _worker_flip(token, src, dst, finished_only, overwrite):
     lines = _flip_jobs[token]["lines"]
     def log(s): lines.append(s); print(s)
@@ -221,6 +295,9 @@ def _worker_flip(token, src, dst, finished_only, overwrite):
             overwrite=overwrite
         )
         log(f"✅ 完了 kept={kept} skipped_unfinished={skipped} already={already}")
+        if kept:
+            _rebuild_book_async()
+            _encode_kifu_async()
     except Exception as e:
         log(f"❌ エラー: {e}")
     finally:
@@ -343,6 +420,92 @@ def api_train_stop():
     # 簡易MVP: サブプロセス停止は次回対応（安全にkillするには管理が必要）
     return jsonify({"error": "stop 未対応（次版で実装）"}), 501
 
+# ==== API: 置換表の統計（同時AI対局数に合わせたサイズ調整用） ====
+@app.get("/api/engine/tt_stats")
+def api_engine_tt_stats():
+    games = {}
+    total_ceiling = 0
+    for pid, game in game_states.items():
+        tt = game.get("tt")
+        if tt is None:
+            continue
+        st = tt.stats()
+        games[pid] = st
+        total_ceiling += st["memory_ceiling_bytes"]
+    return jsonify({
+        "max_entries": TT_MAX_ENTRIES,
+        "search_workers": SEARCH_WORKERS,
+        "games": games,
+        "total_memory_ceiling_bytes": total_ceiling,
+    })
+
+# ==== API: 先読み（pondering）の統計 ====
+@app.get("/api/engine/ponder_stats")
+def api_engine_ponder_stats():
+    games = {pid: game["ponder"].stats() for pid, game in game_states.items() if game.get("ponder")}
+    return jsonify({"enabled": PONDER_ENABLED, "games": games})
+
+# ==== API: 対局をまたぐ結果キャッシュの統計 ====
+@app.get("/api/engine/cache_stats")
+def api_engine_cache_stats():
+    from ai import SEARCH_CACHE
+    return jsonify({"search": SEARCH_CACHE.stats(), "policy": policy_cache.stats(),
+                    "dataset": dataset_cache.stats()})
+
+# ==== API: policy モデルの版（差し替え・巻き戻し） ====
+@app.get("/api/model/status")
+def api_model_status():
+    # 従来どおり default の状態を直下に置き、全モデルは "models" に入れる
+    return jsonify({**agent.models.status(), "models": agent.status(), "ab_weights": MODEL_AB_WEIGHTS})
+
+@app.post("/api/model/reload")
+def api_model_reload():
+    data = request.get_json() or {}
+    ok, err = _require_trainer(data.get("player_id"))
+    if not ok:
+        msg, code = err
+        return jsonify({"error": msg}), code
+    try:
+        agent.reload(data.get("path"), model=data.get("model"))
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify({"status": "reloading", **agent.manager(data.get("model")).status()})
+
+@app.post("/api/model/rollback")
+def api_model_rollback():
+    data = request.get_json() or {}
+    ok, err = _require_trainer(data.get("player_id"))
+    if not ok:
+        msg, code = err
+        return jsonify({"error": msg}), code
+    try:
+        if not agent.rollback(model=data.get("model")):
+            return jsonify({"error": "戻せる版がありません"}), 409
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify({"status": "ok", **agent.manager(data.get("model")).status()})
+
+@app.post("/api/model/register")
+def api_model_register():
+    """名前付きのモデルを追加する（読み込みは最初の対局で）。{"name", "path", "variant"?}"""
+    data = request.get_json() or {}
+    ok, err = _require_trainer(data.get("player_id"))
+    if not ok:
+        msg, code = err
+        return jsonify({"error": msg}), code
+    name, path = data.get("name"), data.get("path")
+    if not name or not path:
+        return jsonify({"error": "name と path を指定してください"}), 400
+    if not os.path.exists(path):
+        return jsonify({"error": f"モデルが見つかりません: {path}"}), 404
+    agent.register(name, path, data.get("variant"))
+    return jsonify({"status": "ok", "models": agent.status()})
+
+# ==== API: policy モデルの推論時間 ====
+@app.get("/api/engine/policy_stats")
+def api_engine_policy_stats():
+    return jsonify(agent.latency_stats())
+
 @app.get("/train")
 def train_page():
     return render_template("admin_train.html")  # 上で作ったテンプレ
@@ -564,7 +727,36 @@ def hands_from_game(game):
 
 # モデルを初期化
 # agent = PolicyAgent("models/shogi_policy_best.keras")
-agent = PolicyAgent()
+# 局面ごとの logits は対局をまたいで使い回す（engine/result_cache.py）
+POLICY_CACHE_ENTRIES = 512   # 1件 ≒ 55KB（13689 行動 × float32）
+policy_cache = ResultCache(POLICY_CACHE_ENTRIES)
+agent = PolicyAgent(cache=policy_cache)
+
+# 同時に配信する policy モデル（名前 → パス。"default" は models/ の CANDIDATES から探すモデル）
+#   例: {"strong": "models/shogi_policy_best.keras", "light": "models/shogi_policy.int8.tflite"}
+# 同じファイルを別の名前で書いても重みは1つだけ読み込む
+SERVED_MODELS = {}
+# /start で model の指定が無い対局の割り当て（名前 → 重み）。空なら "default"
+#   例: {"default": 0.5, "strong": 0.5}  … A/B 比較
+MODEL_AB_WEIGHTS = {}
+
+for _name, _path in SERVED_MODELS.items():
+    agent.register(_name, _path)
+
+def _assign_model(data):
+    """対局に使う policy モデルの名前を決める（対局の間は固定）"""
+    name = data.get("model")
+    if name:
+        agent.manager(name)   # 未登録なら KeyError
+        return name
+    if MODEL_AB_WEIGHTS:
+        names = list(MODEL_AB_WEIGHTS)
+        return random.choices(names, weights=[MODEL_AB_WEIGHTS[n] for n in names])[0]
+    return "default"
+
+def _game_policy(game):
+    """対局に割り当てたモデルに固定した PolicyAgent"""
+    return agent.view(game.get("policy_model"))
 
 @app.post("/ai_move_policy")
 def ai_move_policy():
@@ -578,9 +770,14 @@ def ai_move_policy():
     legal_ids = [usi_to_action_id(u) for u in legal_usi]
 
     # AI に手を選ばせる
-    usi, prob = agent.select_move(board, hands, side, legal_ids, temperature=1.0, topk=20)
+    try:
+        policy = agent.view(data.get("model"))
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 400
+    info = {}
+    usi, prob = policy.select_move(board, hands, side, legal_ids, temperature=1.0, topk=20, info=info)
 
-    return jsonify({"usi": usi, "prob": prob})
+    return jsonify({"usi": usi, "prob": prob, "model_version": info.get("model_version")})
 
 @app.post("/snapshot/resume")
 def snapshot_resume_route():
@@ -707,7 +904,7 @@ def evaluate_move(move, board):
         "P": 1, "L": 2, "N": 2, "S": 3,
         "G": 4, "B": 6, "R": 7, "K": 100
     }
-    if board.is_legal(move):
+    if is_legal_move(board, move):
         captured = board.piece_at(move.to_square)
         if captured:
             symbol = captured.symbol().upper().replace("+", "")
@@ -724,7 +921,57 @@ def square_to_usi(from_square, to_square, promote=False):
         usi += "+"
     return usi
 
+def _budget_from_request(data, default):
+    """リクエストの level / time_ms / nodes から探索予算を作る（持ち時間は AI_MAX_TIME_MS で頭打ち）"""
+    return resolve_budget(data.get("level"), data.get("time_ms"), data.get("nodes"),
+                          max_time_ms=AI_MAX_TIME_MS, default=default)
+
+def _ponder_tag(game, budget):
+    # 先読みした応手を使ってよいかの判定用（設定が変わっていたら使わない）
+    # hybrid / mcts は policy モデルの版が変わっても使わない
+    ai_type = game.get("ai_type", "simple")
+    version = _game_policy(game).model_version if ai_type in ("hybrid", "mcts") else None
+    return (ai_type, game.get("search_backend"), budget, version)
+
+def _make_ponderer(game):
+    def think(board, stop_event):
+        from ai import choose_ai_move
+        return choose_ai_move(board, ai_type=game.get("ai_type", "simple"), tt=game.get("tt"),
+                              backend=game.get("search_backend"), budget=game.get("ai_budget"),
+                              stop_event=stop_event, workers=SEARCH_WORKERS, policy=_game_policy(game))
+    return Ponderer(think)
+
+def _make_tt():
+    # 並列探索ではワーカープロセスと共有できる置換表を使う
+    if SEARCH_WORKERS > 1:
+        return SharedTranspositionTable(TT_MAX_ENTRIES)
+    return TranspositionTable(TT_MAX_ENTRIES)
+
+def _cancel_pondering(player_id) -> bool:
+    """先読みを止めて捨てる。作業スレッドがまだ終わっていなければ False"""
+    game = game_states.get(player_id)
+    if game and game.get("ponder"):
+        return game["ponder"].cancel()
+    return True
+
+def _release_game(player_id):
+    """先読みを止め、共有メモリの置換表を手放す（状態を作り直す・消す前に呼ぶ）"""
+    stopped = _cancel_pondering(player_id)
+    game = game_states.get(player_id)
+    if game and isinstance(game.get("tt"), SharedTranspositionTable):
+        tt, ponder = game["tt"], game.get("ponder")
+        game["tt"] = None
+        if stopped or ponder is None:
+            tt.close()
+        else:
+            # 先読みのスレッドがまだ置換表を読み書きしている: 終わってから閉じる
+            def close_later():
+                ponder.join()
+                tt.close()
+            threading.Thread(target=close_later, daemon=True).start()
+
 def init_game_states(player_id):
+    _release_game(player_id)
     game_states[player_id] = {
         "board": shogi.Board(),
         "kifu": [],
@@ -733,7 +980,12 @@ def init_game_states(player_id):
         "first": "player",       # ← 追加
         "result": "",            # ← 対局終了時に記録
         "reason": "",            # ← 対局終了時に記録
+        "tt": _make_tt(),                          # 探索AIの置換表（手番をまたいで再利用）
+        "ai_budget": LEVELS[AI_DEFAULT_LEVEL],     # 探索AIの予算（/start の level 等で上書き）
+        "model_versions": [],                      # policy を使う AI（learning / hybrid / mcts）の各手を選んだモデルの版
+        "policy_model": "default",                 # この対局に割り当てた policy モデルの名前（/start で決める）
     }
+    game_states[player_id]["ponder"] = _make_ponderer(game_states[player_id])
 
     print(f"🔄 {player_id} の game_state を初期化しました")
 
@@ -814,6 +1066,7 @@ def logout():
             if user_id in key:
                 del match_states[key]
         if user_id in game_states:
+            _release_game(user_id)
             del game_states[user_id]
     return jsonify({"status": "ok"})
 
@@ -909,6 +1162,10 @@ def player_move():
     captured_by_player = game["captured"]["player"]
     captured_by_ai = game["captured"]["ai"]
 
+    # 先読みを止める（用意できた応手は /ai_move で使う）
+    if game.get("ponder"):
+        game["ponder"].stop()
+
     print("board of game state at player move = ",board_to_matrix(board))
 
     try:
@@ -920,12 +1177,12 @@ def player_move():
             print("🧪 [打ち込み] piece_symbol =", piece_symbol, "→ USI =", drop_piece_symbol)
             print("🧪 [打ち込み] to_index =", to_index)
 
+            # 合法手を全列挙せず、候補手1つだけを合法判定する
             move = None
-            for lm in board.legal_moves:
-                if lm.drop_piece_type is not None:
-                    if lm.to_square == to_index and lm.drop_piece_type == drop_piece_type:
-                        move = lm
-                        break
+            if drop_piece_type is not None:
+                cand = shogi.Move(None, to_index, False, drop_piece_type)
+                if is_legal_move(board, cand):
+                    move = cand
 
             if move is None:
                 return jsonify({"error": "不正な打ち込みです"})
@@ -942,14 +1199,9 @@ def player_move():
             to_square = to_index
 
             move = None
-            for lm in board.legal_moves:
-                if lm.from_square == from_square and lm.to_square == to_square:
-                    if promote and lm.promotion:
-                        move = lm
-                        break
-                    elif not promote and not lm.promotion:
-                        move = lm
-                        break
+            cand = shogi.Move(from_square, to_square, bool(promote))
+            if is_legal_move(board, cand):
+                move = cand
 
             if move is None:
                 return jsonify({"error": "不正な手です"})
@@ -1005,8 +1257,21 @@ def ai_move():
     captured_by_player = game["captured"]["player"]
     captured_by_ai = game["captured"]["ai"]
     ai_type = game.get("ai_type", "simple") 
+    policy = _game_policy(game)
+
+    # 1手ごとの予算（指定が無ければ /start で決めた予算）
+    try:
+        budget = _budget_from_request(data, game.get("ai_budget") or LEVELS[AI_DEFAULT_LEVEL])
+    except (TypeError, ValueError):
+        return jsonify({"error": "time_ms / nodes は整数で指定してください"}), 400
+
+    print(f"🤖 AIタイプ = {ai_type} budget={budget}")
 
-    print(f"🤖 AIタイプ = {ai_type}")
+    # 先読みが走っていれば止める（置換表を探索と取り合わないように、終わるまで待つ）
+    ponder = game.get("ponder")
+    if ponder and not ponder.stop():
+        print("⏳ 先読みの終了を待っています")
+        ponder.join()
     print("🔍 game['turn'] =", game["turn"])
     print("🔍 board.turn =", board.turn)
 
@@ -1022,40 +1287,47 @@ def ai_move():
 
     print("🟢 ai_move at C")
 
+    model_version = None
     try:
         if ai_type == "learning": 
-            # 盤面を policy 用に正規化（'*香' 等 → 'L' 等）
-            raw9 = board_to_matrix(board)
-            board9 = normalize_board_for_policy(raw9)
-            print("🧪 [policy] board9[0][:3] =", board9[0][:3] if board9 else None)
-
-            # 持ち駒は game_state から作成
-            hands = hands_from_game(game)
-
-            # 手番
-            side = "gote" if board.turn == shogi.WHITE else "sente"
-
-            # 合法手 → action_id
-            legal_usi = [m.usi() for m in board.legal_moves]
-            legal_ids = [usi_to_action_id(u) for u in legal_usi]
-
-            # 推論
-            usi, prob = agent.select_move(board9, hands, side, legal_ids, temperature=1.0, topk=20)
-            print("🧪 [policy] selected:", usi, "prob=", prob)
+            # 合法手 → action_id（Move の各フィールドから表引き。USI 文字列は作らない）
+            legal_ids = moves_to_action_ids(board.legal_moves)
+
+            # 推論（盤面・持ち駒・手番は Board から直接 planes にする）
+            info = {}
+            usi, prob = policy.select_move_board(board, legal_ids, temperature=1.0, topk=20, info=info)
+            model_version = info.get("model_version")
+            print("🧪 [policy] selected:", usi, "prob=", prob, f"infer={policy.last_ms:.1f}ms",
+                  f"model={policy.name}:{model_version}")
             try:
                 best_move = shogi.Move.from_usi(usi)
             except Exception:
                 print("⚠️ [policy] usi→Move 失敗。simpleにフォールバック:", usi)
                 best_move = choose_ai_move(board, ai_type="simple")
+                model_version = None
 
             # 念のため 合法手チェック
             if best_move not in board.legal_moves:
                 print("⚠️ [policy] 非合法手検出。simpleにフォールバック:", best_move.usi())
                 best_move = choose_ai_move(board, ai_type="simple")
+                model_version = None
 
         else:
-            # simple / minimax は従来どおり
-            best_move = choose_ai_move(board, ai_type=ai_type)
+            # 先読みで同じ局面・同じ設定の応手が用意できていればそれを返す
+            best_move = None
+            if ponder and ai_type in PONDER_AI_TYPES:
+                tag = _ponder_tag(game, budget)
+                best_move = ponder.lookup(board, tag)
+                if best_move:
+                    print("⚡ ponder hit:", best_move.usi())
+                    model_version = tag[-1]   # hybrid / mcts は応手を作った policy の版（tag に入っている）
+            # simple / minimax は従来どおり（alphabeta は対局ごとの置換表を使う）
+            if not best_move:
+                info = {}
+                best_move = choose_ai_move(board, ai_type=ai_type, tt=game.get("tt"),
+                                           backend=game.get("search_backend"), budget=budget,
+                                           workers=SEARCH_WORKERS, policy=policy, info=info)
+                model_version = info.get("model_version")
 
         print("🟢 ai_move at D")
 
@@ -1074,6 +1346,7 @@ def ai_move():
             else:
                 print("⚠ choose_ai_moveがNoneを返したため、ランダムにフォールバックします")
                 best_move = random.choice(legal_moves)
+                model_version = None
 
         # === 打ち込みか判定 ===
         if "*" in best_move.usi():
@@ -1094,6 +1367,9 @@ def ai_move():
 
         board.push(best_move)
         game["kifu"].append(best_move.usi())
+        if model_version:
+            game.setdefault("model_versions", []).append(
+                {"ply": len(game["kifu"]), "usi": best_move.usi(), "model": model_version})
         game["turn"] = "player"
         game["board"] = board
 
@@ -1117,6 +1393,10 @@ def ai_move():
                 "is_check": True
             })
 
+        # 人間が考えている間に、次の応手を先読みしておく
+        if PONDER_ENABLED and ponder and ai_type in PONDER_AI_TYPES:
+            ponder.start(board, _ponder_tag(game, game.get("ai_budget")))
+
         # 通常処理（まだ詰んでいない）
         return jsonify({
             "from": best_move.from_square,
@@ -1162,9 +1442,22 @@ def start_game():
     first = data.get("first", "player")
     player_id = data.get("player_id")
     ai_type = data.get("ai_type", "simple")
+    search_backend = data.get("backend")   # "array"（既定）/ "python-shogi"
 
     print("🔸ai_type =", ai_type)
 
+    # 強さ = 探索予算（level / time_ms / nodes）
+    try:
+        budget = _budget_from_request(data, LEVELS[AI_DEFAULT_LEVEL])
+    except (TypeError, ValueError):
+        return jsonify({"error": "time_ms / nodes は整数で指定してください"}), 400
+
+    # policy モデルの割り当て（A/B 比較・強さ別のモデル）
+    try:
+        policy_model = _assign_model(data)
+    except KeyError as e:
+        return jsonify({"error": str(e)}), 400
+
     # 🔁 状態を初期化（存在しなければ新規作成）
     init_game_states(player_id)
 
@@ -1174,7 +1467,11 @@ def start_game():
     captured_by_ai = game["captured"]["ai"]
     game["turn"] = first
     game["ai_type"] = ai_type
+    game["search_backend"] = search_backend
+    game["ai_budget"] = budget
     game["first"] = first
+    game["policy_model"] = policy_model
+    print(f"🔸policy model = {policy_model}")
 
     # 🔁 盤の初期化
     #reset_board(player_id)
@@ -1258,7 +1555,9 @@ def save_kifu_route():
 
     now = datetime.now().strftime("%Y%m%d-%H%M%S")
     ai_name  = game.get("ai_name")  or data.get("ai_name")  or "ai"
-    ai_model = game.get("ai_model") or data.get("ai_model") or None
+    model_versions = game.get("model_versions") or []
+    ai_model = game.get("ai_model") or data.get("ai_model") or \
+        (model_versions[-1]["model"] if model_versions else None)
 
     payload = {
         "version": 1,
@@ -1267,10 +1566,12 @@ def save_kifu_route():
         "player_id": player_id,
         "ai_name": ai_name,
         "ai_model": ai_model,
+        "policy_model": game.get("policy_model"),   # 対局に割り当てた policy モデルの名前（A/B 比較の集計用）
         "first": game.get("first", "unknown"),
         "result": game.get("result", "unknown"),
         "reason": game.get("reason", "unknown"),
         "kifu": kifu,          # 内部リッチデータ
+        "model_versions": model_versions,   # policy を使う AI の手ごとのモデルの版 [{ply, usi, model}]
     }
 
     # ★ 統一仕様：kifu/ai に直接保存
@@ -1370,6 +1671,8 @@ def save_kifu2_route():
         out_path = pvp_dir / filename
         out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
         rel_path = str(out_path.relative_to(BASE_DIR))
+        _rebuild_book_async()
+        _encode_kifu_async([out_path])
 
     # ---- ここから：スナップショット保存（中断時のみ） ----
     try:
@@ -1531,6 +1834,7 @@ def load_kifu():
 def resign():   
     data = request.get_json()
     player_id = data.get("player_id")
+    _cancel_pondering(player_id)
 
     return jsonify(success=True)
 
@@ -2358,6 +2662,8 @@ def undo_last_move():
     })
 
 if __name__ == "__main__":
+    _rebuild_book_async()   # 起動時に定跡を棋譜アーカイブに追いつかせて map しておく
+    _encode_kifu_async()    # 学習データのキャッシュも同様に追いつかせておく
     app.run(host="0.0.0.0", port=5000, debug=True)
 
 
@@ -631,7 +631,8 @@ document.addEventListener("DOMContentLoaded", () => {
     mode = "game";
     //const playerId = document.getElementById("player-id").value.trim();
     const aiType = document.getElementById("ai-type-selector").value;
-    console.log("🟢aiType=", aiType);
+    const aiLevel = document.getElementById("ai-level-selector")?.value || "normal";
+    console.log("🟢aiType=", aiType, "level=", aiLevel);
     const side = document.querySelector('input[name="side"]:checked').value;
 
     drawInitialBoard();
@@ -644,7 +645,8 @@ document.addEventListener("DOMContentLoaded", () => {
       body: JSON.stringify({
         first: side,
         player_id: playerID,
-        ai_type: aiType
+        ai_type: aiType,
+        level: aiLevel
       })
     })
       .then(response => response.json())
@@ -774,9 +776,21 @@ document.addEventListener("DOMContentLoaded", () => {
       <select id="ai-type-selector" style="width: 130px; margin-bottom: 10px;">
         <option value="simple">Simple AI</option>
         <option value="minimax">Minimax AI</option>
+        <option value="alphabeta">AlphaBeta AI</option>
+        <option value="hybrid">Hybrid AI (policy + αβ)</option>
+        <option value="mcts">MCTS AI (policy + value)</option>
         <option value="learning">Learning AI</option>
       </select>
 
+      <label for="ai-level-selector">強さ:</label>
+      <select id="ai-level-selector" style="width: 130px; margin-bottom: 10px;">
+        <option value="beginner">入門 (0.1秒)</option>
+        <option value="easy">初級 (0.3秒)</option>
+        <option value="normal" selected>中級 (1秒)</option>
+        <option value="hard">上級 (3秒)</option>
+        <option value="expert">最強 (8秒)</option>
+      </select>
+
       <div>
         <label>先手</label><br>
         <label><input type="radio" name="side" value="player" checked> YOU </label><br>
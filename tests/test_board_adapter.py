@@ -0,0 +1,28 @@
+# engine/board_adapter.is_legal_move（/player_move の候補手1つだけの合法判定）
+import shogi
+
+from engine.board_adapter import is_legal_move
+
+# 後手の持ち駒に飛車。6f には先手の歩がいる
+OCCUPIED_DROP_SFEN = "1n1g1k1n1/lr1s2sbl/3p3p1/ppp1ppp1p/9/3P2PP1/PPP1P1g1P/LBSGK1S1L/1N3G1N1 w rp 38"
+
+
+def test_drop_onto_occupied_square_is_illegal():
+    board = shogi.Board(OCCUPIED_DROP_SFEN)
+    move = shogi.Move.from_usi("R*6f")
+    assert board.piece_at(move.to_square) is not None
+    assert move not in set(board.legal_moves)
+    assert not is_legal_move(board, move)
+
+
+def test_matches_legal_moves_for_every_candidate():
+    board = shogi.Board(OCCUPIED_DROP_SFEN)
+    legal = set(board.legal_moves)
+    for to in range(81):
+        for piece_type in (shogi.PAWN, shogi.ROOK):
+            move = shogi.Move(None, to, False, piece_type)
+            assert is_legal_move(board, move) == (move in legal)
+        for frm in range(81):
+            for promote in (False, True):
+                move = shogi.Move(frm, to, promote)
+                assert is_legal_move(board, move) == (move in legal)